@@ -1,14 +1,20 @@
-from collections import defaultdict, deque
-from fastapi import APIRouter, HTTPException, UploadFile, File, Request, Query
-from fastapi.responses import FileResponse, StreamingResponse
-from models import Home, Floor, Wall, Light, LightState
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse, Response
+from models import Home, Floor, Light, LightState, Scene, RoomLabel, Vector3
+from pydantic import BaseModel, ValidationError
 import asyncio
+import archive
+import codec
+import compact
 import db
-import base64
-import io
-import json
-import time
+import events
+import light_table
+import meshes
+import patches
+import response_cache
+import rooms
+import uploads
+import validation
 import zipfile
 import os
 
@@ -18,19 +24,49 @@ class LightControlCommand(BaseModel):
     brightness: float | None = None # 0 - 100
     color: list[int] | None = None # [255, 0, 0]
 
+class BulkLightCommand(BaseModel):
+    floors: list[str] | None = None # Floor ids; each filter left out matches every light
+    lights: list[str] | None = None # Light ids
+    names: list[str] | None = None
+    on: bool | None = None
+    brightness: float | None = None # 0 - 100
+    scale: float | None = None # Multiply the current intensity
+    color: list[int] | None = None # [255, 0, 0]
+    color_temperature: float | None = None # Kelvin, e.g. 2700 for warm white
+
+class SpatialQuery(BaseModel):
+    polygon: list[list[float]] | None = None # [[x, z], ...] outline in the floor plane
+    center: list[float] | None = None # [x, z], with radius
+    radius: float | None = None
+
+class RoomUpdate(BaseModel):
+    name: str
+
 class BackgroundColorCommand(BaseModel):
     color: str  # Hex color like "#222222"
 
-router = APIRouter()
+HOME_READY_TIMEOUT_SECONDS = float(os.getenv('HOME_READY_TIMEOUT_SECONDS', '15'))
 
-EVENT_LOG_MAXLEN = 1000
-SSE_HEARTBEAT_SECONDS = 25
 
-_home_versions: dict[str, int] = defaultdict(int)
-_home_event_logs: dict[str, deque] = defaultdict(lambda: deque(maxlen=EVENT_LOG_MAXLEN))
-_home_subscribers: dict[str, set[asyncio.Queue]] = defaultdict(set)
+async def wait_for_home(request: Request, response: Response):
+    """Hold requests until the initial home has loaded, and flag whether it did"""
+    ready = await db.wait_until_ready(HOME_READY_TIMEOUT_SECONDS)
+    request.state.home_ready = "true" if ready else "false"
+    response.headers["X-Home-Ready"] = request.state.home_ready
 
 
+def _ready_flagged(request: Request, response: Response) -> Response:
+    # Responses returned directly do not pick up headers set by dependencies
+    response.headers["X-Home-Ready"] = request.state.home_ready
+    return response
+
+
+router = APIRouter(dependencies=[Depends(wait_for_home)])
+# Endpoints that must answer while the initial home is still loading
+status_router = APIRouter()
+# WebSocket routes cannot use the Response-based readiness dependency; they wait themselves
+ws_router = APIRouter()
+
 def _serialize_light(light: Light) -> dict:
     return {
         "id": light.id,
@@ -39,87 +75,155 @@ def _serialize_light(light: Light) -> dict:
     }
 
 
-def _format_sse_event(event_type: str, data: dict, event_id: int | None = None) -> str:
-    lines = []
-    if event_id is not None:
-        lines.append(f"id: {event_id}")
-    lines.append(f"event: {event_type}")
-    lines.append(f"data: {json.dumps(data)}")
-    return "\n".join(lines) + "\n\n"
-
-
 def _publish_home_event(home_id: str, event_type: str, payload: dict) -> dict:
-    _home_versions[home_id] += 1
-    version = _home_versions[home_id]
-    event = {
-        "type": event_type,
-        "home_id": home_id,
-        "version": version,
-        "ts": int(time.time()),
-        **payload,
-    }
-    _home_event_logs[home_id].append(event)
-
-    for queue in list(_home_subscribers[home_id]):
-        if queue.full():
-            try:
-                queue.get_nowait()
-            except asyncio.QueueEmpty:
-                pass
-        try:
-            queue.put_nowait(event)
-        except asyncio.QueueFull:
-            pass
-    return event
-
+    return events.publish(home_id, event_type, payload)
 
-def _get_home_changes_since(home_id: str, since: int):
-    events = _home_event_logs[home_id]
-    current_version = _home_versions[home_id]
-    if not events:
-        return [], False, current_version
+@status_router.get("/status")
+async def get_status():
+    """Readiness and startup timing breakdown"""
+    return db.get_startup_status()
 
-    oldest_version = events[0]["version"]
-    if since < oldest_version - 1:
-        return [], True, current_version
-
-    changes = [event for event in events if event["version"] > since]
-    return changes, False, current_version
-
-
-def _register_subscriber(home_id: str) -> asyncio.Queue:
-    queue: asyncio.Queue = asyncio.Queue(maxsize=200)
-    _home_subscribers[home_id].add(queue)
-    return queue
-
-
-def _unregister_subscriber(home_id: str, queue: asyncio.Queue) -> None:
-    subscribers = _home_subscribers.get(home_id)
-    if not subscribers:
-        return
-    subscribers.discard(queue)
-    if not subscribers:
-        _home_subscribers.pop(home_id, None)
+async def _cached_home_response(request: Request, key: str, homes: list[Home], serialize):
+    # Keep cached bodies only for homes that are still resident
+    response_cache.discard({"homes"} | set(db.homes_db) | {f"geometry:{home_id}" for home_id in db.homes_db})
+    stamp = [(home, events.current_version(home.id)) for home in homes]
+    return _ready_flagged(request, await response_cache.respond(request, key, stamp, serialize))
 
 @router.get("/homes", response_model=list[Home])
-async def list_homes():
-    return db.get_homes()
+async def list_homes(request: Request):
+    homes = db.get_homes()
+    return await _cached_home_response(
+        request, "homes", homes,
+        lambda: b"[" + b",".join(codec.encode_home(home) for home in homes) + b"]",
+    )
+
+@router.get("/homes/active/state")
+async def get_active_home_state():
+    """Live state of the active home, so clients can start from its geometry hash"""
+    homes = db.get_homes()
+    if not homes:
+        raise HTTPException(status_code=404, detail="No home found")
+    return await _home_state(homes[0])
 
 @router.get("/homes/{home_id}", response_model=Home)
-async def get_home(home_id: str):
-    home = db.get_home(home_id)
+async def get_home(home_id: str, request: Request):
+    home = await db.fetch_home(home_id)
     if not home:
         raise HTTPException(status_code=404, detail="Home not found")
-    return home
+    return await _cached_home_response(request, home_id, [home], lambda: codec.encode_home(home))
+
+
+# Geometry is everything but the hot state: light states, background color
+# and scenes are left out. Edits replace the home or floor objects (PUT, PATCH,
+# loads), so the identity of those objects versions the geometry document.
+GEOMETRY_EXCLUDE = {
+    "background_color": True,
+    "scenes": True,
+    "floors": {"__all__": {"lights": {"__all__": {"state"}}}},
+}
+GEOMETRY_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+async def _geometry_entry(home: Home) -> dict:
+    stamp = [(home, 0)] + [(floor, 0) for floor in home.floors]
+    return await response_cache.get_entry(
+        f"geometry:{home.id}", stamp, lambda: codec.encode_home(home, exclude=GEOMETRY_EXCLUDE)
+    )
 
+@router.get("/homes/{home_id}/geometry")
+async def get_home_geometry(home_id: str, request: Request):
+    """Current geometry, revalidated on every use; prefer the hash-addressed URL"""
+    home = await db.fetch_home(home_id)
+    if not home:
+        raise HTTPException(status_code=404, detail="Home not found")
+    entry = await _geometry_entry(home)
+    response = _ready_flagged(request, response_cache.respond_entry(request, entry))
+    response.headers["Content-Location"] = f"/api/homes/{home_id}/geometry/{entry['digest']}"
+    return response
+
+@router.get("/homes/{home_id}/geometry/{geometry_hash}")
+async def get_home_geometry_by_hash(home_id: str, geometry_hash: str, request: Request):
+    """Immutable geometry document for a content hash"""
+    home = await db.fetch_home(home_id)
+    if not home:
+        raise HTTPException(status_code=404, detail="Home not found")
+    entry = await _geometry_entry(home)
+    if entry["digest"] != geometry_hash:
+        raise HTTPException(status_code=404, detail="Geometry version is no longer current")
+    return _ready_flagged(request, response_cache.respond_entry(request, entry, GEOMETRY_CACHE_CONTROL))
+
+@router.get("/homes/{home_id}/meshes")
+async def list_home_meshes(home_id: str):
+    """Per-floor mesh hashes and URLs; a floor's GLB only changes when its geometry does"""
+    home = await db.fetch_home(home_id)
+    if not home:
+        raise HTTPException(status_code=404, detail="Home not found")
+    floors = []
+    for floor in home.floors:
+        digest = meshes.mesh_hash(floor)
+        floors.append({
+            "floor_id": floor.id,
+            "name": floor.name,
+            "level": floor.level,
+            "mesh_hash": digest,
+            "url": f"/api/homes/{home_id}/meshes/{digest}.glb",
+        })
+    return {"home_id": home_id, "format": meshes.MEDIA_TYPE, "floors": floors}
+
+@router.get("/homes/{home_id}/meshes/{mesh_hash}.glb")
+async def get_floor_mesh(home_id: str, mesh_hash: str, request: Request):
+    """Immutable GLB of one floor (slab, walls with window openings, panes)"""
+    home = await db.fetch_home(home_id)
+    if not home:
+        raise HTTPException(status_code=404, detail="Home not found")
+    floor = next((floor for floor in home.floors if meshes.mesh_hash(floor) == mesh_hash), None)
+    if floor is None:
+        raise HTTPException(status_code=404, detail="Mesh version is no longer current")
+
+    headers = {"ETag": f'"{mesh_hash}"', "Cache-Control": GEOMETRY_CACHE_CONTROL}
+    if request.headers.get("if-none-match") in (headers["ETag"], "*"):
+        return _ready_flagged(request, Response(status_code=304, headers=headers))
+    _, data = await meshes.floor_glb(floor)
+    return _ready_flagged(request, Response(content=data, media_type=meshes.MEDIA_TYPE, headers=headers))
+
+@router.get("/homes/{home_id}/state")
+async def get_home_state(home_id: str):
+    """Live state only: light states and background color, plus the current geometry hash"""
+    home = await db.fetch_home(home_id)
+    if not home:
+        raise HTTPException(status_code=404, detail="Home not found")
+    return await _home_state(home)
+
+async def _home_state(home: Home) -> dict:
+    entry = await _geometry_entry(home)
+    return {
+        "home_id": home.id,
+        "version": events.current_version(home.id),
+        "geometry_hash": entry["digest"],
+        "background_color": home.background_color,
+        "lights": {light.id: light.state.dict() for floor in home.floors for light in floor.lights},
+    }
 
 @router.get("/homes/{home_id}/changes")
-async def get_home_changes(home_id: str, since: int = Query(default=0, ge=0)):
-    home = db.get_home(home_id)
+async def get_home_changes(
+    home_id: str,
+    request: Request,
+    since: int = Query(default=0, ge=0),
+    format: str = Query(default="json", pattern="^(json|compact)$"),
+):
+    home = await db.fetch_home(home_id)
     if not home:
         raise HTTPException(status_code=404, detail="Home not found")
 
-    changes, resync_required, current_version = _get_home_changes_since(home_id, since)
+    changes, resync_required, current_version = events.changes_since(home_id, since)
+    if format == "compact":
+        index = compact.light_index(home)
+        headers = {
+            "X-Current-Version": str(current_version),
+            "X-Resync-Required": "1" if resync_required else "0",
+            "X-Light-Index-Tag": str(index.tag),
+        }
+        content = compact.encode_events(changes, index)
+        return _ready_flagged(request, Response(content=content, media_type=compact.MEDIA_TYPE, headers=headers))
     return {
         "home_id": home_id,
         "since": since,
@@ -129,9 +233,25 @@ async def get_home_changes(home_id: str, since: int = Query(default=0, ge=0)):
     }
 
 
+@router.get("/homes/{home_id}/lights/index")
+async def get_light_index(home_id: str):
+    """Light ids in the order compact frames refer to them"""
+    home = await db.fetch_home(home_id)
+    if not home:
+        raise HTTPException(status_code=404, detail="Home not found")
+    return compact.light_index(home).to_dict(home_id)
+
+
 @router.get("/homes/{home_id}/stream")
-async def stream_home_updates(home_id: str, request: Request, since: int = Query(default=0, ge=0)):
-    home = db.get_home(home_id)
+async def stream_home_updates(
+    home_id: str,
+    request: Request,
+    since: int = Query(default=0, ge=0),
+    policy: str | None = Query(default=None),
+    max_rate: float | None = Query(default=None, gt=0),
+    format: str = Query(default="json", pattern="^(json|compact)$"),
+):
+    home = await db.fetch_home(home_id)
     if not home:
         raise HTTPException(status_code=404, detail="Home not found")
 
@@ -139,43 +259,29 @@ async def stream_home_updates(home_id: str, request: Request, since: int = Query
     if last_event_id and last_event_id.isdigit():
         since = max(since, int(last_event_id))
 
+    if policy is not None and policy not in events.SLOW_CONSUMER_POLICIES:
+        raise HTTPException(status_code=400, detail=f"policy must be one of {', '.join(events.SLOW_CONSUMER_POLICIES)}")
+
     async def event_stream():
-        queue = _register_subscriber(home_id)
+        # Subscribing and building the catch-up happen without yielding to the
+        # event loop in between, so no event can be missed or sent twice
+        if format == "compact":
+            subscriber = events.subscribe_compact(
+                home_id, lambda: compact.light_index(db.homes_db.get(home_id)), policy, max_rate
+            )
+        else:
+            subscriber = events.subscribe(home_id, policy, max_rate)
         try:
-            changes, resync_required, current_version = _get_home_changes_since(home_id, since)
-            hello_payload = {
-                "home_id": home_id,
-                "version": current_version,
-            }
-            yield _format_sse_event("hello", hello_payload, current_version)
-
-            if resync_required:
-                resync_payload = {
-                    "home_id": home_id,
-                    "current_version": current_version,
-                    "reason": "event_buffer_gap",
-                }
-                yield _format_sse_event("resync_required", resync_payload, current_version)
-            else:
-                for event in changes:
-                    yield _format_sse_event(event["type"], event, event["version"])
-
+            yield events.catch_up_chunk(subscriber, since)
+            # The server notices a disconnect when it cancels this generator or a
+            # write fails (at the latest on the next heartbeat), so nothing polls
             while True:
-                if await request.is_disconnected():
+                chunk = await subscriber.next_chunks()
+                if not chunk:
                     break
-
-                try:
-                    event = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
-                    yield _format_sse_event(event["type"], event, event["version"])
-                except asyncio.TimeoutError:
-                    heartbeat = {
-                        "home_id": home_id,
-                        "version": _home_versions[home_id],
-                        "ts": int(time.time()),
-                    }
-                    yield _format_sse_event("ping", heartbeat, _home_versions[home_id])
+                yield chunk
         finally:
-            _unregister_subscriber(home_id, queue)
+            events.unsubscribe(subscriber)
 
     headers = {
         "Cache-Control": "no-cache",
@@ -184,6 +290,101 @@ async def stream_home_updates(home_id: str, request: Request, since: int = Query
     }
     return StreamingResponse(event_stream(), media_type="text/event-stream", headers=headers)
 
+def _ws_message(message_type: str, **payload) -> bytes:
+    return codec.dumps({"type": message_type, **payload})
+
+def _ws_light_command(home: Home, message: dict) -> bytes:
+    """Apply a partial light state from a WebSocket command and build its ack"""
+    request_id = message.get("request_id")
+    entry = db.find_light(str(message.get("id")), home.id)
+    if not entry:
+        return _ws_message("error", request_id=request_id, detail="Light not found")
+    _, _, light = entry
+    try:
+        state = LightState(**{**light.state.dict(), **(message.get("state") or {})})
+    except (TypeError, ValidationError) as e:
+        return _ws_message("error", request_id=request_id, detail=f"Invalid light state: {e}")
+
+    changed = state != light.state
+    if changed:
+        light.state = state
+        db.record_light_changes(home, [light])
+        version = _publish_home_event(home.id, "lights_changed", {"lights": [_serialize_light(light)]})["version"]
+    else:
+        version = events.current_version(home.id)
+    return _ws_message("ack", request_id=request_id, version=version, changed=changed, light=_serialize_light(light))
+
+async def _ws_send_loop(websocket: WebSocket, subscriber: events.WebSocketSubscriber):
+    while True:
+        frames = await subscriber.next_frames()
+        if not frames:
+            # A slow consumer under the disconnect policy has been sent resync_required
+            await websocket.close(code=1013)
+            return
+        for frame in frames:
+            await websocket.send_text(frame.decode('utf-8'))
+
+@ws_router.websocket("/homes/{home_id}/ws")
+async def home_websocket(websocket: WebSocket, home_id: str, policy: str | None = None, max_rate: float | None = None):
+    """Two-way channel: filtered home events out, light commands in"""
+    await db.wait_until_ready(HOME_READY_TIMEOUT_SECONDS)
+    home = await db.fetch_home(home_id)
+    invalid = (policy is not None and policy not in events.SLOW_CONSUMER_POLICIES) or (max_rate is not None and max_rate <= 0)
+    if not home or invalid:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+
+    def floor_of_light(light_id: str):
+        entry = db.find_light(light_id, home_id)
+        return entry[1].id if entry else None
+
+    subscriber = events.subscribe_websocket(home_id, floor_of_light, policy, max_rate)
+    subscriber.enqueue(_ws_message("hello", home_id=home_id, version=events.current_version(home_id)))
+    sender = asyncio.create_task(_ws_send_loop(websocket, subscriber))
+    try:
+        while True:
+            received = await websocket.receive()
+            if received["type"] == "websocket.disconnect":
+                break
+            if received.get("text") is None:
+                subscriber.enqueue(_ws_message("error", detail="Messages must be JSON text frames"))
+                continue
+            try:
+                message = codec.loads(received["text"])
+            except ValueError:
+                subscriber.enqueue(_ws_message("error", detail="Messages must be JSON objects"))
+                continue
+            if not isinstance(message, dict):
+                subscriber.enqueue(_ws_message("error", detail="Messages must be JSON objects"))
+                continue
+
+            message_type = message.get("type")
+            if message_type == "subscribe":
+                subscriber.set_filters(message.get("floors"), message.get("lights"), message.get("events"))
+                subscriber.enqueue(_ws_message(
+                    "subscribed",
+                    floors=message.get("floors"),
+                    lights=message.get("lights"),
+                    events=message.get("events"),
+                    version=events.current_version(home_id),
+                ))
+                if isinstance(message.get("since"), int):
+                    subscriber.resume(message["since"])
+            elif message_type == "light":
+                # Re-resolve the home: it may have been replaced since the socket opened
+                home = await db.fetch_home(home_id) or home
+                subscriber.enqueue(_ws_light_command(home, message))
+            elif message_type == "ping":
+                subscriber.enqueue(_ws_message("pong", version=events.current_version(home_id)))
+            else:
+                subscriber.enqueue(_ws_message("error", detail=f"Unknown message type: {message_type}"))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        events.unsubscribe(subscriber)
+
 @router.post("/homes", response_model=Home)
 async def create_home(home: Home):
     return db.create_home(home)
@@ -195,29 +396,48 @@ async def reset_home():
 @router.put("/homes/{home_id}", response_model=Home)
 async def update_home(home_id: str, home: Home):
     home.id = home_id 
-    return db.update_home(home_id, home)
+    updated = db.update_home(home_id, home)
+    _publish_home_event(home_id, "home_replaced", {"name": home.name})
+    return updated
+
+@router.patch("/homes/{home_id}")
+async def patch_home(home_id: str, operations: list[patches.PatchOperation]):
+    """Apply id-addressed edits to walls, windows, cubes, lights and floor shapes"""
+    home = await db.fetch_home(home_id)
+    if not home:
+        raise HTTPException(status_code=404, detail="Home not found")
+
+    try:
+        floors, changes = patches.apply_operations(home, operations)
+    except patches.PatchError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    changed = any(floor is not previous for floor, previous in zip(floors, home.floors))
+    home.floors = floors
+    if changed:
+        db.reindex_home(home)
+        db.record_floor_changes(home, changes)
+
+    version = events.current_version(home_id)
+    for event_type, payload in changes:
+        version = _publish_home_event(home_id, event_type, payload)["version"]
+    return {"status": "success", "applied": len(operations), "events": [t for t, _ in changes], "version": version}
 
 @router.put("/homes/{home_id}/lights/{light_id}", response_model=Light)
 async def update_light(home_id: str, light_id: str, state: LightState):
-    home = db.get_home(home_id)
+    home = await db.fetch_home(home_id)
     if not home:
         raise HTTPException(status_code=404, detail="Home not found")
     
-    target_light = None
-    for floor in home.floors:
-        for light in floor.lights:
-            if light.id == light_id:
-                target_light = light
-                break
-        if target_light: break
-            
-    if not target_light:
+    entry = db.find_light(light_id, home_id)
+    if not entry:
         raise HTTPException(status_code=404, detail="Light not found")
-        
+    _, _, target_light = entry
+
     target_light.state = state
     
     # Auto-save the home after light state change
-    db.auto_save_home(home)
+    db.record_light_changes(home, [target_light])
 
     _publish_home_event(
         home_id,
@@ -227,86 +447,370 @@ async def update_light(home_id: str, light_id: str, state: LightState):
     
     return target_light
 
+def _find_scene(home: Home, scene_ref: str):
+    """Scene by id, or by name"""
+    for scene in home.scenes:
+        if scene.id == scene_ref:
+            return scene
+    for scene in home.scenes:
+        if scene.name == scene_ref:
+            return scene
+    return None
+
+def _publish_scenes_changed(home: Home):
+    _publish_home_event(home.id, "scenes_changed", {"scenes": [scene.dict() for scene in home.scenes]})
+
+@router.get("/homes/{home_id}/scenes", response_model=list[Scene])
+async def list_scenes(home_id: str):
+    home = await db.fetch_home(home_id)
+    if not home:
+        raise HTTPException(status_code=404, detail="Home not found")
+    return home.scenes
+
+@router.post("/homes/{home_id}/scenes", response_model=Scene)
+async def save_scene(home_id: str, scene: Scene):
+    """Create or replace (by name) a scene; a scene without lights captures the current light states"""
+    home = await db.fetch_home(home_id)
+    if not home:
+        raise HTTPException(status_code=404, detail="Home not found")
+
+    if not scene.lights:
+        scene.lights = {light.id: light.state.copy() for floor in home.floors for light in floor.lights}
+    unknown = [light_id for light_id in scene.lights if not db.find_light(light_id, home_id)]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown light ids: {unknown}")
+
+    existing = _find_scene(home, scene.name)
+    if existing:
+        scene.id = existing.id
+        home.scenes = [scene if s.id == existing.id else s for s in home.scenes]
+    else:
+        home.scenes = home.scenes + [scene]
+
+    db.record_home_replace(home)
+    _publish_scenes_changed(home)
+    return scene
+
+@router.delete("/homes/{home_id}/scenes/{scene_ref}")
+async def delete_scene(home_id: str, scene_ref: str):
+    home = await db.fetch_home(home_id)
+    if not home:
+        raise HTTPException(status_code=404, detail="Home not found")
+    scene = _find_scene(home, scene_ref)
+    if not scene:
+        raise HTTPException(status_code=404, detail="Scene not found")
+
+    home.scenes = [s for s in home.scenes if s.id != scene.id]
+    db.record_home_replace(home)
+    _publish_scenes_changed(home)
+    return {"status": "success", "deleted": scene.id}
+
+@router.post("/homes/{home_id}/scenes/{scene_ref}/apply")
+async def apply_scene(home_id: str, scene_ref: str):
+    """Move every light of a scene to its target state: one mutation, one persist, one event"""
+    home = await db.fetch_home(home_id)
+    if not home:
+        raise HTTPException(status_code=404, detail="Home not found")
+    scene = _find_scene(home, scene_ref)
+    if not scene:
+        raise HTTPException(status_code=404, detail="Scene not found")
+
+    # Applied as one masked update of the light table; only lights that end up
+    # in a different state are written back
+    changed, missing = light_table.table_for(home).apply_states(scene.lights)
+    if changed:
+        db.record_light_changes(home, changed)
+        _publish_home_event(
+            home_id,
+            "lights_changed",
+            {"lights": [_serialize_light(light) for light in changed]},
+        )
+
+    return {
+        "status": "success",
+        "scene": scene.id,
+        "changed": [light.id for light in changed],
+        "unchanged": len(scene.lights) - len(changed) - len(missing),
+        "missing": missing,
+    }
+
 # HA Integration specific endpoints (simplified)
 @router.post("/ha/light/{light_id}/{action}")
 async def ha_light_control(light_id: str, action: str):
-    target_light = None
-    target_home_id = None
-    
-    for home in db.get_homes():
-        for floor in home.floors:
-            for light in floor.lights:
-                if light.id == light_id:
-                    target_light = light
-                    target_home_id = home.id
-                    break
-            if target_light: break
-        if target_light: break
-        
-    if not target_light:
+    entry = db.find_light(light_id)
+    if not entry:
         raise HTTPException(status_code=404, detail="Light not found")
-        
-    if action == "on":
-        target_light.state.on = True
-    elif action == "off":
-        target_light.state.on = False
-    
+    home, _, target_light = entry
+    if action not in ("on", "off") or target_light.state.on == (action == "on"):
+        return {"status": "success", "light": target_light}
+
+    target_light.state = target_light.state.copy(update={"on": action == "on"})
+    db.record_light_changes(home, [target_light])
+    _publish_home_event(home.id, "lights_changed", {"lights": [_serialize_light(target_light)]})
     return {"status": "success", "light": target_light}
 
+@router.get("/persistence/stats")
+async def get_persistence_stats():
+    """Report autosave and journal activity, including how many writes were coalesced"""
+    return db.get_persistence_stats()
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """Home cache residency, hit/miss and eviction counters"""
+    return {**db.get_cache_stats(), "responses": response_cache.get_stats(), "meshes": meshes.get_stats(), "rooms": rooms.get_stats()}
+
+@router.get("/events/stats")
+async def get_event_stats():
+    """Event fan-out counters and per-subscriber queue, drop and coalesce counts"""
+    return events.get_stats()
+
 @router.get("/saves", response_model=list[str])
 async def list_saves():
-    return db.get_all_save_files()
+    return await asyncio.to_thread(db.get_all_save_files)
+
+@router.get("/saves/catalog")
+async def get_save_catalog(
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=50, ge=1, le=500),
+    sort: str = Query(default="filename"),
+    order: str = Query(default="asc", pattern="^(asc|desc)$"),
+):
+    """Paginated, sortable save metadata so the save dialog never has to load whole files"""
+    return await asyncio.to_thread(db.get_save_catalog, offset, limit, sort, order == "desc")
 
 @router.post("/saves/{filename}/load", response_model=Home)
 async def load_save(filename: str):
-    home = db.load_from_file(filename)
+    home = await db.fetch_save(filename)
     if not home:
         raise HTTPException(status_code=404, detail="Save file not found")
     return home
 
+@router.get("/saves/{filename}/meta")
+async def get_save_metadata(filename: str):
+    """Home metadata and floor index of a save without loading its floors"""
+    meta = await asyncio.to_thread(db.get_save_metadata, filename)
+    if not meta:
+        raise HTTPException(status_code=404, detail="Save file not found")
+    return meta
+
+@router.get("/saves/{filename}/floors/{floor_id}", response_model=Floor)
+async def get_save_floor(filename: str, floor_id: str):
+    """Load a single floor of a save"""
+    floor = await asyncio.to_thread(db.load_floor, filename, floor_id)
+    if not floor:
+        raise HTTPException(status_code=404, detail="Floor not found")
+    return floor
+
+@router.get("/saves/{filename}/json")
+async def export_save_json(filename: str):
+    """Download a save as JSON, whatever format it is stored in"""
+    exported = await asyncio.to_thread(db.export_save_json, filename)
+    if not exported:
+        raise HTTPException(status_code=404, detail="Save file not found")
+    name, contents = exported
+    json_name = os.path.splitext(name)[0] + ".json"
+    return Response(
+        content=contents,
+        media_type="application/json",
+        headers={"Content-Disposition": f"attachment; filename={json_name}"}
+    )
+
+def _validate_light_command(index: int, cmd: LightControlCommand) -> str | None:
+    if cmd.color is not None and (len(cmd.color) != 3 or any(not 0 <= c <= 255 for c in cmd.color)):
+        return f"commands[{index}].color must be three integers between 0 and 255"
+    return None
+
+def _light_command_columns(cmd: LightControlCommand | BulkLightCommand) -> dict:
+    """Light table update for a control command"""
+    columns = {"on": cmd.on}
+    if cmd.brightness is not None:
+        # Map 0-100 to 0.0-5.0 (internal intensity)
+        # 100 => 5.0
+        val = max(0.0, min(100.0, cmd.brightness))
+        columns["intensity"] = (val / 100.0) * light_table.MAX_INTENSITY
+    if cmd.color is not None:
+        columns["rgb"] = tuple(cmd.color)
+    return columns
+
 @router.post("/control/lights")
 async def control_lights(commands: list[LightControlCommand]):
-    print(f"DEBUG: Received control commands: {commands}")
-    homes = db.get_homes()
-    updates = 0
-    changed_by_home: dict[str, dict[str, dict]] = defaultdict(dict)
-    
+    # Validate the whole batch before touching any light
+    errors = [error for i, cmd in enumerate(commands) if (error := _validate_light_command(i, cmd))]
+    if errors:
+        raise HTTPException(status_code=422, detail=errors)
+
+    # Names resolve to row indexes cached in each home's light table, so every
+    # command is one masked update of its own rows; the batch is written back
+    # once per home, for the lights whose final state differs
+    tables = [light_table.table_for(home) for home in db.get_homes()]
+    touched: dict[str, set[int]] = {}
+    results = []
+
     for cmd in commands:
-        for home in homes:
-            for floor in home.floors:
-                for light in floor.lights:
-                    if light.name == cmd.name:
-                        # Update state
-                        if cmd.on is not None:
-                            light.state.on = cmd.on
-                            
-                        if cmd.brightness is not None:
-                            # Map 0-100 to 0.0-5.0 (internal intensity)
-                            # 100 => 5.0
-                            val = max(0.0, min(100.0, cmd.brightness))
-                            light.state.intensity = (val / 100.0) * 5.0
-                            
-                        if cmd.color is not None and len(cmd.color) == 3:
-                            # Convert RGB [r, g, b] to Hex String "#RRGGBB"
-                            r, g, b = cmd.color
-                            hex_color = "#{:02x}{:02x}{:02x}".format(r, g, b)
-                            light.state.color = hex_color
-                             
-                        updates += 1
-                        changed_by_home[home.id][light.id] = _serialize_light(light)
-                        print(f"DEBUG: Updated light '{light.name}' to on={light.state.on}, brightness={light.state.intensity}, color={light.state.color}")
-                        
-            # Save home state
-            db.update_home(home.id, home)
-
-    for home_id, changed_map in changed_by_home.items():
+        columns = _light_command_columns(cmd)
+        matched = False
+        changed_ids = []
+        for table in tables:
+            rows = table.rows_named(cmd.name)
+            if not len(rows):
+                continue
+            matched = True
+            changed = table.update(rows, **columns)
+            touched.setdefault(table.home.id, set()).update(rows.tolist())
+            changed_ids.extend(table.lights[row].id for row in changed)
+        if not matched:
+            results.append({"name": cmd.name, "result": "unmatched", "lights": []})
+            continue
+        results.append({
+            "name": cmd.name,
+            "result": "matched" if changed_ids else "unchanged",
+            "lights": changed_ids,
+        })
+
+    updates = 0
+    for table in tables:
+        if table.home.id not in touched:
+            continue
+        changed = table.write_back(sorted(touched[table.home.id]))
+        if not changed:
+            continue
+        updates += len(changed)
+        db.record_light_changes(table.home, changed)
         _publish_home_event(
-            home_id,
+            table.home.id,
             "lights_changed",
-            {"lights": list(changed_map.values())},
+            {"lights": [_serialize_light(light) for light in changed]},
         )
-            
-    return {"status": "success", "updated_lights": updates}
+
+    return {"status": "success", "updated_lights": updates, "results": results}
+
+def _apply_bulk_command(home: Home, table: light_table.LightTable, mask, cmd: BulkLightCommand) -> dict:
+    """Apply a bulk command to the masked rows of a light table, then persist and publish the changes"""
+    columns = _light_command_columns(cmd)
+    if cmd.scale is not None:
+        columns["scale"] = max(0.0, cmd.scale)
+    if cmd.color_temperature is not None:
+        columns["rgb"] = light_table.color_temperature_rgb(cmd.color_temperature)
+    changed = table.write_back(table.update(mask, **columns))
+
+    version = events.current_version(home.id)
+    if changed:
+        db.record_light_changes(home, changed)
+        version = _publish_home_event(
+            home.id,
+            "lights_changed",
+            {"lights": [_serialize_light(light) for light in changed]},
+        )["version"]
+    return {
+        "status": "success",
+        "matched": int(mask.sum()),
+        "changed": [light.id for light in changed],
+        "version": version,
+    }
+
+def _validate_bulk_command(cmd: BulkLightCommand):
+    if cmd.color is not None and (len(cmd.color) != 3 or any(not 0 <= c <= 255 for c in cmd.color)):
+        raise HTTPException(status_code=422, detail="color must be three integers between 0 and 255")
+    if cmd.color is not None and cmd.color_temperature is not None:
+        raise HTTPException(status_code=422, detail="Give either color or color_temperature")
+
+@router.post("/homes/{home_id}/lights/bulk")
+async def bulk_light_control(home_id: str, cmd: BulkLightCommand):
+    """One command for every light matching the floor, id and name filters, applied column-wise"""
+    _validate_bulk_command(cmd)
+    home = await db.fetch_home(home_id)
+    if not home:
+        raise HTTPException(status_code=404, detail="Home not found")
+
+    table = light_table.table_for(home)
+    return _apply_bulk_command(home, table, table.select(cmd.floors, cmd.lights, cmd.names), cmd)
+
+async def _home_rooms(home_id: str) -> Home:
+    home = await db.fetch_home(home_id)
+    if not home:
+        raise HTTPException(status_code=404, detail="Home not found")
+    rooms.retain({floor.id for resident in db.homes_db.values() for floor in resident.floors})
+    return home
+
+def _find_room(home: Home, room_ref: str) -> tuple[Floor, dict]:
+    found = rooms.find_rooms(home.floors, room_ref)
+    if not found:
+        raise HTTPException(status_code=404, detail="Room not found")
+    if len(found) > 1:
+        raise HTTPException(status_code=409, detail=f"{len(found)} rooms are named {room_ref}; use a room id")
+    return found[0]
+
+@router.get("/homes/{home_id}/rooms")
+async def list_rooms(home_id: str, floor_id: str | None = None):
+    """Rooms enclosed by the walls of each floor, with the lights and cubes inside them"""
+    home = await _home_rooms(home_id)
+    return {
+        "home_id": home_id,
+        "rooms": [
+            room
+            for floor in home.floors if floor_id is None or floor.id == floor_id
+            for room in rooms.layout_for(floor).rooms
+        ],
+    }
+
+@router.get("/homes/{home_id}/rooms/{room_ref}/lights")
+async def list_room_lights(home_id: str, room_ref: str):
+    """Lights inside a room, by room id or name"""
+    home = await _home_rooms(home_id)
+    floor, room = _find_room(home, room_ref)
+    lights = {light.id: light for light in floor.lights}
+    return {
+        "room": {key: room[key] for key in ("id", "floor_id", "name")},
+        "lights": [_serialize_light(lights[light_id]) for light_id in room["lights"]],
+    }
+
+@router.post("/homes/{home_id}/rooms/{room_ref}/lights")
+async def room_light_control(home_id: str, room_ref: str, cmd: BulkLightCommand):
+    """A bulk light command for the lights inside a room; the command's own filters narrow it further"""
+    _validate_bulk_command(cmd)
+    home = await _home_rooms(home_id)
+    _, room = _find_room(home, room_ref)
+    table = light_table.table_for(home)
+    mask = table.select(cmd.floors, cmd.lights, cmd.names) & table.select(lights=room["lights"])
+    return {"room": room["id"], **_apply_bulk_command(home, table, mask, cmd)}
+
+@router.put("/homes/{home_id}/rooms/{room_id}")
+async def rename_room(home_id: str, room_id: str, update: RoomUpdate):
+    """Name a room by replacing the labels inside it with one at its center"""
+    home = await _home_rooms(home_id)
+    floor, room = _find_room(home, room_id)
+    if room["id"] != room_id:
+        raise HTTPException(status_code=404, detail="Room not found")
+
+    x, z = room["center"]
+    inside = set(room["labels"])
+    labels = [label for label in floor.room_labels if label.id not in inside]
+    labels.append(RoomLabel(name=update.name, position=Vector3(x=x, y=0, z=z)))
+    floor = floor.copy(update={"room_labels": labels})
+    home.floors = [floor if existing.id == floor.id else existing for existing in home.floors]
+    db.reindex_home(home)
+    payload = {"floor_id": floor.id, "room_labels": [label.dict() for label in labels]}
+    db.record_floor_changes(home, [("room_labels_changed", payload)])
+
+    version = _publish_home_event(home_id, "room_labels_changed", payload)["version"]
+    room = next(r for r in rooms.layout_for(floor).rooms if r["id"] == room_id)
+    return {"status": "success", "room": room, "version": version}
+
+@router.post("/homes/{home_id}/floors/{floor_id}/query")
+async def query_floor(home_id: str, floor_id: str, query: SpatialQuery):
+    """Lights and cubes inside a polygon, or within a radius of a point, on one floor"""
+    home = await _home_rooms(home_id)
+    floor = next((floor for floor in home.floors if floor.id == floor_id), None)
+    if floor is None:
+        raise HTTPException(status_code=404, detail="Floor not found")
+    layout = rooms.layout_for(floor)
+    if query.polygon is not None:
+        if len(query.polygon) < 3 or any(len(point) != 2 for point in query.polygon):
+            raise HTTPException(status_code=422, detail="polygon needs at least three [x, z] points")
+        return layout.query(polygon=query.polygon)
+    if query.center is None or query.radius is None or len(query.center) != 2 or query.radius < 0:
+        raise HTTPException(status_code=422, detail="Give a polygon, or a center [x, z] and a non-negative radius")
+    return layout.query(center=query.center, radius=query.radius)
 
 @router.post("/background/color")
 async def set_background_color(cmd: BackgroundColorCommand):
@@ -318,7 +822,7 @@ async def set_background_color(cmd: BackgroundColorCommand):
     # Update the first (active) home
     home = homes[0]
     home.background_color = cmd.color
-    db.update_home(home.id, home)
+    db.record_background_change(home)
 
     _publish_home_event(
         home.id,
@@ -326,9 +830,6 @@ async def set_background_color(cmd: BackgroundColorCommand):
         {"background_color": home.background_color},
     )
     
-    # Auto-save
-    db.auto_save_home(home)
-    
     return {
         "status": "success",
         "background_color": home.background_color
@@ -343,118 +844,108 @@ async def get_background_color():
     
     return {"background_color": homes[0].background_color}
 
-@router.post("/saves/upload")
-async def upload_save(file: UploadFile = File(...)):
-    """Upload a new save file"""
+_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"],
+        }}},
+    }
+}
+
+
+def _upload_name(original_filename: str | None) -> str:
+    # Sanitize filename - remove path components and dangerous characters
+    safe_filename = os.path.basename(original_filename or "uploaded_save.json")
+    safe_filename = "".join(c for c in safe_filename if c.isalnum() or c in (' ', '-', '_', '.')).strip()
+
+    if not safe_filename:
+        safe_filename = "uploaded_save.json"
+
+    # Ensure .json extension
+    if not safe_filename.endswith('.json'):
+        safe_filename += '.json'
+
+    # Check if file already exists - if so, add a number suffix
+    base_name = safe_filename[:-5]  # Remove .json
+    counter = 1
+    # A save of the same name in the other format counts too; installing would replace it
+    while db.save_name_taken(safe_filename):
+        safe_filename = f"{base_name}_{counter}.json"
+        counter += 1
+    return safe_filename
+
+
+@router.post("/saves/upload", openapi_extra=_UPLOAD_BODY)
+async def upload_save(request: Request):
+    """Upload a new save file, validated in full before it is stored"""
     import logging
-    import json
     logger = logging.getLogger(__name__)
-    
-    # Validate file extension
-    if not file.filename or not file.filename.endswith('.json'):
-        raise HTTPException(status_code=400, detail="Only JSON files are supported")
-    
-    # Validate file size (max 10MB)
-    max_size = 10 * 1024 * 1024
-    contents = await file.read()
-    if len(contents) > max_size:
-        raise HTTPException(status_code=400, detail="File is too large (max 10MB)")
-    
+
+    # The body is streamed to a temp file next to the saves, so the size limit
+    # applies while reading and the validated file is simply renamed into place
+    try:
+        upload = await uploads.receive_file(request, "file", db.SAVES_DIR, uploads.MAX_UPLOAD_BYTES)
+    except uploads.UploadTooLarge:
+        raise HTTPException(status_code=400, detail=f"File is too large (max {uploads.MAX_UPLOAD_BYTES // (1024 * 1024)}MB)")
+    except uploads.UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
-        # Validate JSON structure
-        data = json.loads(contents)
-        
-        # Basic validation - check if it looks like a Home save file
-        if not isinstance(data, dict) or 'id' not in data or 'floors' not in data:
-            raise HTTPException(status_code=400, detail="Invalid save file format - missing required fields")
-        
-        if not isinstance(data.get('floors'), list):
-            raise HTTPException(status_code=400, detail="Invalid save file format - floors must be an array")
-        
-        # Sanitize filename - remove path components and dangerous characters
-        original_filename = file.filename or "uploaded_save.json"
-        safe_filename = os.path.basename(original_filename)
-        safe_filename = "".join(c for c in safe_filename if c.isalnum() or c in (' ', '-', '_', '.')).strip()
-        
-        if not safe_filename:
-            safe_filename = "uploaded_save.json"
-        
-        # Ensure .json extension
-        if not safe_filename.endswith('.json'):
-            safe_filename += '.json'
-        
-        # Write to saves directory
-        target_path = os.path.join(db.SAVES_DIR, safe_filename)
-        
-        # Check if file already exists - if so, add a number suffix
-        base_name = safe_filename[:-5]  # Remove .json
-        counter = 1
-        while os.path.exists(target_path):
-            safe_filename = f"{base_name}_{counter}.json"
-            target_path = os.path.join(db.SAVES_DIR, safe_filename)
-            counter += 1
-        
-        with open(target_path, 'wb') as f:
-            f.write(contents)
-        
+        # Validate file extension
+        if not upload.filename.endswith('.json'):
+            raise HTTPException(status_code=400, detail="Only JSON files are supported")
+
+        result = await validation.validate(upload.path)
+        report = result["report"]
+        if not report["valid"]:
+            first = report["errors"][0]
+            location = f" at {first['path']}" if first["path"] else ""
+            return _ready_flagged(request, codec.JSONResponse(status_code=400, content={
+                "detail": f"Invalid save file{location}: {first['message']}",
+                "validation": report,
+            }))
+
+        safe_filename = _upload_name(upload.filename)
+        await db.install_save_file(upload.path, safe_filename, result["hash"], result["summary"])
         logger.info(f"Uploaded save file: {safe_filename}")
-        
+
         return {
             "status": "success",
             "filename": safe_filename,
-            "message": f"File uploaded successfully as {safe_filename}"
+            "message": f"File uploaded successfully as {safe_filename}",
+            "validation": report,
+            "catalog": db.get_catalog_entry(safe_filename)
         }
-        
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=400, detail="Invalid JSON file")
+
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to upload save file: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to upload file: {str(e)}")
-
-@router.post("/saves/{filename}", response_model=str)
-async def save_as(filename: str, home: Home):
-    # Clear DB and set this as the only home
-    db.homes_db.clear()
-    db.homes_db[home.id] = home
-    saved_name = db.save_to_file(home, filename)
-    return saved_name
-
+    finally:
+        upload.discard()
 
 @router.get("/saves/export/all")
 async def export_all_saves():
-    """Export all save files as a ZIP archive for backup"""
-    import logging
-    logger = logging.getLogger(__name__)
-    
-    try:
-        # Create an in-memory ZIP file
-        zip_buffer = io.BytesIO()
-        
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            save_files = db.get_all_save_files()
-            
-            if not save_files:
-                raise HTTPException(status_code=404, detail="No save files found to export")
-            
-            for filename in save_files:
-                file_path = os.path.join(db.SAVES_DIR, filename)
-                if os.path.exists(file_path):
-                    # Add file to ZIP with just the filename (no path)
-                    zip_file.write(file_path, arcname=filename)
-                    logger.info(f"Added {filename} to export ZIP")
-        
-        # Seek to beginning of buffer
-        zip_buffer.seek(0)
-        
-        # Return as downloadable file
-        return StreamingResponse(
-            zip_buffer,
-            media_type="application/zip",
-            headers={"Content-Disposition": "attachment; filename=home-digital-twin-saves.zip"}
-        )
-    except Exception as e:
-        logger.error(f"Failed to export saves: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to export saves: {str(e)}")
+    """Export all save files as a ZIP archive for backup, streamed while it is compressed"""
+    # The archive reads saves from storage, so write pending changes first
+    await db.flush_dirty_homes()
+    save_files = await asyncio.to_thread(db.get_all_save_files)
+    if not save_files:
+        raise HTTPException(status_code=404, detail="No save files found to export")
+
+    transfer, chunks = archive.start_export(save_files)
+    return StreamingResponse(
+        chunks,
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": "attachment; filename=home-digital-twin-saves.zip",
+            "X-Transfer-Id": str(transfer["id"]),
+        }
+    )
 
 
 @router.post("/saves/import")
@@ -462,48 +953,61 @@ async def import_saves(file: UploadFile = File(...)):
     """Import save files from a ZIP archive"""
     import logging
     logger = logging.getLogger(__name__)
-    
+
     if not file.filename or not file.filename.endswith('.zip'):
         raise HTTPException(status_code=400, detail="Only ZIP files are supported")
-    
+
+    # The upload is already spooled to a temp file; it is extracted in a worker thread
     try:
-        # Read the uploaded ZIP file
-        contents = await file.read()
-        zip_buffer = io.BytesIO(contents)
-        
-        imported_files = []
-        
-        with zipfile.ZipFile(zip_buffer, 'r') as zip_file:
-            # Extract all JSON files
-            for filename in zip_file.namelist():
-                if filename.endswith('.json'):
-                    # Extract to saves directory
-                    target_path = os.path.join(db.SAVES_DIR, os.path.basename(filename))
-                    
-                    # Read file content
-                    file_content = zip_file.read(filename)
-                    
-                    # Write to saves directory
-                    with open(target_path, 'wb') as f:
-                        f.write(file_content)
-                    
-                    imported_files.append(os.path.basename(filename))
-                    logger.info(f"Imported save file: {filename}")
-        
-        if not imported_files:
-            raise HTTPException(status_code=400, detail="No valid JSON save files found in ZIP")
-        
-        return {
-            "status": "success",
-            "imported_files": imported_files,
-            "count": len(imported_files)
-        }
+        transfer, imported_files, rejected = await archive.import_archive(file.file)
     except zipfile.BadZipFile:
         raise HTTPException(status_code=400, detail="Invalid ZIP file")
     except Exception as e:
         logger.error(f"Failed to import saves: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to import saves: {str(e)}")
 
+    if not imported_files:
+        return codec.JSONResponse(status_code=400, content={
+            "detail": "No valid save files found in ZIP",
+            "rejected": rejected,
+            "transfer_id": transfer["id"],
+        })
+
+    return {
+        "status": "success",
+        "imported_files": imported_files,
+        "count": len(imported_files),
+        "rejected": rejected,
+        "transfer_id": transfer["id"],
+    }
+
+
+# Registered after /saves/import so that path is not taken as a file name
+@router.post("/saves/{filename}", response_model=str)
+async def save_as(filename: str, home: Home):
+    # Save, then make this the active home
+    try:
+        saved_name = db.save_to_file(home, filename)
+    except ValueError as e:
+        # A home the storage backend cannot hold, e.g. duplicate ids with SQLite
+        raise HTTPException(status_code=422, detail=str(e))
+    db.set_active_home(home, saved_name)
+    return saved_name
+
+
+@router.get("/saves/transfers")
+async def list_transfers():
+    """Progress of running and recent exports and imports"""
+    return archive.get_transfers()
+
+
+@router.get("/saves/transfers/{transfer_id}")
+async def get_transfer(transfer_id: int):
+    transfer = archive.get_transfer(transfer_id)
+    if not transfer:
+        raise HTTPException(status_code=404, detail="Transfer not found")
+    return transfer
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,248 @@
+import asyncio
+import itertools
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+import zipfile
+import db
+import validation
+
+logger = logging.getLogger(__name__)
+
+# ZIP backup and restore of saves without blocking the event loop.
+#
+# Export compresses entries in a worker thread into a bounded queue of chunks
+# that the response streams as they are produced, so memory stays at a few
+# chunks plus the save being compressed and a client that stops reading stops
+# the thread. Import reads the upload from Starlette's spooled temp file and
+# streams each entry (at most MAX_IMPORT_ENTRY_BYTES) into a temp file in the
+# saves directory from a worker thread, validates it like an upload and hands
+# installing it back to the event loop, which owns the journal state. Entries
+# that fail validation are skipped and reported with their validation report.
+# Both are tracked as transfers with live progress.
+CHUNK_BYTES = 64 * 1024
+EXPORT_QUEUE_CHUNKS = 16
+MAX_IMPORT_ENTRY_BYTES = int(os.getenv('MAX_IMPORT_ENTRY_BYTES', str(256 * 1024 * 1024)))
+TRANSFER_HISTORY = 20
+
+_transfer_ids = itertools.count(1)
+_transfers: dict[int, dict] = {}
+_DONE = object()
+
+
+class TransferCancelled(Exception):
+    pass
+
+
+def _start_transfer(kind: str, files_total: int | None = None) -> dict:
+    transfer = {
+        "id": next(_transfer_ids),
+        "kind": kind,
+        "state": "running",
+        "files_total": files_total,
+        "files_done": 0,
+        "files_rejected": 0,
+        "bytes_in": 0,
+        "bytes_out": 0,
+        "current": None,
+        "started_at": time.time(),
+        "finished_at": None,
+        "error": None,
+    }
+    _transfers[transfer["id"]] = transfer
+    for old_id in sorted(_transfers)[:-TRANSFER_HISTORY]:
+        if _transfers[old_id]["state"] != "running":
+            del _transfers[old_id]
+    return transfer
+
+
+def _finish_transfer(transfer: dict, state: str, error: str | None = None):
+    transfer.update(state=state, error=error, current=None, finished_at=time.time())
+
+
+def get_transfers() -> list[dict]:
+    return [dict(transfer) for transfer in reversed(_transfers.values())]
+
+
+def get_transfer(transfer_id: int) -> dict | None:
+    transfer = _transfers.get(transfer_id)
+    return dict(transfer) if transfer else None
+
+
+class _ChunkPipe:
+    """File-like sink for ZipFile that hands CHUNK_BYTES pieces to the response"""
+
+    def __init__(self, transfer: dict):
+        self.transfer = transfer
+        self.chunks: queue.Queue = queue.Queue(maxsize=EXPORT_QUEUE_CHUNKS)
+        self.cancelled = threading.Event()
+        self.buffer = bytearray()
+
+    def write(self, data) -> int:
+        self.buffer += data
+        if len(self.buffer) >= CHUNK_BYTES:
+            self._emit()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def _emit(self):
+        chunk, self.buffer = bytes(self.buffer), bytearray()
+        while True:
+            if self.cancelled.is_set():
+                raise TransferCancelled()
+            try:
+                self.chunks.put(chunk, timeout=0.5)
+                break
+            except queue.Full:
+                continue
+        self.transfer["bytes_out"] += len(chunk)
+
+    def close(self):
+        if self.buffer:
+            self._emit()
+
+    def next_chunk(self):
+        """Blocking read for the response side; _DONE once finished or cancelled"""
+        while not self.cancelled.is_set():
+            try:
+                return self.chunks.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return _DONE
+
+
+def _write_archive(pipe: _ChunkPipe, filenames: list[str]):
+    transfer = pipe.transfer
+    try:
+        # ZipFile falls back to data descriptors on a stream it cannot seek
+        with zipfile.ZipFile(pipe, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            for filename in filenames:
+                transfer["current"] = filename
+                contents = db.read_save_bytes(filename)
+                if contents is not None:
+                    # Add file to ZIP with just the filename (no path)
+                    with zip_file.open(filename, 'w') as entry:
+                        for offset in range(0, len(contents), CHUNK_BYTES):
+                            entry.write(contents[offset:offset + CHUNK_BYTES])
+                    transfer["bytes_in"] += len(contents)
+                    logger.info(f"Added {filename} to export ZIP")
+                transfer["files_done"] += 1
+        pipe.close()
+        _finish_transfer(transfer, "done")
+    except TransferCancelled:
+        _finish_transfer(transfer, "cancelled")
+        logger.info(f"Export {transfer['id']} cancelled by the client")
+    except Exception as e:
+        _finish_transfer(transfer, "failed", str(e))
+        logger.error(f"Failed to export saves: {e}")
+    finally:
+        # Always tell the response the archive has ended
+        while not pipe.cancelled.is_set():
+            try:
+                pipe.chunks.put(_DONE, timeout=0.5)
+                break
+            except queue.Full:
+                continue
+
+
+def start_export(filenames: list[str]):
+    """(transfer, async iterator of ZIP chunks) for the given saves"""
+    transfer = _start_transfer("export", len(filenames))
+    pipe = _ChunkPipe(transfer)
+
+    async def chunks():
+        worker = threading.Thread(target=_write_archive, args=(pipe, filenames), daemon=True)
+        worker.start()
+        try:
+            while True:
+                chunk = await asyncio.to_thread(pipe.next_chunk)
+                if chunk is _DONE:
+                    break
+                yield chunk
+        finally:
+            pipe.cancelled.set()
+
+    return transfer, chunks()
+
+
+def _extract_entry(zip_file: zipfile.ZipFile, info: zipfile.ZipInfo) -> tuple[str, int]:
+    """Stream an entry into a temp file in the saves directory; returns (path, size)"""
+    fd, path = tempfile.mkstemp(dir=db.SAVES_DIR, prefix='.import-', suffix='.tmp')
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as f, zip_file.open(info) as entry:
+            while chunk := entry.read(CHUNK_BYTES):
+                size += len(chunk)
+                # Checked while reading so a lying size header cannot exceed the limit either
+                if size > MAX_IMPORT_ENTRY_BYTES:
+                    raise ValueError(f"{info.filename} is larger than its header claims")
+                f.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, size
+
+
+def _import_archive(fileobj, transfer: dict, loop) -> tuple[list[str], list[dict]]:
+    imported = []
+    rejected = []
+    with zipfile.ZipFile(fileobj, 'r') as zip_file:
+        entries = [
+            info for info in zip_file.infolist()
+            if not info.is_dir() and info.filename.endswith(db.SAVE_EXTENSIONS)
+            and not os.path.basename(info.filename).startswith('.')
+        ]
+        transfer["files_total"] = len(entries)
+        for info in entries:
+            name = os.path.basename(info.filename)
+            transfer["current"] = name
+            if info.file_size > MAX_IMPORT_ENTRY_BYTES:
+                logger.warning(f"Skipped {info.filename}: {info.file_size} bytes is over the import limit")
+                rejected.append({"filename": name, "detail": "Over the import size limit"})
+                transfer["files_done"] += 1
+                transfer["files_rejected"] += 1
+                continue
+            path, size = _extract_entry(zip_file, info)
+            try:
+                # Checked in the validation workers, exactly like an upload
+                result = asyncio.run_coroutine_threadsafe(
+                    validation.validate(path, binary=name.endswith(".mhome")), loop).result()
+                report = result["report"]
+                if report["valid"]:
+                    # Installing touches journal state owned by the event loop
+                    asyncio.run_coroutine_threadsafe(
+                        db.install_save_file(path, name, result["hash"], result["summary"]), loop).result()
+            finally:
+                if os.path.exists(path):
+                    os.remove(path)
+            transfer["bytes_in"] += info.compress_size
+            transfer["files_done"] += 1
+            if not report["valid"]:
+                first = report["errors"][0]
+                location = f" at {first['path']}" if first["path"] else ""
+                logger.warning(f"Skipped {info.filename}: invalid save file{location}: {first['message']}")
+                rejected.append({"filename": name, "detail": f"Invalid save file{location}: {first['message']}",
+                                 "validation": report})
+                transfer["files_rejected"] += 1
+                continue
+            transfer["bytes_out"] += size
+            imported.append(name)
+            logger.info(f"Imported save file: {info.filename}")
+    return imported, rejected
+
+
+async def import_archive(fileobj) -> tuple[dict, list[str], list[dict]]:
+    """Extract the saves in a ZIP file object off the event loop; returns (transfer, imported names, rejected entries)"""
+    transfer = _start_transfer("import")
+    try:
+        imported, rejected = await asyncio.to_thread(_import_archive, fileobj, transfer, asyncio.get_running_loop())
+    except Exception as e:
+        _finish_transfer(transfer, "failed", str(e))
+        raise
+    _finish_transfer(transfer, "done")
+    return transfer, imported, rejected
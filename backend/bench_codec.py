@@ -0,0 +1,55 @@
+"""Micro-benchmark of the codec against the standard json + pydantic path.
+
+Usage: python bench_codec.py [save.json ...]   (defaults to the sample saves)
+"""
+import glob
+import json
+import os
+import sys
+import timeit
+import warnings
+
+import codec
+from models import Home
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SAVES = sorted(
+    glob.glob(os.path.join(HERE, "saves", "*.json")) + glob.glob(os.path.join(HERE, "..", "saves", "*.json"))
+)
+
+
+def _best(fn, number: int) -> float:
+    """Best per-call time in microseconds over a few repeats"""
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def bench(path: str):
+    with open(path, 'rb') as f:
+        raw = f.read()
+    home = Home(**json.loads(raw))
+    data = home.dict()
+    event = {"type": "lights_changed", "home_id": home.id, "version": 1,
+             "lights": [{"id": light.id, "name": light.name, "state": light.state.dict()}
+                        for floor in home.floors for light in floor.lights]}
+    number = max(10, 200_000 // max(len(raw), 1))
+
+    cases = [
+        ("decode home", lambda: Home(**json.loads(raw)), lambda: codec.decode_home(raw)),
+        ("encode save", lambda: json.dumps(home.dict(), indent=2).encode('utf-8'),
+         lambda: codec.dumps(home.dict(), indent=True)),
+        ("encode response", lambda: json.dumps(data).encode('utf-8'), lambda: codec.encode_home(home)),
+        ("encode event", lambda: json.dumps(event), lambda: codec.dumps(event)),
+    ]
+    print(f"{os.path.relpath(path, HERE)} ({len(raw)} bytes, {number} calls)")
+    for name, baseline, candidate in cases:
+        before = _best(baseline, number)
+        after = _best(candidate, number)
+        print(f"  {name:<16} json {before:9.1f} us   codec {after:9.1f} us   x{before / after:5.2f}")
+
+
+if __name__ == "__main__":
+    # The baseline uses the deprecated pydantic v1-style .dict() like the rest of the code
+    warnings.simplefilter("ignore", DeprecationWarning)
+    print(f"orjson: {'yes' if codec.orjson is not None else 'no (standard library fallback)'}")
+    for path in sys.argv[1:] or DEFAULT_SAVES:
+        bench(path)
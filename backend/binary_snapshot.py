@@ -0,0 +1,121 @@
+import codec
+import struct
+
+try:
+    import msgpack
+except ImportError:  # floors fall back to compact JSON blobs
+    msgpack = None
+
+# Compact binary save format (".mhome"):
+#
+#   8 bytes   magic  b"MIMESYS1"
+#   4 bytes   header length, big-endian unsigned int
+#   N bytes   header: compact JSON with the home metadata and a floor index
+#             [{"id", "name", "level", "offset", "length", "walls", "lights", "cubes"}]
+#   ...       one blob per floor, msgpack (or compact JSON when msgpack is not
+#             installed, recorded as "codec" in the header); offsets are
+#             relative to the first byte after the header
+#
+# Reading the metadata or a single floor only touches the header and that
+# floor's bytes, so large multi-floor homes never have to be parsed in full.
+MAGIC = b"MIMESYS1"
+FORMAT_VERSION = 1
+_HEADER_LEN = struct.Struct(">I")
+
+
+class SnapshotFormatError(ValueError):
+    pass
+
+
+def _encode_floor(floor: dict) -> bytes:
+    if msgpack is not None:
+        return msgpack.packb(floor)
+    return codec.dumps(floor)
+
+
+def _decode_floor(blob: bytes, floor_codec: str) -> dict:
+    if floor_codec == "msgpack":
+        if msgpack is None:
+            raise SnapshotFormatError("Snapshot was written with msgpack, which is not installed")
+        return msgpack.unpackb(blob)
+    return codec.loads(blob)
+
+
+def encode_home(data: dict) -> bytes:
+    """Encode a home dict (as produced by Home.dict()) into the binary format"""
+    blobs = []
+    index = []
+    offset = 0
+    for floor in data.get("floors", []):
+        blob = _encode_floor(floor)
+        index.append({
+            "id": floor["id"],
+            "name": floor["name"],
+            "level": floor["level"],
+            "offset": offset,
+            "length": len(blob),
+            "walls": len(floor.get("walls", [])),
+            "lights": len(floor.get("lights", [])),
+            "cubes": len(floor.get("cubes", [])),
+        })
+        blobs.append(blob)
+        offset += len(blob)
+
+    header = codec.dumps({
+        "format": FORMAT_VERSION,
+        "codec": "msgpack" if msgpack is not None else "json",
+        "home": {k: v for k, v in data.items() if k != "floors"},
+        "floors": index,
+    })
+    return b"".join([MAGIC, _HEADER_LEN.pack(len(header)), header, *blobs])
+
+
+def _read_header(f):
+    magic = f.read(len(MAGIC))
+    if magic != MAGIC:
+        raise SnapshotFormatError("Not a MimeSys binary snapshot")
+    (length,) = _HEADER_LEN.unpack(f.read(_HEADER_LEN.size))
+    header = codec.loads(f.read(length))
+    if header.get("format") != FORMAT_VERSION:
+        raise SnapshotFormatError(f"Unsupported snapshot format version: {header.get('format')}")
+    return header, len(MAGIC) + _HEADER_LEN.size + length
+
+
+def read_header(path: str) -> dict:
+    """Home metadata and floor index, without reading any floor data"""
+    with open(path, 'rb') as f:
+        header, _ = _read_header(f)
+    return header
+
+
+def read_floor(path: str, floor_id: str):
+    """Decode a single floor by id, or None if the snapshot has no such floor"""
+    with open(path, 'rb') as f:
+        header, base = _read_header(f)
+        for entry in header["floors"]:
+            if entry["id"] == floor_id:
+                f.seek(base + entry["offset"])
+                return _decode_floor(f.read(entry["length"]), header["codec"])
+    return None
+
+
+def decode_home(data: bytes) -> dict:
+    """Decode a whole snapshot back into a home dict"""
+    if data[:len(MAGIC)] != MAGIC:
+        raise SnapshotFormatError("Not a MimeSys binary snapshot")
+    (length,) = _HEADER_LEN.unpack_from(data, len(MAGIC))
+    base = len(MAGIC) + _HEADER_LEN.size
+    header = codec.loads(data[base:base + length])
+    if header.get("format") != FORMAT_VERSION:
+        raise SnapshotFormatError(f"Unsupported snapshot format version: {header.get('format')}")
+    base += length
+    floors = [
+        _decode_floor(data[base + entry["offset"]:base + entry["offset"] + entry["length"]], header["codec"])
+        for entry in header["floors"]
+    ]
+    return {**header["home"], "floors": floors}
+
+
+def load_home(path: str) -> dict:
+    with open(path, 'rb') as f:
+        return decode_home(f.read())
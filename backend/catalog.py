@@ -0,0 +1,209 @@
+import binary_snapshot
+import codec
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Save catalog: one metadata entry per save file, kept in memory and persisted
+# to CATALOG_FILE so a restart does not have to parse every save again.
+# Entries are refreshed incrementally - files whose (mtime, size) did not
+# change are never re-read - and writers update their entry directly.
+CATALOG_FILE = ".catalog.json"
+SORT_FIELDS = ("filename", "mtime", "size", "home_name", "floors", "lights", "walls", "cubes")
+
+_entries: dict[str, dict] = {}
+_lock = threading.RLock()
+_dirty = False
+_saves_dir: str | None = None
+
+
+def summarize(data: dict) -> dict:
+    floors = data.get("floors", [])
+    return {
+        "home_id": data.get("id"),
+        "home_name": data.get("name"),
+        "floors": len(floors),
+        "walls": sum(len(floor.get("walls", [])) for floor in floors),
+        "lights": sum(len(floor.get("lights", [])) for floor in floors),
+        "cubes": sum(len(floor.get("cubes", [])) for floor in floors),
+    }
+
+
+def _summarize_header(header: dict) -> dict:
+    floors = header.get("floors", [])
+    return {
+        "home_id": header["home"].get("id"),
+        "home_name": header["home"].get("name"),
+        "floors": len(floors),
+        "walls": sum(entry.get("walls", 0) for entry in floors),
+        "lights": sum(entry.get("lights", 0) for entry in floors),
+        "cubes": sum(entry.get("cubes", 0) for entry in floors),
+    }
+
+
+def _build_entry(filename: str, stat: os.stat_result, contents: bytes | None, summary: dict | None,
+                 digest: str | None = None) -> dict:
+    if summary is None:
+        if filename.endswith(".mhome"):
+            path = os.path.join(_saves_dir, filename)
+            summary = _summarize_header(binary_snapshot.read_header(path))
+        else:
+            summary = summarize(codec.loads(contents))
+    return {
+        "filename": filename,
+        "format": "binary" if filename.endswith(".mhome") else "json",
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "hash": digest or hashlib.sha256(contents).hexdigest(),
+        **summary,
+    }
+
+
+def load(saves_dir: str):
+    """Load the persisted catalog (if any) for a saves directory"""
+    global _saves_dir
+    with _lock:
+        _saves_dir = saves_dir
+        _entries.clear()
+        path = os.path.join(saves_dir, CATALOG_FILE)
+        if os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    _entries.update(codec.loads(f.read()))
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable save catalog: {e}")
+
+
+def refresh(extensions: tuple) -> bool:
+    """Re-stat the saves directory and re-read only new or modified saves; returns True if anything changed"""
+    global _dirty
+    seen = set()
+    changed = False
+    for dir_entry in os.scandir(_saves_dir):
+        name = dir_entry.name
+        # Skip hidden files (the catalog itself, temp files from atomic writes)
+        if name.startswith('.') or not dir_entry.is_file() or not name.endswith(extensions):
+            continue
+        seen.add(name)
+        stat = dir_entry.stat()
+        with _lock:
+            current = _entries.get(name)
+        if current and current["mtime"] == stat.st_mtime and current["size"] == stat.st_size:
+            continue
+        try:
+            with open(dir_entry.path, 'rb') as f:
+                contents = f.read()
+            entry = _build_entry(name, stat, contents, None)
+        except Exception as e:
+            logger.warning(f"Failed to index save {name}: {e}")
+            entry = {"filename": name, "format": None, "size": stat.st_size, "mtime": stat.st_mtime,
+                     "hash": None, "home_id": None, "home_name": None, "error": str(e)}
+        with _lock:
+            _entries[name] = entry
+        changed = True
+
+    with _lock:
+        for name in set(_entries) - seen:
+            del _entries[name]
+            changed = True
+        if changed:
+            _dirty = True
+    if changed:
+        persist()
+    return changed
+
+
+def record_write(filename: str, contents: bytes, data: dict | None = None):
+    """Update the entry of a save that was just written, without re-reading it"""
+    global _dirty
+    if _saves_dir is None:
+        return
+    try:
+        stat = os.stat(os.path.join(_saves_dir, filename))
+        entry = _build_entry(filename, stat, contents, summarize(data) if data is not None else None)
+    except Exception as e:
+        logger.warning(f"Failed to update catalog entry for {filename}: {e}")
+        return
+    with _lock:
+        _entries[filename] = entry
+        _dirty = True
+
+
+def record_file(filename: str, digest: str, summary: dict):
+    """Update the entry of a save moved into place whose hash and summary are already known"""
+    global _dirty
+    if _saves_dir is None:
+        return
+    try:
+        stat = os.stat(os.path.join(_saves_dir, filename))
+    except OSError as e:
+        logger.warning(f"Failed to update catalog entry for {filename}: {e}")
+        return
+    with _lock:
+        _entries[filename] = _build_entry(filename, stat, None, summary, digest)
+        _dirty = True
+
+
+def forget(filename: str):
+    """Drop the entry of a save that was just deleted"""
+    global _dirty
+    with _lock:
+        if _entries.pop(filename, None) is not None:
+            _dirty = True
+
+
+def persist():
+    """Write the catalog to disk if it changed since the last write"""
+    global _dirty
+    with _lock:
+        if not _dirty or _saves_dir is None:
+            return
+        payload = codec.dumps(_entries)
+        _dirty = False
+    fd, tmp_path = tempfile.mkstemp(dir=_saves_dir, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, os.path.join(_saves_dir, CATALOG_FILE))
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        logger.warning(f"Failed to persist save catalog: {e}")
+
+
+def names() -> list[str]:
+    with _lock:
+        return sorted(_entries)
+
+
+def get(filename: str):
+    with _lock:
+        return _entries.get(filename)
+
+
+def paginate(entries: list[dict], offset: int = 0, limit: int = 50, sort: str = "filename", descending: bool = False) -> dict:
+    """One page of catalog entries sorted by any of SORT_FIELDS; entries missing the field sort last"""
+    if sort not in SORT_FIELDS:
+        sort = "filename"
+    present = [entry for entry in entries if entry.get(sort) is not None]
+    missing = [entry for entry in entries if entry.get(sort) is None]
+    present.sort(key=lambda entry: entry[sort], reverse=descending)
+    ordered = present + missing
+    return {
+        "total": len(ordered),
+        "offset": offset,
+        "limit": limit,
+        "sort": sort,
+        "order": "desc" if descending else "asc",
+        "items": ordered[offset:offset + limit],
+    }
+
+
+def query(offset: int = 0, limit: int = 50, sort: str = "filename", descending: bool = False) -> dict:
+    with _lock:
+        entries = list(_entries.values())
+    return paginate(entries, offset, limit, sort, descending)
@@ -0,0 +1,45 @@
+import json
+from fastapi.responses import JSONResponse as _JSONResponse
+from models import Home
+
+try:
+    import orjson
+except ImportError:  # the standard library is used instead
+    orjson = None
+
+# One place for JSON encoding and decoding. With orjson installed everything
+# goes straight to and from bytes; homes are validated directly from bytes by
+# pydantic's JSON parser and encoded directly by the model serializer, never
+# through an intermediate dict.
+
+
+def dumps(data, indent: bool = False) -> bytes:
+    """Encode to UTF-8 JSON bytes (2-space indented when indent is set)"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(data, indent=2).encode('utf-8')
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data: bytes | str):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def decode_home(data: bytes | str) -> Home:
+    """Parse and validate a home straight from JSON bytes"""
+    return Home.model_validate_json(data)
+
+
+def encode_home(home: Home, indent: bool = False, exclude=None) -> bytes:
+    """Serialize a home straight from the model"""
+    return home.model_dump_json(indent=2 if indent else None, exclude=exclude).encode('utf-8')
+
+
+class JSONResponse(_JSONResponse):
+    """Default API response class, rendering through the codec"""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,125 @@
+import codec
+import struct
+import zlib
+from models import Home
+
+# Compact binary encoding of light state updates, for displays on slow links.
+#
+# Lights are referenced by their position in a per-home light index (every
+# light id in floor order), which clients fetch once from
+# /api/homes/{home_id}/lights/index. The index is identified by a 32-bit tag
+# (CRC32 of the ids); a frame whose tag differs from the client's copy means
+# the index has to be fetched again.
+#
+#   1 byte    format, FORMAT_VERSION
+#   4 bytes   index tag
+#   4 bytes   event version
+#   4 bytes   first_version of a coalesced event (0 if none)
+#   2 bytes   light count
+#   8 bytes per light: index (u16), flags (u8, bit 0 = on),
+#             intensity in thousandths (u16), red, green, blue (u8)
+#
+# All integers are little-endian. Events that cannot be expressed this way
+# (other event types, removals, lights missing from the index, colors that
+# are not #rrggbb) are sent as JSON instead. A list of events (the compact
+# /changes body) is a sequence of records: kind (u8, RECORD_JSON or
+# RECORD_LIGHTS), length (u32), payload.
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<BIIIH")
+_LIGHT = struct.Struct("<HBHBBB")
+_RECORD = struct.Struct("<BI")
+_MAX_INTENSITY = 0xFFFF / 1000
+RECORD_JSON = 0
+RECORD_LIGHTS = 1
+MEDIA_TYPE = "application/vnd.mimesys.changes"
+
+_indexes: dict[str, tuple[list, "LightIndex"]] = {}
+
+
+class LightIndex:
+    def __init__(self, home: Home):
+        self.entries = [
+            {"id": light.id, "name": light.name, "floor_id": floor.id}
+            for floor in home.floors
+            for light in floor.lights
+        ]
+        self.positions = {entry["id"]: position for position, entry in enumerate(self.entries)}
+        self.tag = zlib.crc32("\n".join(self.positions).encode('utf-8'))
+
+    def to_dict(self, home_id: str) -> dict:
+        return {"home_id": home_id, "tag": self.tag, "format": FORMAT_VERSION, "lights": self.entries}
+
+
+def light_index(home: Home | None) -> LightIndex | None:
+    """Light index of a home, rebuilt only when its floors or light lists change"""
+    if home is None:
+        return None
+    stamp = [home] + [floor.lights for floor in home.floors]
+    cached = _indexes.get(home.id)
+    if cached is not None and len(cached[0]) == len(stamp) and all(a is b for a, b in zip(cached[0], stamp)):
+        return cached[1]
+    index = LightIndex(home)
+    _indexes[home.id] = (stamp, index)
+    return index
+
+
+def _rgb(color: str):
+    if len(color) != 7 or not color.startswith("#"):
+        return None
+    try:
+        value = int(color[1:], 16)
+    except ValueError:
+        return None
+    return value >> 16, (value >> 8) & 0xFF, value & 0xFF
+
+
+def encode_lights(event: dict, index: LightIndex) -> bytes | None:
+    """Compact frame for a lights_changed event, or None if it has to stay JSON"""
+    if event.get("type") != "lights_changed" or "removed" in event:
+        return None
+    lights = event.get("lights", [])
+    if len(lights) > 0xFFFF:
+        return None
+    parts = [_HEADER.pack(FORMAT_VERSION, index.tag, event["version"], event.get("first_version", 0), len(lights))]
+    for light in lights:
+        position = index.positions.get(light["id"])
+        state = light.get("state") or {}
+        rgb = _rgb(state.get("color", ""))
+        intensity = state.get("intensity", 0)
+        if position is None or position > 0xFFFF or rgb is None or not 0 <= intensity <= _MAX_INTENSITY:
+            return None
+        parts.append(_LIGHT.pack(position, 1 if state.get("on") else 0, round(intensity * 1000), *rgb))
+    return b"".join(parts)
+
+
+def decode_lights(frame: bytes, index: LightIndex) -> dict:
+    """Inverse of encode_lights (ids and states only)"""
+    format_version, tag, version, first_version, count = _HEADER.unpack_from(frame)
+    if format_version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported compact format {format_version}")
+    if tag != index.tag:
+        raise ValueError("Light index is out of date")
+    lights = []
+    for offset in range(_HEADER.size, _HEADER.size + count * _LIGHT.size, _LIGHT.size):
+        position, flags, intensity, red, green, blue = _LIGHT.unpack_from(frame, offset)
+        lights.append({
+            "id": index.entries[position]["id"],
+            "state": {"on": bool(flags & 1), "color": f"#{red:02x}{green:02x}{blue:02x}", "intensity": intensity / 1000},
+        })
+    event = {"type": "lights_changed", "version": version, "lights": lights}
+    if first_version:
+        event["first_version"] = first_version
+    return event
+
+
+def encode_events(events: list[dict], index: LightIndex) -> bytes:
+    """Records for a list of events, compact where possible"""
+    parts = []
+    for event in events:
+        frame = encode_lights(event, index)
+        kind = RECORD_LIGHTS
+        if frame is None:
+            frame, kind = codec.dumps(event), RECORD_JSON
+        parts.append(_RECORD.pack(kind, len(frame)))
+        parts.append(frame)
+    return b"".join(parts)
@@ -1,42 +1,185 @@
-from models import Home, Floor, Wall, Light, LightState, Vector3
+from collections import OrderedDict
+from models import Home, Floor, Wall, Light, LightState, Vector3, Scene, Cube, RoomLabel
 import logging
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# In-memory storage for now
-homes_db = {}
+# In-memory home cache, least recently used first. Several homes can be
+# resident at once; get_homes() returns only the active home, which the UI,
+# background color and name-based light control operate on. Other homes are
+# loaded lazily by id or save name and evicted under HOME_CACHE_MAX_HOMES /
+# HOME_CACHE_MAX_BYTES (approximated by save size).
+homes_db: OrderedDict[str, Home] = OrderedDict()
+_active_home_id: str | None = None
+_home_saves: dict[str, str] = {}
+_home_sizes: dict[str, int] = {}
+_cache_stats = {
+    "hits": 0,
+    "misses": 0,
+    "evictions": 0,
+    "flushed_before_eviction": 0,
+}
+
+# Secondary light indexes over all resident homes, kept in sync whenever a
+# home enters, is replaced in or leaves the cache. Entries reference the live
+# (home, floor, light) objects, so in-place state changes need no reindexing.
+_lights_by_id: dict[str, tuple[Home, Floor, Light]] = {}
+_lights_by_name: dict[str, list[tuple[Home, Floor, Light]]] = {}
+_indexed_lights: dict[str, list[tuple[str, str]]] = {}
+
+def _unindex_home(home_id: str):
+    light_table.drop(home_id)
+    for light_id, name in _indexed_lights.pop(home_id, []):
+        entry = _lights_by_id.get(light_id)
+        if entry is not None and entry[0].id == home_id:
+            del _lights_by_id[light_id]
+        entries = _lights_by_name.get(name)
+        if entries is not None:
+            entries[:] = [entry for entry in entries if entry[0].id != home_id]
+            if not entries:
+                del _lights_by_name[name]
+
+def _index_home(home: Home):
+    _unindex_home(home.id)
+    indexed = _indexed_lights[home.id] = []
+    for floor in home.floors:
+        for light in floor.lights:
+            _lights_by_id[light.id] = (home, floor, light)
+            _lights_by_name.setdefault(light.name, []).append((home, floor, light))
+            indexed.append((light.id, light.name))
+
+def reindex_home(home: Home):
+    """Rebuild the light indexes of a home after its floors or lights changed structurally"""
+    if home.id in homes_db:
+        _index_home(home)
+
+def find_light(light_id: str, home_id: str | None = None):
+    """(home, floor, light) for a light id among resident homes, or None"""
+    entry = _lights_by_id.get(light_id)
+    if entry is None or (home_id is not None and entry[0].id != home_id):
+        return None
+    return entry
+
+def find_lights_by_name(name: str, home_id: str | None = None):
+    """All (home, floor, light) entries with this name, optionally within one home"""
+    entries = _lights_by_name.get(name, [])
+    if home_id is None:
+        return list(entries)
+    return [entry for entry in entries if entry[0].id == home_id]
 
 def get_homes():
+    home = homes_db.get(_active_home_id)
+    if home is None and _active_home_id is not None and events.is_shared():
+        # Another worker switched to a home this one has not loaded yet
+        home = get_home(_active_home_id)
+    return [home] if home else []
+
+def get_resident_homes():
     return list(homes_db.values())
 
+def _lookup_resident(home_id: str):
+    home = homes_db.get(home_id)
+    if home is not None:
+        homes_db.move_to_end(home_id)
+        _cache_stats["hits"] += 1
+    else:
+        _cache_stats["misses"] += 1
+    return home
+
 def get_home(home_id: str):
-    return homes_db.get(home_id)
+    home = _lookup_resident(home_id)
+    if home is not None:
+        return home
+    filename = _find_save_for_home(home_id)
+    if not filename:
+        return None
+    try:
+        home = _read_and_replay(filename)
+    except Exception as e:
+        logger.error(f"Failed to load home {home_id} from {filename}: {e}")
+        return None
+    if home is None or home.id != home_id:
+        return None
+    _cache_home(home, filename)
+    return home
+
+async def fetch_home(home_id: str):
+    """get_home, but a cache miss is parsed off the event loop"""
+    home = _lookup_resident(home_id)
+    if home is not None:
+        return home
+    filename = await asyncio.to_thread(_find_save_for_home, home_id)
+    if not filename:
+        return None
+    try:
+        home = await asyncio.to_thread(_read_and_replay, filename)
+    except Exception as e:
+        logger.error(f"Failed to load home {home_id} from {filename}: {e}")
+        return None
+    if home is None or home.id != home_id:
+        return None
+    # Another request may have loaded it while we were parsing
+    if home_id in homes_db:
+        return homes_db[home_id]
+    _cache_home(home, filename)
+    return home
 
 def create_home(home: Home):
-    homes_db[home.id] = home
+    _cache_home(home, _home_saves.get(home.id), activate=_active_home_id not in homes_db)
     return home
 
 def reset_home():
+    # Nothing pending may be lost when everything is dropped
+    _flush_dirty_homes_sync()
+    for home_id in homes_db:
+        events.release_log(home_id)
     homes_db.clear()
+    _home_sizes.clear()
+    _lights_by_id.clear()
+    _lights_by_name.clear()
+    _indexed_lights.clear()
     home = Home(name="New Home")
     floor = Floor(level=0, name="Ground Floor")
     home.floors = [floor]
-    homes_db[home.id] = home
+    _cache_home(home, None, activate=True)
+    return home
+
+def set_active_home(home: Home, filename: str | None = None):
+    """Make a home resident and the active one"""
+    _cache_home(home, filename, activate=True)
     return home
 
 def update_home(home_id: str, home: Home):
-    homes_db[home_id] = home
+    # The replacement supersedes whatever the old copy still had pending
+    _dirty_homes.pop(home_id, None)
+    _cache_home(home, None)
     # Auto-save to default.json after updates
-    auto_save_home(home)
+    record_home_replace(home)
+    if events.is_shared():
+        # Other workers reload a replaced home from disk
+        _flush_dirty_homes_sync(home_id)
     return home
 
 
 # Persistence Logic - Move definitions up to use them immediately
 import os
 import json
+import asyncio
+import tempfile
+import time
+from contextlib import contextmanager
 from glob import glob
+try:
+    import fcntl
+except ImportError:  # single-process only
+    fcntl = None
+import binary_snapshot
+import catalog
+import codec
+import events
+import light_table
 
 # Use DATA_DIR environment variable with smart fallback for local development
 # In Home Assistant addon: DATA_DIR=/data (persistent across restarts)
@@ -48,48 +191,359 @@ else:
     # Local development fallback
     SAVES_DIR = os.path.join(os.path.dirname(__file__), '..', 'saves')
 
-# Create saves directory with error handling
-try:
-    if not os.path.exists(SAVES_DIR):
-        os.makedirs(SAVES_DIR, exist_ok=True)
-        logger.info(f"Created saves directory: {SAVES_DIR}")
-    else:
-        logger.info(f"Using existing saves directory: {SAVES_DIR}")
-    
-    # Verify write permissions
-    test_file = os.path.join(SAVES_DIR, '.write_test')
+# Storage backend: "json" keeps one file per save in SAVES_DIR, "sqlite" keeps
+# saves as normalized rows in a WAL-mode database (see sqlite_store.py).
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'json').lower()
+SQLITE_PATH = os.getenv('SQLITE_PATH')
+
+HOME_CACHE_MAX_HOMES = max(1, int(os.getenv('HOME_CACHE_MAX_HOMES', '4')))
+HOME_CACHE_MAX_BYTES = int(os.getenv('HOME_CACHE_MAX_BYTES', '0'))  # 0 = no byte budget
+
+if STORAGE_BACKEND == "sqlite":
+    import sqlite_store
+
+# On-disk format for the json backend: "json" (pretty-printed) or "binary"
+# (compact .mhome snapshots with a per-floor index, see binary_snapshot.py).
+# Both formats are always readable; SAVE_FORMAT only picks what gets written.
+SAVE_FORMAT = os.getenv('SAVE_FORMAT', 'json').lower()
+SAVE_EXTENSIONS = (".json", ".mhome")
+SAVE_EXTENSION = ".mhome" if SAVE_FORMAT == "binary" and STORAGE_BACKEND == "json" else ".json"
+
+
+def _prepare_saves_dir():
+    """Create the saves directory and verify it is writable, falling back to a temp directory"""
+    global SAVES_DIR
     try:
-        with open(test_file, 'w') as f:
-            f.write('test')
-        os.remove(test_file)
-        logger.info(f"Verified write permissions for: {SAVES_DIR}")
-    except Exception as e:
-        logger.error(f"No write permission for saves directory: {SAVES_DIR}. Error: {e}")
+        if not os.path.exists(SAVES_DIR):
+            os.makedirs(SAVES_DIR, exist_ok=True)
+            logger.info(f"Created saves directory: {SAVES_DIR}")
+        else:
+            logger.info(f"Using existing saves directory: {SAVES_DIR}")
         
-except Exception as e:
-    logger.error(f"Failed to create saves directory: {SAVES_DIR}. Error: {e}")
-    # Fallback to temp directory
-    import tempfile
-    SAVES_DIR = os.path.join(tempfile.gettempdir(), 'home-digital-twin-saves')
-    os.makedirs(SAVES_DIR, exist_ok=True)
-    logger.warning(f"Using temporary fallback directory: {SAVES_DIR}")
+        # Verify write permissions
+        test_file = os.path.join(SAVES_DIR, '.write_test')
+        try:
+            with open(test_file, 'w') as f:
+                f.write('test')
+            os.remove(test_file)
+            logger.info(f"Verified write permissions for: {SAVES_DIR}")
+        except Exception as e:
+            logger.error(f"No write permission for saves directory: {SAVES_DIR}. Error: {e}")
+            
+    except Exception as e:
+        logger.error(f"Failed to create saves directory: {SAVES_DIR}. Error: {e}")
+        # Fallback to temp directory
+        SAVES_DIR = os.path.join(tempfile.gettempdir(), 'home-digital-twin-saves')
+        os.makedirs(SAVES_DIR, exist_ok=True)
+        logger.warning(f"Using temporary fallback directory: {SAVES_DIR}")
 
-def load_from_file_internal(filename: str):
-    """Internal function to load a home from a save file"""
+
+def init_storage():
+    """Prepare the saves directory and open the storage backend (blocking; run off the event loop)"""
+    global SQLITE_PATH
+    with _timed("saves_dir"):
+        _prepare_saves_dir()
+
+    if STORAGE_BACKEND == "sqlite":
+        SQLITE_PATH = SQLITE_PATH or os.path.join(SAVES_DIR, 'mimesys.sqlite3')
+        with _timed("sqlite_open"):
+            sqlite_store.connect(SQLITE_PATH)
+        if not sqlite_store.list_saves():
+            # First start on SQLite: bring existing JSON saves along
+            with _timed("sqlite_import"):
+                for path in sorted(glob(os.path.join(SAVES_DIR, "*.json"))):
+                    try:
+                        with open(path, 'rb') as f:
+                            sqlite_store.save_home(codec.decode_home(f.read()), os.path.basename(path))
+                        logger.info(f"Imported {os.path.basename(path)} into SQLite storage")
+                    except Exception as e:
+                        logger.error(f"Failed to import {os.path.basename(path)} into SQLite storage: {e}")
+    else:
+        with _timed("catalog_load"):
+            catalog.load(SAVES_DIR)
+
+
+def _strip_extension(filename: str) -> str:
+    for ext in SAVE_EXTENSIONS:
+        if filename.endswith(ext):
+            return filename[:-len(ext)]
+    return filename
+
+
+def _storage_name(filename: str) -> str:
+    """Name a save is written under in the configured format"""
+    return _strip_extension(filename) + SAVE_EXTENSION
+
+
+def _resolve_save_name(filename: str):
+    """Existing save for a name with or without extension, preferring the configured format"""
+    base = _strip_extension(filename)
+    names = [base + SAVE_EXTENSION] + [base + ext for ext in SAVE_EXTENSIONS if ext != SAVE_EXTENSION]
+    variants = [name for name in names if save_exists(name)]
+    if len(variants) > 1 and STORAGE_BACKEND == "json":
+        # Both formats on disk (left from before writes removed the other one): the newest is current
+        return max(variants, key=lambda name: os.path.getmtime(os.path.join(SAVES_DIR, name)))
+    if filename in variants:
+        return filename
+    return variants[0] if variants else None
+
+
+def _remove_other_formats(filename: str):
+    """Delete the other-format file of a save just written, which it supersedes"""
+    base = _strip_extension(filename)
+    for ext in SAVE_EXTENSIONS:
+        other = base + ext
+        if other == filename:
+            continue
+        try:
+            os.remove(os.path.join(SAVES_DIR, other))
+        except FileNotFoundError:
+            continue
+        catalog.forget(other)
+        logger.info(f"Removed {other}, superseded by {filename}")
+
+
+def _read_home(filename: str):
+    """Read a save from the active storage backend, or None if it does not exist"""
+    if STORAGE_BACKEND == "sqlite":
+        return sqlite_store.load_home(filename)
     path = os.path.join(SAVES_DIR, filename)
     if not os.path.exists(path):
-        logger.warning(f"Save file not found: {path}")
         return None
-    
+    if filename.endswith(".mhome"):
+        return Home(**binary_snapshot.load_home(path))
+    with open(path, 'rb') as f:
+        return codec.decode_home(f.read())
+
+
+def get_save_metadata(filename: str):
+    """Home metadata and per-floor counts of a save, reading only the index for binary saves"""
+    name = _resolve_save_name(filename)
+    if name is None:
+        return None
+    if name.endswith(".mhome") and STORAGE_BACKEND == "json":
+        header = binary_snapshot.read_header(os.path.join(SAVES_DIR, name))
+        home = header["home"]
+        floors = [{k: v for k, v in entry.items() if k not in ("offset", "length")} for entry in header["floors"]]
+        save_format = "binary"
+    else:
+        data = _read_home(name).dict()
+        home = {k: v for k, v in data.items() if k != "floors"}
+        floors = [
+            {"id": floor["id"], "name": floor["name"], "level": floor["level"],
+             "walls": len(floor["walls"]), "lights": len(floor["lights"]), "cubes": len(floor["cubes"])}
+            for floor in data["floors"]
+        ]
+        save_format = "json"
+    return {"filename": name, "format": save_format, "home": home, "floors": floors}
+
+
+def load_floor(filename: str, floor_id: str):
+    """Load a single floor of a save, decoding only that floor for binary saves"""
+    name = _resolve_save_name(filename)
+    if name is None:
+        return None
+    if name.endswith(".mhome") and STORAGE_BACKEND == "json":
+        data = binary_snapshot.read_floor(os.path.join(SAVES_DIR, name), floor_id)
+        return Floor(**data) if data else None
+    for floor in _read_home(name).floors:
+        if floor.id == floor_id:
+            return floor
+    return None
+
+
+def export_save_json(filename: str):
+    """A save re-encoded as JSON regardless of its on-disk format, or None if it does not exist"""
+    name = _resolve_save_name(filename)
+    if name is None:
+        return None
+    home = _read_home(name)
+    return name, _encode_home(home.dict())
+
+
+def save_exists(filename: str) -> bool:
+    if STORAGE_BACKEND == "sqlite":
+        return sqlite_store.save_exists(filename)
+    return os.path.exists(os.path.join(SAVES_DIR, filename))
+
+
+def save_name_taken(filename: str) -> bool:
+    """True if a save of this name exists in any format"""
+    return _resolve_save_name(filename) is not None
+
+
+def get_all_save_files():
+    """Get list of all save files"""
+    if STORAGE_BACKEND == "sqlite":
+        return sqlite_store.list_saves()
+    catalog.refresh(SAVE_EXTENSIONS)
+    variants: dict[str, list[str]] = {}
+    for name in catalog.names():
+        variants.setdefault(_strip_extension(name), []).append(name)
+    # One name per save: of a save left in both formats, the one that loads
+    return sorted(names[0] if len(names) == 1 else _resolve_save_name(base) for base, names in variants.items())
+
+
+def get_save_catalog(offset: int = 0, limit: int = 50, sort: str = "filename", descending: bool = False):
+    """A page of save metadata (size, mtime, home name, counts, content hash)"""
+    if STORAGE_BACKEND == "sqlite":
+        return catalog.paginate(sqlite_store.catalog_entries(), offset, limit, sort, descending)
+    entries = [entry for entry in map(catalog.get, get_all_save_files()) if entry is not None]
+    return catalog.paginate(entries, offset, limit, sort, descending)
+
+
+def get_catalog_entry(filename: str):
+    if STORAGE_BACKEND == "sqlite":
+        return next((entry for entry in sqlite_store.catalog_entries() if entry["filename"] == filename), None)
+    return catalog.get(filename)
+
+
+def read_save_bytes(filename: str):
+    """Raw JSON bytes of a save, or None if it does not exist"""
+    if STORAGE_BACKEND == "sqlite":
+        home = sqlite_store.load_home(filename)
+        return _encode_home(home.dict()) if home else None
+    path = os.path.join(SAVES_DIR, filename)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _store_save_file(path: str, filename: str, digest: str | None, summary: dict | None):
+    """Move a save from a temp file in SAVES_DIR into place (blocking; run in a thread)"""
+    if STORAGE_BACKEND == "sqlite":
+        with open(path, 'rb') as f:
+            contents = f.read()
+        if filename.endswith(".mhome"):
+            home = Home(**binary_snapshot.decode_home(contents))
+        else:
+            home = codec.decode_home(contents)
+        sqlite_store.save_home(home, filename)
+        os.remove(path)
+    else:
+        target = os.path.join(SAVES_DIR, filename)
+        os.chmod(path, _file_mode(target))
+        os.replace(path, target)
+        if digest is not None:
+            catalog.record_file(filename, digest, summary)
+        # Otherwise the catalog re-indexes it on its next refresh
+        _remove_other_formats(filename)
+
+
+async def install_save_file(path: str, filename: str, digest: str | None = None, summary: dict | None = None):
+    """Move an uploaded or imported save from a temp file in SAVES_DIR into place.
+
+    The file work runs in a thread; the journal it supersedes is dropped on the
+    event loop, which owns the journal handles.
+    """
+    await asyncio.to_thread(_store_save_file, path, filename, digest, summary)
+    _discard_journal(filename)
+
+
+def _read_and_replay(filename: str):
+    """Read a save and apply its journal; touches no in-memory state, so it can run in a thread"""
+    home = _read_home(filename)
+    if home is None:
+        return None
+    return _replay_journal(home, filename)
+
+
+def _find_save_for_home(home_id: str):
+    """Most recently written save holding this home id"""
+    # Other workers may have written a newer save than the one remembered here
+    if home_id in _home_saves and not events.is_shared():
+        return _home_saves[home_id]
+    if STORAGE_BACKEND == "sqlite":
+        return sqlite_store.find_save_by_home_id(home_id)
+    catalog.refresh(SAVE_EXTENSIONS)
+    matches = [entry for entry in catalog.query(limit=10 ** 6, sort="mtime", descending=True)["items"]
+               if entry.get("home_id") == home_id]
+    return matches[0]["filename"] if matches else None
+
+
+def _estimate_home_size(filename: str | None) -> int:
+    entry = catalog.get(filename) if filename and STORAGE_BACKEND == "json" else None
+    return entry["size"] if entry else 0
+
+
+def _cache_home(home: Home, filename: str | None, activate: bool = False):
+    """Make a home resident (replacing an older copy of it) and enforce the cache budget"""
+    global _active_home_id
+    previous = homes_db.get(home.id)
+    if previous is not None and previous is not home and home.id in _dirty_homes:
+        # Persist pending changes of the copy being replaced first
+        _flush_dirty_homes_sync(home.id)
+    homes_db[home.id] = home
+    homes_db.move_to_end(home.id)
+    if previous is None and filename and events.is_shared():
+        _replay_shared_events(home)
+    _index_home(home)
+    if filename:
+        _home_saves[home.id] = filename
+        _persisted_homes[filename] = home
+    _home_sizes[home.id] = _estimate_home_size(filename or _home_saves.get(home.id))
+    switched = activate and _active_home_id is not None and _active_home_id != home.id
+    if activate:
+        _active_home_id = home.id
+    _evict_homes(keep=home.id)
+    if switched and events.is_shared():
+        _announce_active_home(home)
+
+
+def _evict_homes(keep: str | None = None):
+    while len(homes_db) > HOME_CACHE_MAX_HOMES or (
+        HOME_CACHE_MAX_BYTES and sum(_home_sizes.values()) > HOME_CACHE_MAX_BYTES
+    ):
+        candidates = [home_id for home_id in homes_db if home_id not in (_active_home_id, keep)]
+        if not candidates:
+            break
+        clean = [home_id for home_id in candidates if home_id not in _dirty_homes]
+        victim = clean[0] if clean else candidates[0]
+        if victim in _dirty_homes:
+            _flush_dirty_homes_sync(victim)
+            _cache_stats["flushed_before_eviction"] += 1
+        home = homes_db.pop(victim)
+        _home_sizes.pop(victim, None)
+        _unindex_home(victim)
+        events.release_log(victim)
+        for filename, persisted in list(_persisted_homes.items()):
+            if persisted is home:
+                # Fold its journal so a later reload starts from a snapshot
+                if os.path.exists(_journal_path(filename)):
+                    _compact_journal_sync(filename)
+                _close_journal(filename)
+                _persisted_homes.pop(filename, None)
+        _cache_stats["evictions"] += 1
+        logger.info(f"Evicted home '{home.name}' from the home cache")
+
+
+def get_cache_stats():
+    return {
+        **_cache_stats,
+        "resident": len(homes_db),
+        "resident_bytes": sum(_home_sizes.values()),
+        "active_home_id": _active_home_id,
+        "max_homes": HOME_CACHE_MAX_HOMES,
+        "max_bytes": HOME_CACHE_MAX_BYTES,
+    }
+
+
+def _install_home(home: Home, filename: str):
+    _cache_home(home, filename, activate=True)
+
+
+def load_from_file_internal(filename: str):
+    """Internal function to load a home from a save file"""
     try:
-        with open(path, 'r') as f:
-            data = json.load(f)
-            home = Home(**data)
-            # Clear existing homes and load only this one
-            homes_db.clear()
-            homes_db[home.id] = home
-            logger.info(f"Successfully loaded home from: {filename} (cleared previous homes)")
-            return home
+        filename = _resolve_save_name(filename) or filename
+        home = _read_and_replay(filename)
+        if home is None:
+            logger.warning(f"Save file not found: {filename}")
+            return None
+        _install_home(home, filename)
+        logger.info(f"Successfully loaded home from: {filename}")
+        return home
     except json.JSONDecodeError as e:
         logger.error(f"Failed to parse JSON from {filename}: {e}")
         return None
@@ -98,19 +552,74 @@ def load_from_file_internal(filename: str):
         return None
 
 
+_umask: int | None = None
+
+
+def _file_mode(path: str) -> int:
+    """Mode for a file replacing path: that of the existing file, else what open() would give it"""
+    global _umask
+    try:
+        return os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        pass
+    if _umask is None:
+        _umask = os.umask(0)
+        os.umask(_umask)
+    return 0o666 & ~_umask
+
+
+def _write_atomic(path: str, data: bytes):
+    """Write bytes to path via a temp file in the same directory and an atomic rename"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates files 0600; keep saves readable as they were before
+        os.chmod(tmp_path, _file_mode(path))
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _write_save_file(filename: str, payload: bytes, data: dict | None = None):
+    """Atomically write a save file in SAVES_DIR and update its catalog entry"""
+    _write_atomic(os.path.join(SAVES_DIR, filename), payload)
+    catalog.record_write(filename, payload, data)
+    _remove_other_formats(filename)
+
+
+def _encode_home(data: dict) -> bytes:
+    return codec.dumps(data, indent=True)
+
+
+def _encode_save(filename: str, data: dict) -> bytes:
+    if filename.endswith(".mhome"):
+        return binary_snapshot.encode_home(data)
+    return _encode_home(data)
+
+
 def save_to_file(home: Home, filename: str = "default.json"):
     """Save a home to a specific file"""
-    if not filename:
-        filename = f"{home.id}.json"
-    if not filename.endswith(".json"):
-        filename += ".json"
-    
-    path = os.path.join(SAVES_DIR, filename)
+    filename = _storage_name(filename or home.id)
     try:
-        with open(path, 'w') as f:
+        if STORAGE_BACKEND == "sqlite":
+            sqlite_store.save_home(home, filename)
+        else:
             # Pydantic v2 uses model_dump, v1 uses dict(). assuming v1 based on previous usage
             # usage in previous turns showed .dict()
-            json.dump(home.dict(), f, indent=2)
+            data = home.dict()
+            _write_save_file(filename, _encode_save(filename, data), data)
+        _persisted_homes[filename] = home
+        # An explicit save supersedes any pending write-behind flush or journal for the same file
+        _discard_journal(filename)
+        for home_id, (_, dirty_filename) in list(_dirty_homes.items()):
+            if dirty_filename == filename:
+                _dirty_homes.pop(home_id, None)
+                _pending_changes.pop(home_id, None)
         logger.info(f"Saved home to: {filename}")
         return filename
     except Exception as e:
@@ -118,32 +627,670 @@ def save_to_file(home: Home, filename: str = "default.json"):
         raise
 
 
-def auto_save_home(home: Home, filename: str = "default.json"):
-    """Automatically save a home to the default save file"""
-    try:
+# Write-behind autosave: changes only mark a home dirty, and a background
+# flusher writes each dirty home at most once per AUTOSAVE_DEBOUNCE_SECONDS.
+AUTOSAVE_DEBOUNCE_SECONDS = float(os.getenv('AUTOSAVE_DEBOUNCE_SECONDS', '1.0'))
+
+_dirty_homes: dict[str, tuple[Home, str]] = {}
+_pending_changes: dict[str, int] = {}
+_autosave_wakeup: asyncio.Event | None = None
+_autosave_task: asyncio.Task | None = None
+_autosave_stats = {
+    "requested": 0,
+    "written": 0,
+    "coalesced": 0,
+    "failed": 0,
+    "last_flush_ts": None,
+}
+
+
+def _autosave_target(home: Home) -> str:
+    """The active home autosaves to the default save; other resident homes to the save they came from"""
+    if home.id == _active_home_id:
+        return "default.json"
+    return _home_saves.get(home.id) or f"{home.id}.json"
+
+
+def auto_save_home(home: Home, filename: str | None = None):
+    """Mark a home dirty so the background flusher persists it"""
+    filename = filename or _autosave_target(home)
+    if STORAGE_BACKEND == "sqlite":
+        # Row-level writes are cheap enough to go straight through
         save_to_file(home, filename)
-        logger.debug(f"Auto-saved home '{home.name}' to {filename}")
+        return
+    filename = _storage_name(filename)
+    _autosave_stats["requested"] += 1
+    _dirty_homes[home.id] = (home, filename)
+    _pending_changes[home.id] = _pending_changes.get(home.id, 0) + 1
+
+    if _autosave_task is None or _autosave_task.done():
+        # No flusher running (e.g. outside the app lifespan) - write through
+        _flush_dirty_homes_sync()
+        return
+
+    _autosave_wakeup.set()
+    logger.debug(f"Marked home '{home.name}' dirty for {filename}")
+
+
+def _take_dirty_snapshots(home_id: str | None = None):
+    snapshots = []
+    home_ids = [home_id] if home_id is not None else list(_dirty_homes)
+    for dirty_id in home_ids:
+        if dirty_id not in _dirty_homes:
+            continue
+        home, filename = _dirty_homes.pop(dirty_id)
+        # Serialize on the event loop so the snapshot is consistent
+        snapshots.append((dirty_id, home, filename, home.dict(), _pending_changes.pop(dirty_id, 0)))
+    return snapshots
+
+
+def _record_flush(snapshot, ok: bool, error: Exception | None = None):
+    home_id, home, filename, _, pending = snapshot
+    if ok:
+        _autosave_stats["written"] += 1
+        _autosave_stats["coalesced"] += max(0, pending - 1)
+        if pending > 1:
+            logger.info(f"Auto-saved home '{home.name}' to {filename} (coalesced {pending} changes)")
+        else:
+            logger.debug(f"Auto-saved home '{home.name}' to {filename}")
+    else:
+        _autosave_stats["failed"] += 1
+        logger.error(f"Failed to auto-save home to {filename}: {error}")
+        # Keep it dirty so the next flush retries, unless something newer is queued
+        if home_id not in _dirty_homes:
+            _dirty_homes[home_id] = (home, filename)
+            _pending_changes[home_id] = _pending_changes.get(home_id, 0) + pending
+
+
+def _flush_dirty_homes_sync(home_id: str | None = None):
+    for snapshot in _take_dirty_snapshots(home_id):
+        _, _, filename, data, _ = snapshot
+        try:
+            _write_save_file(filename, _encode_save(filename, data), data)
+            _record_flush(snapshot, True)
+        except Exception as e:
+            _record_flush(snapshot, False, e)
+    _autosave_stats["last_flush_ts"] = time.time()
+
+
+async def flush_dirty_homes():
+    """Write every dirty home now, off the event loop"""
+    for snapshot in _take_dirty_snapshots():
+        _, _, filename, data, _ = snapshot
+        try:
+            payload = await asyncio.to_thread(_encode_save, filename, data)
+            await asyncio.to_thread(_write_save_file, filename, payload, data)
+            _record_flush(snapshot, True)
+        except Exception as e:
+            _record_flush(snapshot, False, e)
+    _autosave_stats["last_flush_ts"] = time.time()
+
+
+async def _autosave_loop():
+    while True:
+        await _autosave_wakeup.wait()
+        # Let further changes accumulate for one window, then write once
+        await asyncio.sleep(AUTOSAVE_DEBOUNCE_SECONDS)
+        _autosave_wakeup.clear()
+        await flush_dirty_homes()
+
+
+def start_autosave():
+    """Start the background write-behind flusher (call from the app startup)"""
+    global _autosave_wakeup, _autosave_task
+    if _autosave_task is not None and not _autosave_task.done():
+        return
+    _autosave_wakeup = asyncio.Event()
+    _autosave_task = asyncio.create_task(_autosave_loop())
+    if _dirty_homes:
+        _autosave_wakeup.set()
+    logger.info(f"Write-behind autosave started (window: {AUTOSAVE_DEBOUNCE_SECONDS}s)")
+
+
+async def stop_autosave():
+    """Stop the flusher and write anything still dirty (call from the app shutdown)"""
+    global _autosave_task
+    if _autosave_task is not None:
+        _autosave_task.cancel()
+        try:
+            await _autosave_task
+        except asyncio.CancelledError:
+            pass
+        _autosave_task = None
+    await flush_dirty_homes()
+    logger.info(f"Write-behind autosave stopped: {get_autosave_stats()}")
+
+
+def get_autosave_stats():
+    return {
+        **_autosave_stats,
+        "dirty_homes": len(_dirty_homes),
+        "window_seconds": AUTOSAVE_DEBOUNCE_SECONDS,
+        "running": _autosave_task is not None and not _autosave_task.done(),
+    }
+
+
+# Journal mode: each mutation is appended as a small record to
+# "<save>.journal" next to the save file, and a background compactor folds the
+# journal into a fresh snapshot once it grows past JOURNAL_COMPACT_BYTES.
+PERSISTENCE_MODE = os.getenv('PERSISTENCE_MODE', 'snapshot').lower()
+JOURNAL_COMPACT_BYTES = int(os.getenv('JOURNAL_COMPACT_BYTES', str(256 * 1024)))
+JOURNAL_FSYNC = os.getenv('JOURNAL_FSYNC', '1') not in ('0', 'false', 'no')
+
+_journal_handles: dict[str, object] = {}
+# Journals appended to since their last fsync; a background task syncs them in
+# batches off the event loop (group commit), so appends never wait on the disk
+_unsynced_journals: set[str] = set()
+_journal_sync_wakeup: asyncio.Event | None = None
+_journal_sync_task: asyncio.Task | None = None
+# The home object whose on-disk state each save's deltas apply to
+_persisted_homes: dict[str, Home] = {}
+_journal_wakeup: asyncio.Event | None = None
+_journal_task: asyncio.Task | None = None
+# Compactions running in a thread, per save. Cancelling the task that awaits
+# one does not stop the thread, so a later compaction of that save waits for it
+_compactions: dict[str, asyncio.Task] = {}
+_journal_stats = {
+    "records": 0,
+    "bytes": 0,
+    "compactions": 0,
+    "fsyncs": 0,
+    "fsync_batches": 0,
+}
+
+
+def _journal_path(filename: str) -> str:
+    return os.path.join(SAVES_DIR, filename + ".journal")
+
+
+def _append_journal(home: Home, filename: str, record: dict):
+    """Append one mutation record to the journal of a save file"""
+    if _persisted_homes.get(filename) is not home and record.get("op") != "home":
+        # Deltas only make sense on top of this home, so start with a full base record
+        _append_journal(home, filename, {"op": "home", "home": home.dict()})
+
+    handle = _journal_handles.get(filename)
+    if handle is None:
+        handle = open(_journal_path(filename), 'ab')
+        _journal_handles[filename] = handle
+    data = codec.dumps({"home_id": home.id, "ts": time.time(), **record}) + b"\n"
+    handle.write(data)
+    handle.flush()
+    if JOURNAL_FSYNC:
+        _unsynced_journals.add(filename)
+        if _journal_sync_task is not None and not _journal_sync_task.done():
+            _journal_sync_wakeup.set()
+        else:
+            # No sync task running (e.g. outside the app lifespan) - sync through
+            _sync_journal(filename)
+    _persisted_homes[filename] = home
+    _journal_stats["records"] += 1
+    _journal_stats["bytes"] += len(data)
+
+    if handle.tell() >= JOURNAL_COMPACT_BYTES and filename not in _compactions:
+        if _journal_task is not None and not _journal_task.done():
+            _journal_wakeup.set()
+        else:
+            _compact_journal_sync(filename)
+
+
+def _sync_journal(filename: str):
+    """fsync a journal on the spot (before it is closed, or without a sync task)"""
+    _unsynced_journals.discard(filename)
+    handle = _journal_handles.get(filename)
+    if handle is not None:
+        os.fsync(handle.fileno())
+        _journal_stats["fsyncs"] += 1
+
+
+def _fsync_all(fds: list[int]):
+    try:
+        for fd in fds:
+            os.fsync(fd)
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+
+async def sync_journals():
+    """fsync every journal appended to since the last sync, in one batch off the event loop"""
+    # Duplicated descriptors stay valid if a journal is closed or rotated meanwhile
+    fds = [os.dup(_journal_handles[filename].fileno()) for filename in _unsynced_journals
+           if filename in _journal_handles]
+    _unsynced_journals.clear()
+    if not fds:
+        return
+    await asyncio.to_thread(_fsync_all, fds)
+    _journal_stats["fsyncs"] += len(fds)
+    _journal_stats["fsync_batches"] += 1
+
+
+async def _journal_sync_loop():
+    while True:
+        await _journal_sync_wakeup.wait()
+        _journal_sync_wakeup.clear()
+        try:
+            await sync_journals()
+        except OSError as e:
+            logger.error(f"Failed to fsync journals: {e}")
+
+
+def _close_journal(filename: str):
+    if filename in _unsynced_journals:
+        _sync_journal(filename)
+    handle = _journal_handles.pop(filename, None)
+    if handle is not None:
+        handle.close()
+
+
+def _discard_journal(filename: str):
+    """Drop the journal of a save file whose snapshot was just rewritten"""
+    _unsynced_journals.discard(filename)
+    _close_journal(filename)
+    for path in (_journal_path(filename), _journal_path(filename) + ".compacting"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _apply_journal_record(home: Home, record: dict) -> Home:
+    op = record.get("op")
+    if op == "home":
+        return Home(**record["home"])
+    if op == "lights":
+        states = {entry["id"]: entry["state"] for entry in record.get("lights", [])}
+        for floor in home.floors:
+            for light in floor.lights:
+                if light.id in states:
+                    light.state = LightState(**states[light.id])
+    elif op == "background":
+        home.background_color = record["background_color"]
+    elif op == "floor_changes":
+        for change in record.get("changes", []):
+            if not _apply_floor_change(home, change):
+                logger.warning(f"Skipping journaled {change['type']} for missing floor {change['floor_id']}")
+    elif op == "floors":
+        # Whole-floor records from older journals, without the floor plan image
+        patched = {entry["id"]: entry for entry in record.get("floors", [])}
+        home.floors = [
+            Floor(**{**floor.dict(), **patched[floor.id]}) if floor.id in patched else floor
+            for floor in home.floors
+        ]
+    else:
+        logger.warning(f"Skipping unknown journal record: {op}")
+    return home
+
+
+def _replay_journal(home: Home, filename: str) -> Home:
+    """Apply a save file's journal (and any interrupted compaction) on top of its snapshot"""
+    replayed = 0
+    for path in (_journal_path(filename) + ".compacting", _journal_path(filename)):
+        if not os.path.exists(path):
+            continue
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    record = codec.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final record from a crash mid-append; nothing after it is valid
+                    logger.warning(f"Ignoring truncated journal record in {os.path.basename(path)}")
+                    break
+                home = _apply_journal_record(home, record)
+                replayed += 1
+    if replayed:
+        logger.info(f"Replayed {replayed} journal records for {filename}")
+    return home
+
+
+def _rotate_journal(filename: str):
+    """Capture the current home and move the live journal aside; runs on the event loop"""
+    home = _persisted_homes.get(filename)
+    path = _journal_path(filename)
+    if home is None or not os.path.exists(path):
+        return None
+    _close_journal(filename)
+    os.replace(path, path + ".compacting")
+    return home.dict()
+
+
+def _finish_compaction(filename: str, data: dict):
+    _write_save_file(filename, _encode_save(filename, data), data)
+    os.remove(_journal_path(filename) + ".compacting")
+
+
+def _compact_journal_sync(filename: str):
+    data = _rotate_journal(filename)
+    if data is not None:
+        _finish_compaction(filename, data)
+        _journal_stats["compactions"] += 1
+        logger.info(f"Compacted journal into snapshot: {filename}")
+
+
+async def _run_compaction(filename: str, data: dict):
+    try:
+        await asyncio.to_thread(_finish_compaction, filename, data)
+        _journal_stats["compactions"] += 1
+        logger.info(f"Compacted journal into snapshot: {filename}")
     except Exception as e:
-        logger.error(f"Failed to auto-save home: {e}")
+        # The .compacting file is still replayed on startup, so nothing is lost
+        logger.error(f"Failed to compact journal for {filename}: {e}")
+    finally:
+        _compactions.pop(filename, None)
 
 
-# Try to load default.json or any existing save
-loaded_home = None
-default_path = os.path.join(SAVES_DIR, "default.json")
+async def wait_for_compactions():
+    """Wait until no compaction is running in a thread"""
+    while _compactions:
+        await asyncio.wait(list(_compactions.values()))
 
-if os.path.exists(default_path):
-    logger.info("Found default.json, loading...")
-    loaded_home = load_from_file_internal("default.json")
-else:
+
+async def compact_journals(force: bool = False):
+    """Fold journals past the size threshold (or all of them) into fresh snapshots"""
+    for filename in list(_persisted_homes):
+        running = _compactions.get(filename)
+        if running is not None:
+            # Rotating now would overwrite the .compacting file it is still folding
+            await asyncio.shield(running)
+        path = _journal_path(filename)
+        if not os.path.exists(path):
+            continue
+        if not force and os.path.getsize(path) < JOURNAL_COMPACT_BYTES:
+            continue
+        data = _rotate_journal(filename)
+        if data is None:
+            continue
+        task = _compactions[filename] = asyncio.create_task(_run_compaction(filename, data))
+        await asyncio.shield(task)
+
+
+async def _journal_compactor_loop():
+    while True:
+        await _journal_wakeup.wait()
+        _journal_wakeup.clear()
+        await compact_journals()
+
+
+def _persist_change_sqlite(home: Home, filename: str, record: dict):
+    op = record.get("op")
+    if op == "home" or _persisted_homes.get(filename) is not home:
+        sqlite_store.save_home(home, filename)
+        _persisted_homes[filename] = home
+    elif op == "lights":
+        lights = [light for floor in home.floors for light in floor.lights
+                  if light.id in {entry["id"] for entry in record["lights"]}]
+        sqlite_store.update_light_states(filename, lights)
+    elif op == "background":
+        sqlite_store.update_background(filename, record["background_color"])
+    else:
+        sqlite_store.save_home(home, filename)
+
+
+def _persist_change(home: Home, filename: str | None, record: dict):
+    filename = _storage_name(filename or _autosave_target(home))
+    if STORAGE_BACKEND == "sqlite":
+        try:
+            _persist_change_sqlite(home, filename, record)
+        except Exception as e:
+            logger.error(f"Failed to persist change to SQLite for {filename}: {e}")
+    elif PERSISTENCE_MODE == "journal":
+        try:
+            _append_journal(home, filename, record)
+        except Exception as e:
+            logger.error(f"Failed to append journal record for {filename}: {e}")
+    else:
+        auto_save_home(home, filename)
+
+
+def record_light_changes(home: Home, lights: list[Light], filename: str | None = None):
+    """Persist a light-state change (journal delta or write-behind snapshot)"""
+    light_table.states_replaced(home.id, lights)
+    record = {
+        "op": "lights",
+        "lights": [{"id": light.id, "state": light.state.dict()} for light in lights],
+    }
+    _persist_change(home, filename, record)
+
+
+def record_background_change(home: Home, filename: str | None = None):
+    """Persist a background color change"""
+    _persist_change(home, filename, {"op": "background", "background_color": home.background_color})
+
+
+def record_floor_changes(home: Home, changes: list[tuple[str, dict]], filename: str | None = None):
+    """Persist partial floor edits, given as the (event type, payload) pairs they publish"""
+    record = {
+        "op": "floor_changes",
+        # Only the upserted / removed entities, not the floors they belong to
+        "changes": [{"type": event_type, **payload} for event_type, payload in changes],
+    }
+    _persist_change(home, filename, record)
+
+
+def record_home_replace(home: Home, filename: str | None = None):
+    """Persist a full home replacement"""
+    _persist_change(home, filename, {"op": "home", "home": home.dict()})
+
+
+# Multi-worker mode (EVENT_BUS=shared, see events.py): changes made by other
+# workers arrive as events and are applied to the resident copies in memory.
+# They are not persisted again - the worker that made a change saves it. A
+# home loaded from disk replays the events still in its ring (from the last
+# replacement on), since its save may lag behind by one autosave window.
+# Events that cannot be applied in place drop the resident copy instead.
+_stale_dirty: set[str] = set()
+
+
+def _floor_by_id(home: Home, floor_id: str):
+    for position, floor in enumerate(home.floors):
+        if floor.id == floor_id:
+            return position, floor
+    return None, None
+
+
+FLOOR_EVENTS = ("floor_shape_changed", "room_labels_changed", "walls_changed", "cubes_changed", "lights_changed")
+
+
+def _apply_floor_change(home: Home, change: dict) -> bool:
+    """Apply a per-floor change (a floor event payload) to a home; False if its floor is gone"""
+    position, floor = _floor_by_id(home, change["floor_id"])
+    if floor is None:
+        return False
+    # Copy the floor like patches.py does, so caches keyed on it notice
+    floor = floor.copy()
+    if change["type"] == "floor_shape_changed":
+        floor.shape = [Vector3(**point) for point in change["shape"]]
+    elif change["type"] == "room_labels_changed":
+        floor.room_labels = [RoomLabel(**label) for label in change["room_labels"]]
+    else:
+        field = change["type"][:-len("_changed")]
+        model = {"walls": Wall, "cubes": Cube, "lights": Light}[field]
+        upserted = {item["id"]: model(**item) for item in change.get(field, [])}
+        removed = set(change.get("removed", []))
+        items = [upserted.pop(item.id, item) for item in getattr(floor, field) if item.id not in removed]
+        setattr(floor, field, items + list(upserted.values()))
+    home.floors = [floor if index == position else existing for index, existing in enumerate(home.floors)]
+    return True
+
+
+def _apply_event(home: Home, event: dict) -> bool:
+    """Apply a change event to a home in place; False if it cannot be applied"""
+    event_type = event["type"]
+    if event_type == "background_changed":
+        home.background_color = event["background_color"]
+    elif event_type == "scenes_changed":
+        home.scenes = [Scene(**scene) for scene in event["scenes"]]
+    elif "floor_id" in event and event_type in FLOOR_EVENTS:
+        if not _apply_floor_change(home, event):
+            return False
+        if home.id in homes_db:
+            _index_home(home)
+    elif event_type == "lights_changed":
+        lights = {light.id: light for floor in home.floors for light in floor.lights}
+        for entry in event.get("lights", []):
+            light = lights.get(entry["id"])
+            if light is None:
+                return False
+            light.state = LightState(**entry["state"])
+            light_table.states_replaced(home.id, [light])
+    else:
+        return False
+    return True
+
+
+def _replay_shared_events(home: Home):
+    history = events.retained_events(home.id)
+    start = max((index + 1 for index, event in enumerate(history) if event["type"] == "home_replaced"), default=0)
+    for event in history[start:]:
+        _apply_event(home, event)
+    if home.id in _stale_dirty:
+        _stale_dirty.discard(home.id)
+        auto_save_home(home)
+
+
+def _forget_home(home_id: str):
+    """Drop a resident copy that no longer matches the shared state, without saving it"""
+    home = homes_db.pop(home_id, None)
+    if home is None:
+        return
+    if _dirty_homes.pop(home_id, None) is not None:
+        _pending_changes.pop(home_id, None)
+        _stale_dirty.add(home_id)
+    _home_sizes.pop(home_id, None)
+    _unindex_home(home_id)
+    events.release_log(home_id)
+    for filename, persisted in list(_persisted_homes.items()):
+        if persisted is home:
+            _persisted_homes.pop(filename, None)
+    logger.info(f"Dropped home '{home.name}' changed by another worker; it reloads on next use")
+
+
+def apply_remote_event(event: dict):
+    """Remote listener for events published by other workers"""
+    global _active_home_id
+    if event["home_id"] == events.WORKSPACE_CHANNEL:
+        if event["type"] == "active_home_changed":
+            _active_home_id = event["active_home_id"]
+        return
+    home = homes_db.get(event["home_id"])
+    if home is not None and not _apply_event(home, event):
+        _forget_home(home.id)
+
+
+def _announce_active_home(home: Home):
+    """Tell the other workers about a new active home, once it is on disk"""
+    auto_save_home(home)
+    _flush_dirty_homes_sync(home.id)
+    events.publish(events.WORKSPACE_CHANNEL, "active_home_changed", {"active_home_id": home.id})
+
+
+def start_persistence():
+    """Start the background persistence tasks (call from the app startup)"""
+    global _journal_wakeup, _journal_task, _journal_sync_wakeup, _journal_sync_task, PERSISTENCE_MODE
+    if PERSISTENCE_MODE == "journal" and events.EVENT_BUS == "shared":
+        # Workers cannot share one journal file; full snapshots are replaced atomically
+        logger.warning("Journal persistence is not supported with EVENT_BUS=shared; using snapshots")
+        PERSISTENCE_MODE = "snapshot"
+    start_autosave()
+    if PERSISTENCE_MODE == "journal" and (_journal_task is None or _journal_task.done()):
+        _journal_wakeup = asyncio.Event()
+        _journal_task = asyncio.create_task(_journal_compactor_loop())
+        if JOURNAL_FSYNC:
+            _journal_sync_wakeup = asyncio.Event()
+            _journal_sync_task = asyncio.create_task(_journal_sync_loop())
+        logger.info(f"Journal persistence enabled (compaction at {JOURNAL_COMPACT_BYTES} bytes)")
+
+
+async def stop_persistence():
+    """Stop the background persistence tasks and flush everything (call from the app shutdown)"""
+    global _journal_task, _journal_sync_task
+    for task in (_journal_task, _journal_sync_task):
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    _journal_task = _journal_sync_task = None
+    # A compaction the compactor left running must finish before the forced one below
+    await wait_for_compactions()
+    await stop_autosave()
+    # Fold remaining journals so the next startup only has to read a snapshot
+    await compact_journals(force=True)
+    for filename in list(_journal_handles):
+        _close_journal(filename)
+    if STORAGE_BACKEND == "sqlite":
+        sqlite_store.close()
+    else:
+        catalog.persist()
+
+
+def get_persistence_stats():
+    return {
+        "backend": STORAGE_BACKEND,
+        "mode": PERSISTENCE_MODE,
+        "autosave": get_autosave_stats(),
+        "journal": {
+            **_journal_stats,
+            "open_journals": len(_journal_handles),
+            "unsynced_journals": len(_unsynced_journals),
+            "compact_bytes": JOURNAL_COMPACT_BYTES,
+            "fsync": JOURNAL_FSYNC,
+        },
+    }
+
+
+# Startup lifecycle: nothing touches the disk at import time. startup() runs
+# from the app lifespan, prepares storage off the event loop and loads the
+# initial home in the background; requests can wait on wait_until_ready().
+_startup_status = {
+    "ready": False,
+    "loaded_save": None,
+    "error": None,
+    "timings_ms": {},
+}
+_home_ready: asyncio.Event | None = None
+_initial_load_task: asyncio.Task | None = None
+
+
+@contextmanager
+def _timed(step: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _startup_status["timings_ms"][step] = round((time.perf_counter() - started) * 1000, 2)
+
+
+def _find_initial_save():
+    """default save if there is one, otherwise any existing save"""
+    default_save = _resolve_save_name("default")
+    if default_save:
+        logger.info(f"Found {default_save}, loading...")
+        return default_save
     # Check for any other json
-    files = glob(os.path.join(SAVES_DIR, "*.json"))
+    files = get_all_save_files()
     if files:
-        filename = os.path.basename(files[0])
-        logger.info(f"No default.json found, loading: {filename}")
-        loaded_home = load_from_file_internal(filename)
+        logger.info(f"No default.json found, loading: {files[0]}")
+        return files[0]
+    return None
+
 
-if not loaded_home:
-    logger.info("No saves found. Creating Demo Home...")
+def _create_demo_save():
+    """Save a demo home, unless another worker starting at the same time already wrote a first save"""
+    with open(os.path.join(SAVES_DIR, '.startup.lock'), 'a') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        filename = _find_initial_save()
+        home = _read_and_replay(filename) if filename else None
+        if home is not None:
+            return home, filename
+        logger.info("No saves found. Creating Demo Home...")
+        demo_home = _build_demo_home()
+        # Auto-save the demo home
+        logger.info("Auto-saving demo home to default save...")
+        return demo_home, save_to_file(demo_home, "default.json")
+
+
+def _build_demo_home() -> Home:
     # Initialize with a demo home
     demo_home = Home(name="Demo Home")
     floor1 = Floor(level=0, name="Ground Floor")
@@ -164,38 +1311,111 @@ if not loaded_home:
     ]
 
     demo_home.floors = [floor1]
-    homes_db[demo_home.id] = demo_home
-    
-    # Auto-save the demo home
-    logger.info("Auto-saving demo home to default.json...")
-    save_to_file(demo_home, "default.json")
+    return demo_home
 
 
-def load_from_file(filename: str):
-    """Load a home from a save file by filename"""
-    if not filename.endswith(".json"):
-        filename += ".json"
-    path = os.path.join(SAVES_DIR, filename)
-    if not os.path.exists(path):
-        logger.warning(f"Save file not found: {filename}")
-        return None
-    
+async def _load_initial_home(started: float):
     try:
-        with open(path, 'r') as f:
-            data = json.load(f)
-            home = Home(**data)
-            # Clear existing homes and load only this one
-            homes_db.clear()
-            homes_db[home.id] = home
-            logger.info(f"Loaded home from: {filename} (cleared previous homes)")
-            return home
+        with _timed("find_save"):
+            filename = await asyncio.to_thread(_find_initial_save)
+
+        home = None
+        if filename:
+            # Parsing a large save must not block requests that do not need the home
+            with _timed("parse_save"):
+                try:
+                    home = await asyncio.to_thread(_read_and_replay, filename)
+                except Exception as e:
+                    logger.error(f"Failed to load home from {filename}: {e}")
+
+        if home:
+            _install_home(home, filename)
+            _startup_status["loaded_save"] = filename
+            logger.info(f"Successfully loaded home from: {filename}")
+        else:
+            with _timed("demo_home"):
+                demo_home, filename = await asyncio.to_thread(_create_demo_save)
+                _install_home(demo_home, filename)
+                _startup_status["loaded_save"] = filename
+    except Exception as e:
+        _startup_status["error"] = str(e)
+        logger.error(f"Failed to load initial home: {e}")
+    finally:
+        _startup_status["timings_ms"]["total"] = round((time.perf_counter() - started) * 1000, 2)
+        _startup_status["ready"] = True
+        _home_ready.set()
+        logger.info(f"Startup timings (ms): {_startup_status['timings_ms']}")
+
+
+async def startup():
+    """Initialize storage and begin loading the initial home (call from the app startup)"""
+    global _home_ready, _initial_load_task
+    started = time.perf_counter()
+    _home_ready = asyncio.Event()
+    _startup_status.update(ready=False, loaded_save=None, error=None, timings_ms={})
+    with _timed("storage_init"):
+        await asyncio.to_thread(init_storage)
+    # Before the initial load, so a shared-mode worker replays events into it
+    events.open_logs(os.path.join(SAVES_DIR, "events"))
+    events.add_remote_listener(apply_remote_event)
+    start_persistence()
+    _initial_load_task = asyncio.create_task(_load_initial_home(started))
+
+
+async def shutdown():
+    """Stop background work and flush everything (call from the app shutdown)"""
+    if _initial_load_task is not None and not _initial_load_task.done():
+        _initial_load_task.cancel()
+        try:
+            await _initial_load_task
+        except asyncio.CancelledError:
+            pass
+    await stop_persistence()
+    events.close_logs()
+
+
+async def wait_until_ready(timeout: float) -> bool:
+    """Wait (up to timeout seconds) for the initial home to be loaded"""
+    if _startup_status["ready"] or _home_ready is None:
+        return _startup_status["ready"]
+    try:
+        await asyncio.wait_for(_home_ready.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    return _startup_status["ready"]
+
+
+def get_startup_status():
+    return {**_startup_status, "timings_ms": dict(_startup_status["timings_ms"])}
+
+
+async def fetch_save(filename: str):
+    """load_from_file, but the save is read and parsed off the event loop"""
+    filename = await asyncio.to_thread(lambda: _resolve_save_name(filename) or _storage_name(filename))
+    try:
+        home = await asyncio.to_thread(_read_and_replay, filename)
     except Exception as e:
         logger.error(f"Failed to load home from {filename}: {e}")
         return None
+    if home is None:
+        logger.warning(f"Save file not found: {filename}")
+        return None
+    _install_home(home, filename)
+    logger.info(f"Loaded home from: {filename}")
+    return home
 
 
-def get_all_save_files():
-    """Get list of all save files"""
-    files = glob(os.path.join(SAVES_DIR, "*.json"))
-    return [os.path.basename(f) for f in files]
-
+def load_from_file(filename: str):
+    """Load a home from a save file by filename"""
+    filename = _resolve_save_name(filename) or _storage_name(filename)
+    try:
+        home = _read_and_replay(filename)
+        if home is None:
+            logger.warning(f"Save file not found: {filename}")
+            return None
+        _install_home(home, filename)
+        logger.info(f"Loaded home from: {filename}")
+        return home
+    except Exception as e:
+        logger.error(f"Failed to load home from {filename}: {e}")
+        return None
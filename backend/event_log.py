@@ -0,0 +1,195 @@
+import hashlib
+import mmap
+import os
+import re
+import struct
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # no cross-process locking; one process per log only
+    fcntl = None
+
+# Durable per-home change feed: a fixed-size, memory-mapped ring file
+# ("<home_id>.events") that keeps the most recent events and the version
+# counter across restarts.
+#
+#   64 bytes  header: magic b"MIMEVLG1", then unsigned 64-bit little-endian
+#             capacity, head, tail, version, count
+#   ...       ring of `capacity` bytes holding records back to back:
+#             4 bytes length | 8 bytes version | length bytes of event JSON
+#             A length of 0xFFFFFFFF, or fewer than 12 bytes before the end,
+#             means the next record starts at offset 0.
+#
+# The file never grows: appending overwrites the oldest records once the ring
+# is full. Record bytes are written before the header that makes them
+# visible, so a crash mid-append loses at most that record. The capacity of
+# an existing file wins over the configured one.
+#
+# Several processes can share one ring: the mapping is shared, appends hold
+# an exclusive flock and re-read the header first (append_next() also takes
+# the next version under that lock, which gives all writers one global
+# order), and readers hold a shared flock while copying records out.
+MAGIC = b"MIMEVLG1"
+_HEADER = struct.Struct("<8s5Q")
+_RECORD = struct.Struct("<IQ")
+_WRAP = 0xFFFFFFFF
+_DATA_START = 64
+
+
+class EventLogFormatError(ValueError):
+    pass
+
+
+def path_for(directory: str, home_id: str) -> str:
+    """Ring file of a home; ids that are not plain file names are hashed"""
+    name = home_id if re.fullmatch(r"[\w-]{1,100}", home_id) else hashlib.sha1(home_id.encode('utf-8')).hexdigest()
+    return os.path.join(directory, f"{name}.events")
+
+
+class RingLog:
+    def __init__(self, path: str, capacity: int):
+        self.path = path
+        # Opened without truncating: another process may be creating it too
+        self._file = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), "r+b")
+        try:
+            with self._locked(exclusive=True):
+                size = os.fstat(self._file.fileno()).st_size
+                if size == 0:
+                    self._file.truncate(_DATA_START + capacity)
+                    self._map = mmap.mmap(self._file.fileno(), _DATA_START + capacity)
+                    self.capacity = capacity
+                    self.head = self.tail = self.version = self.count = 0
+                    self._write_header()
+                else:
+                    if size < _DATA_START:
+                        raise EventLogFormatError(f"Not an event log: {path}")
+                    self._map = mmap.mmap(self._file.fileno(), size)
+                    self._read_header()
+                    if self.capacity != size - _DATA_START:
+                        self._map.close()
+                        raise EventLogFormatError(f"Not an event log: {path}")
+        except Exception:
+            self._file.close()
+            raise
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def _read_header(self):
+        magic, self.capacity, self.head, self.tail, self.version, self.count = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise EventLogFormatError(f"Not an event log: {self.path}")
+
+    def _write_header(self):
+        _HEADER.pack_into(self._map, 0, MAGIC, self.capacity, self.head, self.tail, self.version, self.count)
+
+    def peek_version(self) -> int:
+        """Latest version without locking (a hint for pollers)"""
+        return struct.unpack_from("<Q", self._map, 32)[0]
+
+    def _record_at(self, offset: int):
+        """(offset, length, version) of the record stored at or wrapped from offset"""
+        if self.capacity - offset < _RECORD.size:
+            offset = 0
+        else:
+            length, version = _RECORD.unpack_from(self._map, _DATA_START + offset)
+            if length != _WRAP:
+                return offset, length, version
+            offset = 0
+        length, version = _RECORD.unpack_from(self._map, _DATA_START + offset)
+        return offset, length, version
+
+    def _drop_oldest(self):
+        offset, length, _ = self._record_at(self.head)
+        self.head = offset + _RECORD.size + length
+        self.count -= 1
+
+    def _records(self):
+        offset = self.head
+        for _ in range(self.count):
+            offset, length, version = self._record_at(offset)
+            start = _DATA_START + offset + _RECORD.size
+            yield version, self._map[start:start + length]
+            offset += _RECORD.size + length
+
+    def records(self) -> list[tuple[int, bytes]]:
+        """(version, event JSON) pairs from oldest to newest"""
+        with self._locked(exclusive=False):
+            self._read_header()
+            return list(self._records())
+
+    def records_after(self, version: int):
+        """(records newer than version, whether older ones it needs were overwritten, latest version)"""
+        with self._locked(exclusive=False):
+            self._read_header()
+            if self.version <= version:
+                return [], False, self.version
+            records = []
+            oldest = None
+            for record_version, data in self._records():
+                if oldest is None:
+                    oldest = record_version
+                if record_version > version:
+                    records.append((record_version, data))
+            gap = oldest is None or oldest > version + 1
+            return records, gap, self.version
+
+    def append(self, version: int, data: bytes):
+        with self._locked(exclusive=True):
+            self._read_header()
+            self._append(version, data)
+
+    def append_next(self, encode) -> tuple[int, bytes]:
+        """Append encode(version) as the next version; returns (version, data)"""
+        with self._locked(exclusive=True):
+            self._read_header()
+            version = self.version + 1
+            data = encode(version)
+            self._append(version, data)
+            return version, data
+
+    def _append(self, version: int, data: bytes):
+        need = _RECORD.size + len(data)
+        self.version = version
+        if need > self.capacity:
+            # Too large to keep; catching up across it will require a resync
+            self.head = self.tail = self.count = 0
+            self._write_header()
+            return
+
+        offset = self.tail
+        if self.capacity - offset < need:
+            # Records between the tail and the end of the ring are the oldest ones
+            while self.count and self.head >= offset:
+                self._drop_oldest()
+            if self.capacity - offset >= _RECORD.size:
+                _RECORD.pack_into(self._map, _DATA_START + offset, _WRAP, 0)
+            offset = 0
+        while self.count and offset <= self.head < offset + need:
+            self._drop_oldest()
+
+        start = _DATA_START + offset
+        _RECORD.pack_into(self._map, start, len(data), version)
+        self._map[start + _RECORD.size:start + need] = data
+        if not self.count:
+            self.head = offset
+        self.tail = offset + need
+        self.count += 1
+        self._write_header()
+
+    def flush(self):
+        self._map.flush()
+
+    def close(self):
+        self._map.flush()
+        self._map.close()
+        self._file.close()
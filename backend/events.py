@@ -0,0 +1,767 @@
+import asyncio
+import base64
+import itertools
+import logging
+import os
+import time
+from collections import OrderedDict, defaultdict, deque
+import codec
+import compact
+import event_log
+
+logger = logging.getLogger(__name__)
+
+# Per-home change events: a version counter, a bounded log for catch-up
+# (/changes, stream resumption) and live fan-out to SSE and WebSocket
+# subscribers.
+#
+# Every event is encoded exactly once when it is published - to JSON and to an
+# SSE chunk - and the same bytes objects are handed to every subscriber; only
+# a WebSocket whose filters keep part of an event re-encodes that part.
+# Subscribers hold a bounded queue of pending frames; when a display cannot
+# keep up, its slow-consumer policy decides what happens:
+#   drop_oldest  discard the oldest pending event
+#   coalesce     discard pending lights_changed events whose lights are all
+#                contained in the new one (falls back to drop_oldest)
+#   disconnect   replace the backlog with resync_required and close the stream
+# Heartbeats come from one shared ticker instead of a timer per connection.
+#
+# Once open_logs() has been called, each home's events and version counter are
+# also written to a ring file (see event_log.py) and read back the first time
+# the home is touched, so versions keep counting and catch-up keeps working
+# across restarts.
+#
+# Plain light state updates (lights_changed carrying only "lights") are
+# coalesced for LIGHT_EVENT_COALESCE_MS: each update still gets its own
+# version right away, but one event with the latest state of every touched
+# light is published when the window closes, carrying the last of those
+# versions and "first_version" for the first. Any other event, catch-up or
+# new subscriber flushes the window first so versions stay in order.
+# Subscribers can also ask for a max_rate (deliveries per second); light
+# updates superseded while they wait are dropped.
+#
+# With EVENT_BUS=shared several worker processes serve the same DATA_DIR. The
+# ring files are then the bus: versions are taken under the ring's file lock,
+# giving one global order, and a poller delivers events written by other
+# workers to local subscribers and to the remote listeners (db applies them
+# to its resident homes). Light updates are not coalesced in this mode, since
+# a deferred update could overtake a newer one from another worker. A change
+# that lands behind events other workers wrote first is re-applied after them,
+# so the newest version is what every worker ends up with.
+EVENT_LOG_MAXLEN = 1000
+EVENT_LOG_BYTES = int(os.getenv('EVENT_LOG_BYTES', str(1024 * 1024)))
+SSE_HEARTBEAT_SECONDS = float(os.getenv('SSE_HEARTBEAT_SECONDS', '25'))
+SSE_SUBSCRIBER_BUFFER = int(os.getenv('SSE_SUBSCRIBER_BUFFER', '200'))
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+SSE_SLOW_CONSUMER_POLICY = os.getenv('SSE_SLOW_CONSUMER_POLICY', 'drop_oldest').lower()
+LIGHT_EVENT_COALESCE_MS = float(os.getenv('LIGHT_EVENT_COALESCE_MS', '50'))
+EVENT_BUS = os.getenv('EVENT_BUS', 'local').lower()
+EVENT_BUS_POLL_MS = float(os.getenv('EVENT_BUS_POLL_MS', '20'))
+# Channel for events that are not about one home (e.g. the active home changing)
+WORKSPACE_CHANNEL = "_workspace"
+# Events that replace a home's whole state, making earlier events moot for it
+REPLACING_EVENTS = {"home_replaced"}
+
+_home_versions: dict[str, int] = {}
+# Newest version actually sent out; lags _home_versions while light updates coalesce
+_emitted_versions: dict[str, int] = {}
+_home_event_logs: dict[str, deque] = {}
+_rings: dict[str, event_log.RingLog] = {}
+# home_id -> {"lights": {light_id: light}, "first_version", "version", "handle"}
+_pending_lights: dict[str, dict] = {}
+# (home_id, version, index tag) -> compact SSE chunk, or None when the event stays JSON
+_compact_chunks: OrderedDict[tuple, bytes | None] = OrderedDict()
+COMPACT_CACHE_SIZE = 256
+_log_dir: str | None = None
+_home_subscribers: dict[str, set["Subscriber"]] = defaultdict(set)
+_subscriber_ids = itertools.count(1)
+_ticker_task: asyncio.Task | None = None
+_bus_task: asyncio.Task | None = None
+_remote_listeners = []
+_stats = {
+    "published": 0,
+    "encoded_bytes": 0,
+    "heartbeats": 0,
+    "disconnected_slow": 0,
+    "restored_events": 0,
+    "coalesced_light_updates": 0,
+    "log_errors": 0,
+    "remote_events": 0,
+    "remote_resyncs": 0,
+}
+
+
+def _sse_chunk(event_type: str, data: bytes, event_id: int | None = None) -> bytes:
+    lines = []
+    if event_id is not None:
+        lines.append(b"id: %d" % event_id)
+    lines.append(b"event: " + event_type.encode('utf-8'))
+    lines.append(b"data: " + data)
+    return b"\n".join(lines) + b"\n\n"
+
+
+def format_sse(event_type: str, data: dict, event_id: int | None = None) -> bytes:
+    return _sse_chunk(event_type, codec.dumps(data), event_id)
+
+
+def open_logs(directory: str):
+    """Persist change feeds as ring files in directory (and share them between workers with EVENT_BUS=shared)"""
+    global _log_dir, _bus_task
+    os.makedirs(directory, exist_ok=True)
+    _log_dir = directory
+    if EVENT_BUS == "shared":
+        _load(WORKSPACE_CHANNEL)
+        if _bus_task is None or _bus_task.done():
+            _bus_task = asyncio.create_task(_bus_loop())
+        logger.info(f"Shared event bus enabled (polling every {EVENT_BUS_POLL_MS} ms)")
+
+
+def close_logs():
+    global _log_dir, _bus_task
+    if _bus_task is not None:
+        _bus_task.cancel()
+        _bus_task = None
+    for home_id in list(_pending_lights):
+        flush_pending(home_id)
+    for ring in _rings.values():
+        ring.close()
+    _rings.clear()
+    _log_dir = None
+
+
+def release_log(home_id: str):
+    """Close the ring file of a home that left the home cache; it reopens on next use.
+
+    A home that still has live subscribers keeps its ring open (flushed to disk),
+    as does a home without a ring file, whose versions exist only in memory.
+    """
+    flush_pending(home_id)
+    ring = _rings.get(home_id)
+    if ring is None:
+        return
+    if _home_subscribers.get(home_id):
+        ring.flush()
+        return
+    del _rings[home_id]
+    ring.close()
+    _home_versions.pop(home_id, None)
+    _emitted_versions.pop(home_id, None)
+    _home_event_logs.pop(home_id, None)
+    for key in [key for key in _compact_chunks if key[0] == home_id]:
+        del _compact_chunks[key]
+
+
+def _load(home_id: str):
+    """Version and recent events of a home, restored from its ring file on first use"""
+    if home_id in _home_versions:
+        return
+    log = deque(maxlen=EVENT_LOG_MAXLEN)
+    version = 0
+    if _log_dir is not None:
+        path = event_log.path_for(_log_dir, home_id)
+        try:
+            ring = event_log.RingLog(path, EVENT_LOG_BYTES)
+        except (OSError, ValueError) as e:
+            _stats["log_errors"] += 1
+            logger.error(f"Cannot open event log {path}, starting a new one: {e}")
+            try:
+                os.remove(path)
+                ring = event_log.RingLog(path, EVENT_LOG_BYTES)
+            except (OSError, ValueError) as e:
+                logger.error(f"Event log for home {home_id} is not persisted: {e}")
+                ring = None
+        if ring is not None:
+            _rings[home_id] = ring
+            version = ring.version
+            try:
+                # Only the newest EVENT_LOG_MAXLEN records are decoded
+                records = deque(ring.records(), maxlen=EVENT_LOG_MAXLEN)
+            except (OSError, ValueError) as e:
+                _stats["log_errors"] += 1
+                logger.error(f"Failed to read event log of home {home_id}: {e}")
+                records = ()
+            for record_version, data in records:
+                event = _decode(home_id, record_version, data)
+                if event is None:
+                    # Keep only what follows a corrupt record: catch-up from before it
+                    # then finds a gap and gets resync_required instead of a hole
+                    log.clear()
+                    continue
+                log.append((event, data, _sse_chunk(event["type"], data, record_version)))
+            _stats["restored_events"] += len(log)
+    _home_versions[home_id] = version
+    _emitted_versions[home_id] = version
+    _home_event_logs[home_id] = log
+
+
+def is_shared() -> bool:
+    return EVENT_BUS == "shared" and _log_dir is not None
+
+
+def add_remote_listener(listener):
+    """Call listener(event) for every event published by another worker.
+
+    A local event is passed to it as well when older remote events had to be
+    replayed after its change was made, so the listener re-applies it on top.
+    """
+    if listener not in _remote_listeners:
+        _remote_listeners.append(listener)
+
+
+def _notify_remote(event: dict):
+    for listener in _remote_listeners:
+        try:
+            listener(event)
+        except Exception as e:
+            logger.error(f"Failed to apply remote event {event.get('type')} v{event.get('version')}: {e}")
+
+
+def _decode(home_id: str, version: int, data: bytes) -> dict | None:
+    """A ring record as an event, or None (logged) if it is corrupt"""
+    try:
+        event = codec.loads(data)
+        event["type"]
+    except (ValueError, KeyError, TypeError) as e:
+        _stats["log_errors"] += 1
+        logger.error(f"Skipping corrupt event {version} in the log of home {home_id}: {e}")
+        return None
+    return event
+
+
+def _announce_resync(home_id: str, version: int):
+    """Tell local subscribers and resident state that events up to version are lost"""
+    _stats["remote_resyncs"] += 1
+    payload = {"home_id": home_id, "current_version": version, "reason": "event_buffer_gap"}
+    for subscriber in list(_home_subscribers.get(home_id, ())):
+        subscriber.enqueue(subscriber.resync_frame(payload, version))
+    _notify_remote({"type": "resync_required", "home_id": home_id, "version": version})
+
+
+def _tail(home_id: str, before: int | None = None, notify: bool = True) -> int:
+    """Deliver events other workers appended to a home's ring (those older than before, if given).
+
+    Remote listeners are told about them unless notify is False; returns how
+    many events were delivered.
+    """
+    ring = _rings.get(home_id)
+    if ring is None:
+        return 0
+    local_version = _home_versions[home_id]
+    try:
+        records, gap, latest = ring.records_after(local_version)
+    except (OSError, ValueError) as e:
+        _stats["log_errors"] += 1
+        logger.error(f"Failed to read event log of home {home_id}: {e}")
+        return 0
+    if gap:
+        # Fell behind the ring: keep what it still holds as history, but local
+        # subscribers and resident state have to resync
+        log = _home_event_logs[home_id]
+        log.clear()
+        for version, data in records:
+            if before is not None and version >= before:
+                break
+            event = _decode(home_id, version, data)
+            if event is None:
+                log.clear()
+                continue
+            log.append((event, data, _sse_chunk(event["type"], data, version)))
+        if before is not None:
+            latest = before - 1
+        resync_version = log[-1][0]["version"] if log else latest
+        _home_versions[home_id] = _emitted_versions[home_id] = resync_version
+        _announce_resync(home_id, resync_version)
+        return len(log)
+    delivered = 0
+    for version, data in records:
+        if before is not None and version >= before:
+            break
+        event = _decode(home_id, version, data)
+        if event is None:
+            # Lost to this worker like events behind a gap
+            _home_event_logs[home_id].clear()
+            _home_versions[home_id] = _emitted_versions[home_id] = version
+            _announce_resync(home_id, version)
+            continue
+        _fan_out(home_id, event, data)
+        _stats["remote_events"] += 1
+        delivered += 1
+        if notify:
+            _notify_remote(event)
+    return delivered
+
+
+async def _bus_loop():
+    while True:
+        await asyncio.sleep(EVENT_BUS_POLL_MS / 1000)
+        for home_id, ring in list(_rings.items()):
+            if ring.peek_version() != _home_versions.get(home_id):
+                _tail(home_id)
+
+
+def _light_ids(event: dict | None):
+    if event is None or event.get("type") != "lights_changed" or "removed" in event:
+        return None
+    return {light["id"] for light in event.get("lights", [])}
+
+
+def _superseded(event: dict | None, light_ids: set) -> bool:
+    """A pending lights_changed event whose lights are all updated again by a newer one"""
+    ids = _light_ids(event)
+    return ids is not None and ids <= light_ids
+
+
+class Subscriber:
+    """One SSE connection: a bounded queue of pre-encoded event frames"""
+
+    transport = "sse"
+
+    def __init__(self, home_id: str, policy: str, max_rate: float | None = None):
+        self.id = next(_subscriber_ids)
+        self.home_id = home_id
+        self.policy = policy
+        self.max_rate = max_rate
+        self.last_delivery = 0.0
+        self.pending: deque[tuple[dict | None, bytes]] = deque()
+        self.wakeup = asyncio.Event()
+        self.closing = False
+        self.connected_at = time.time()
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    def frame(self, event: dict | None, data: bytes | None, chunk: bytes) -> bytes | None:
+        """What this subscriber sends for an event (None for heartbeats), or None to skip it"""
+        return chunk
+
+    def resync_frame(self, payload: dict, version: int) -> bytes:
+        return format_sse("resync_required", payload, version)
+
+    def push(self, event: dict | None, data: bytes | None, chunk: bytes):
+        if self.closing:
+            return
+        frame = self.frame(event, data, chunk)
+        if frame is None:
+            return
+        if len(self.pending) >= SSE_SUBSCRIBER_BUFFER:
+            if event is None:
+                # Heartbeats are never worth making room for
+                return
+            self._make_room(event)
+            if self.closing:
+                return
+        self.pending.append((event, frame))
+        self.wakeup.set()
+
+    def _make_room(self, event: dict | None):
+        if self.policy == "disconnect":
+            self.dropped += len(self.pending)
+            self.pending.clear()
+            version = _home_versions[self.home_id]
+            payload = {"home_id": self.home_id, "current_version": version, "reason": "slow_consumer"}
+            self.pending.append((None, self.resync_frame(payload, version)))
+            self.closing = True
+            _stats["disconnected_slow"] += 1
+            logger.info(f"Disconnecting slow SSE subscriber {self.id} of home {self.home_id}")
+            self.wakeup.set()
+            return
+        if self.policy == "coalesce":
+            new_ids = _light_ids(event)
+            if new_ids is not None:
+                kept = deque(entry for entry in self.pending if not _superseded(entry[0], new_ids))
+                superseded = len(self.pending) - len(kept)
+                if superseded:
+                    self.pending = kept
+                    self.coalesced += superseded
+                    return
+        self.pending.popleft()
+        self.dropped += 1
+
+    def enqueue(self, frame: bytes):
+        """Queue a frame for this subscriber only (replies, catch-up), bypassing filters.
+
+        The buffer bound and slow-consumer policy still apply, so a client that
+        sends commands but never reads cannot grow its queue without limit.
+        """
+        if self.closing:
+            return
+        if len(self.pending) >= SSE_SUBSCRIBER_BUFFER:
+            self._make_room(None)
+            if self.closing:
+                return
+        self.pending.append((None, frame))
+        self.wakeup.set()
+
+    def _drop_superseded(self):
+        """Keep only the newest pending update of each light"""
+        covered = set()
+        kept = deque()
+        for event, frame in reversed(self.pending):
+            ids = _light_ids(event)
+            if ids is not None:
+                if ids <= covered:
+                    self.coalesced += 1
+                    continue
+                covered |= ids
+            kept.appendleft((event, frame))
+        self.pending = kept
+
+    async def next_frames(self) -> list[bytes]:
+        """Everything pending; empty once a closing subscriber has been drained"""
+        if self.max_rate:
+            delay = self.last_delivery + 1 / self.max_rate - time.monotonic()
+            if delay > 0 and not self.closing:
+                await asyncio.sleep(delay)
+        while not self.pending:
+            if self.closing:
+                return []
+            self.wakeup.clear()
+            await self.wakeup.wait()
+        if self.max_rate:
+            self._drop_superseded()
+            self.last_delivery = time.monotonic()
+        frames = [frame for _, frame in self.pending]
+        self.pending.clear()
+        self.sent += len(frames)
+        return frames
+
+    async def next_chunks(self) -> bytes:
+        """Everything pending as one SSE write"""
+        return b"".join(await self.next_frames())
+
+    def catch_up(self, since: int) -> list[bytes]:
+        """Frames for the events after since, or a resync_required frame if they are gone"""
+        entries, resync_required, version = _changes_since(self.home_id, since)
+        if resync_required:
+            payload = {"home_id": self.home_id, "current_version": version, "reason": "event_buffer_gap"}
+            return [self.resync_frame(payload, version)]
+        frames = (self.frame(event, data, chunk) for event, data, chunk in entries)
+        return [frame for frame in frames if frame is not None]
+
+    def resume(self, since: int):
+        """Queue the events after since, replacing live events already queued for them.
+
+        Live events pending since the subscription are all covered by the
+        catch-up, so keeping them would send them twice and out of order.
+        """
+        frames = self.catch_up(since)
+        version = _home_versions[self.home_id]
+        if len(frames) > SSE_SUBSCRIBER_BUFFER:
+            # Would overflow the queue and lose its oldest events; start over instead
+            payload = {"home_id": self.home_id, "current_version": version, "reason": "event_buffer_gap"}
+            frames = [self.resync_frame(payload, version)]
+        self.pending = deque(entry for entry in self.pending if entry[0] is None or entry[0]["version"] > version)
+        for frame in frames:
+            self.enqueue(frame)
+
+    def stats(self) -> dict:
+        return {
+            "id": self.id,
+            "transport": self.transport,
+            "policy": self.policy,
+            "max_rate": self.max_rate,
+            "connected_at": self.connected_at,
+            "pending": len(self.pending),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }
+
+
+def publish(home_id: str, event_type: str, payload: dict) -> dict:
+    """Version and publish an event; returns it (plain light updates may be sent coalesced, later)"""
+    _load(home_id)
+    if is_shared() and home_id in _rings:
+        return _publish_shared(home_id, event_type, payload)
+    if LIGHT_EVENT_COALESCE_MS > 0 and event_type == "lights_changed" and payload.keys() == {"lights"}:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None:
+            return _defer_lights(home_id, payload["lights"], loop)
+    flush_pending(home_id)
+    _home_versions[home_id] += 1
+    return _emit(home_id, event_type, payload, _home_versions[home_id])
+
+
+def _defer_lights(home_id: str, lights: list[dict], loop) -> dict:
+    _home_versions[home_id] += 1
+    version = _home_versions[home_id]
+    pending = _pending_lights.get(home_id)
+    if pending is None:
+        pending = _pending_lights[home_id] = {
+            "lights": {},
+            "first_version": version,
+            "handle": loop.call_later(LIGHT_EVENT_COALESCE_MS / 1000, flush_pending, home_id),
+        }
+    for light in lights:
+        if light["id"] in pending["lights"]:
+            _stats["coalesced_light_updates"] += 1
+        pending["lights"][light["id"]] = light
+    pending["version"] = version
+    return {"type": "lights_changed", "home_id": home_id, "version": version, "ts": int(time.time()), "lights": lights}
+
+
+def flush_pending(home_id: str):
+    """Publish the coalesced light updates of a home now"""
+    pending = _pending_lights.pop(home_id, None)
+    if pending is None:
+        return
+    pending["handle"].cancel()
+    payload = {"lights": list(pending["lights"].values())}
+    if pending["first_version"] != pending["version"]:
+        payload["first_version"] = pending["first_version"]
+    _emit(home_id, "lights_changed", payload, pending["version"])
+
+
+def _publish_shared(home_id: str, event_type: str, payload: dict) -> dict:
+    built = []
+
+    def encode(version: int) -> bytes:
+        event = {"type": event_type, "home_id": home_id, "version": version, "ts": int(time.time()), **payload}
+        built.append(event)
+        return codec.dumps(event)
+
+    version, data = _rings[home_id].append_next(encode)
+    event = built[-1]
+    # Events other workers got in first go out before this one. The caller has
+    # already applied its change to the resident home, so the remote listeners
+    # replaying those older events would overwrite it: a replaced home skips
+    # them (it supersedes them), anything else gets its own change re-applied
+    # on top.
+    replaced = event_type in REPLACING_EVENTS
+    if _tail(home_id, before=version, notify=not replaced) and not replaced:
+        _notify_remote(event)
+    return _fan_out(home_id, event, data)
+
+
+def _emit(home_id: str, event_type: str, payload: dict, version: int) -> dict:
+    event = {
+        "type": event_type,
+        "home_id": home_id,
+        "version": version,
+        "ts": int(time.time()),
+        **payload,
+    }
+    data = codec.dumps(event)
+    ring = _rings.get(home_id)
+    if ring is not None:
+        try:
+            ring.append(version, data)
+        except (OSError, ValueError) as e:
+            _stats["log_errors"] += 1
+            logger.error(f"Failed to persist event {version} of home {home_id}: {e}")
+    return _fan_out(home_id, event, data)
+
+
+def _fan_out(home_id: str, event: dict, data: bytes) -> dict:
+    """Add an encoded event to the local log and hand it to every local subscriber"""
+    version = event["version"]
+    chunk = _sse_chunk(event["type"], data, version)
+    _home_versions[home_id] = max(_home_versions[home_id], version)
+    _emitted_versions[home_id] = max(_emitted_versions[home_id], version)
+    _home_event_logs[home_id].append((event, data, chunk))
+    _stats["published"] += 1
+    _stats["encoded_bytes"] += len(data) + len(chunk)
+
+    for subscriber in list(_home_subscribers.get(home_id, ())):
+        subscriber.push(event, data, chunk)
+    return event
+
+
+def current_version(home_id: str) -> int:
+    _load(home_id)
+    if is_shared():
+        _tail(home_id)
+    return _home_versions[home_id]
+
+
+def _changes_since(home_id: str, since: int):
+    _load(home_id)
+    flush_pending(home_id)
+    if is_shared():
+        _tail(home_id)
+    entries = _home_event_logs[home_id]
+    version = _home_versions[home_id]
+    if since > version:
+        # A version this feed never reached, e.g. from before the log was lost
+        return [], True, version
+    if not entries:
+        return [], since < version, version
+
+    # A coalesced event covers every version from its first_version on
+    oldest_version = entries[0][0].get("first_version", entries[0][0]["version"])
+    if since < oldest_version - 1:
+        return [], True, version
+
+    return [entry for entry in entries if entry[0]["version"] > since], False, version
+
+
+def retained_events(home_id: str) -> list[dict]:
+    """Every event of a home still in the log, oldest first"""
+    _load(home_id)
+    flush_pending(home_id)
+    if is_shared():
+        _tail(home_id)
+    return [event for event, _, _ in _home_event_logs[home_id]]
+
+
+def changes_since(home_id: str, since: int):
+    """(events after since, resync_required, current_version)"""
+    entries, resync_required, version = _changes_since(home_id, since)
+    return [event for event, _, _ in entries], resync_required, version
+
+
+def catch_up_chunk(subscriber: Subscriber, since: int) -> bytes:
+    """hello, then either the missed events or resync_required, for a (re)connecting stream"""
+    version = _home_versions[subscriber.home_id]
+    hello = format_sse("hello", {"home_id": subscriber.home_id, "version": version}, version)
+    return b"".join([hello, *subscriber.catch_up(since)])
+
+
+class WebSocketSubscriber(Subscriber):
+    """A WebSocket connection with optional floor, light and event type filters.
+
+    Frames are the event JSON; lights_changed events that only partly match
+    the light/floor filters are re-encoded with just the matching lights.
+    floor_of_light maps a light id to its floor id.
+    """
+
+    transport = "websocket"
+
+    def __init__(self, home_id: str, policy: str, floor_of_light, max_rate: float | None = None):
+        super().__init__(home_id, policy, max_rate)
+        self.floor_of_light = floor_of_light
+        self.floors: set[str] | None = None
+        self.lights: set[str] | None = None
+        self.event_types: set[str] | None = None
+
+    def set_filters(self, floors=None, lights=None, event_types=None):
+        self.floors = set(floors) if floors is not None else None
+        self.lights = set(lights) if lights is not None else None
+        self.event_types = set(event_types) if event_types is not None else None
+
+    def _wants_light(self, light_id: str) -> bool:
+        if self.lights is not None and light_id not in self.lights:
+            return False
+        return self.floors is None or self.floor_of_light(light_id) in self.floors
+
+    def frame(self, event: dict | None, data: bytes | None, chunk: bytes) -> bytes | None:
+        if event is None:
+            # WebSocket keep-alive is handled by the protocol's own ping frames
+            return None
+        if self.event_types is not None and event["type"] not in self.event_types:
+            return None
+        if self.floors is not None and "floor_id" in event and event["floor_id"] not in self.floors:
+            return None
+        if event["type"] == "lights_changed" and (self.lights is not None or self.floors is not None):
+            lights = [light for light in event.get("lights", []) if self._wants_light(light["id"])]
+            if not lights and not event.get("removed"):
+                return None
+            if len(lights) != len(event.get("lights", [])):
+                return codec.dumps({**event, "lights": lights})
+        return data
+
+    def resync_frame(self, payload: dict, version: int) -> bytes:
+        return codec.dumps({"type": "resync_required", "version": version, **payload})
+
+
+class CompactSubscriber(Subscriber):
+    """An SSE connection that receives light updates as base64 compact frames (see compact.py).
+
+    current_index returns the home's current light index (or None).
+    """
+
+    transport = "sse-compact"
+
+    def __init__(self, home_id: str, policy: str, current_index, max_rate: float | None = None):
+        super().__init__(home_id, policy, max_rate)
+        self.current_index = current_index
+
+    def frame(self, event: dict | None, data: bytes | None, chunk: bytes) -> bytes | None:
+        if event is None or event["type"] != "lights_changed":
+            return chunk
+        index = self.current_index()
+        if index is None:
+            return chunk
+        key = (self.home_id, event["version"], index.tag)
+        if key in _compact_chunks:
+            compact_chunk = _compact_chunks[key]
+        else:
+            # Encoded once per event and index, shared by every compact subscriber
+            frame = compact.encode_lights(event, index)
+            compact_chunk = None if frame is None else _sse_chunk(
+                "lights_compact", base64.b64encode(frame), event["version"]
+            )
+            _compact_chunks[key] = compact_chunk
+            if len(_compact_chunks) > COMPACT_CACHE_SIZE:
+                _compact_chunks.popitem(last=False)
+        return compact_chunk or chunk
+
+
+def _register(subscriber: Subscriber) -> Subscriber:
+    global _ticker_task
+    _load(subscriber.home_id)
+    if is_shared():
+        _tail(subscriber.home_id)
+    # Anything still coalescing was versioned before this subscriber's hello
+    flush_pending(subscriber.home_id)
+    _home_subscribers[subscriber.home_id].add(subscriber)
+    if _ticker_task is None or _ticker_task.done():
+        _ticker_task = asyncio.create_task(_heartbeat_loop())
+    return subscriber
+
+
+def subscribe(home_id: str, policy: str | None = None, max_rate: float | None = None) -> Subscriber:
+    return _register(Subscriber(home_id, policy or SSE_SLOW_CONSUMER_POLICY, max_rate))
+
+
+def subscribe_compact(home_id: str, current_index, policy: str | None = None,
+                      max_rate: float | None = None) -> CompactSubscriber:
+    return _register(CompactSubscriber(home_id, policy or SSE_SLOW_CONSUMER_POLICY, current_index, max_rate))
+
+
+def subscribe_websocket(home_id: str, floor_of_light, policy: str | None = None,
+                        max_rate: float | None = None) -> WebSocketSubscriber:
+    return _register(WebSocketSubscriber(home_id, policy or SSE_SLOW_CONSUMER_POLICY, floor_of_light, max_rate))
+
+
+def unsubscribe(subscriber: Subscriber):
+    subscribers = _home_subscribers.get(subscriber.home_id)
+    if not subscribers:
+        return
+    subscribers.discard(subscriber)
+    if not subscribers:
+        _home_subscribers.pop(subscriber.home_id, None)
+
+
+async def _heartbeat_loop():
+    """One ticker for every connection; exits when the last subscriber is gone"""
+    while _home_subscribers:
+        await asyncio.sleep(SSE_HEARTBEAT_SECONDS)
+        now = int(time.time())
+        for home_id, subscribers in list(_home_subscribers.items()):
+            # Not _home_versions: a client resuming from a ping's id must not skip
+            # light updates that are still coalescing
+            version = _emitted_versions[home_id]
+            chunk = format_sse("ping", {"home_id": home_id, "version": version, "ts": now}, version)
+            for subscriber in list(subscribers):
+                subscriber.push(None, None, chunk)
+            _stats["heartbeats"] += 1
+
+
+def get_stats():
+    return {
+        **_stats,
+        "policy": SSE_SLOW_CONSUMER_POLICY,
+        "buffer": SSE_SUBSCRIBER_BUFFER,
+        "heartbeat_seconds": SSE_HEARTBEAT_SECONDS,
+        "coalesce_ms": LIGHT_EVENT_COALESCE_MS,
+        "bus": "shared" if is_shared() else "local",
+        "coalescing_homes": len(_pending_lights),
+        "homes": {
+            home_id: [subscriber.stats() for subscriber in subscribers]
+            for home_id, subscribers in _home_subscribers.items()
+        },
+    }
@@ -0,0 +1,243 @@
+import numpy as np
+from models import Home, Light, LightState
+
+# Columnar light state for bulk operations.
+#
+# Each resident home gets a table with one row per light (floor order) and
+# the on flags, intensities and RGB colors as NumPy arrays. Bulk control,
+# scenes and floor-wide commands compute their target states as masked
+# updates over these columns, diff them against a snapshot in one vectorized
+# comparison, and write back only the rows that actually changed. The Light
+# and LightState models stay what is serialized, persisted and published.
+#
+# The table follows the models rather than owning them. It is dropped
+# whenever db reindexes the home's lights (floors or lights added, removed or
+# replaced), so looking it up is O(1), and it re-reads only the rows whose
+# LightState was reported replaced through states_replaced(), which
+# db.record_light_changes() does for every persisted light change. Code outside
+# this module therefore assigns new LightState objects instead of mutating
+# them in place. Names resolve to cached row indexes, so a named command
+# touches only its own rows.
+MAX_INTENSITY = 5.0  # brightness 100 in the control API
+
+_tables: dict[str, "LightTable"] = {}
+_NO_ROWS = np.zeros(0, dtype=np.intp)
+
+
+def _parse_color(color: str):
+    """(r, g, b) of a #rrggbb color, or None"""
+    if len(color) != 7 or not color.startswith("#"):
+        return None
+    try:
+        value = int(color[1:], 16)
+    except ValueError:
+        return None
+    return value >> 16, (value >> 8) & 0xFF, value & 0xFF
+
+
+def color_temperature_rgb(kelvin: float) -> tuple[int, int, int]:
+    """Approximate RGB of a black body at the given color temperature (1000-40000 K)"""
+    t = min(max(kelvin, 1000.0), 40000.0) / 100.0
+    if t <= 66:
+        red = 255.0
+        green = 99.4708025861 * np.log(t) - 161.1195681661
+        blue = 0.0 if t <= 19 else 138.5177312231 * np.log(t - 10) - 305.0447927307
+    else:
+        red = 329.698727446 * (t - 60) ** -0.1332047592
+        green = 288.1221695283 * (t - 60) ** -0.0755148492
+        blue = 255.0
+    return tuple(int(min(max(c, 0.0), 255.0)) for c in (red, green, blue))
+
+
+class LightTable:
+    def __init__(self, home: Home):
+        self.home = home
+        self.lights: list[Light] = []
+        floor_rows = []
+        for f, floor in enumerate(home.floors):
+            self.lights.extend(floor.lights)
+            floor_rows.extend([f] * len(floor.lights))
+        self.floor_ids = [floor.id for floor in home.floors]
+        self.positions = {light.id: row for row, light in enumerate(self.lights)}
+        names: dict[str, list[int]] = {}
+        for row, light in enumerate(self.lights):
+            names.setdefault(light.name, []).append(row)
+        self.names = {name: np.array(rows, dtype=np.intp) for name, rows in names.items()}
+
+        count = len(self.lights)
+        self.floor = np.array(floor_rows, dtype=np.int32)
+        self.on = np.zeros(count, dtype=bool)
+        self.intensity = np.zeros(count, dtype=np.float64)
+        self.rgb = np.zeros((count, 3), dtype=np.uint8)
+        # Rows whose color string is not #rrggbb; kept verbatim until a color is set
+        self.custom_color = np.zeros(count, dtype=bool)
+        self._states: list[LightState | None] = [None] * count
+        self._compiled: dict[int, tuple] = {}
+        # Ids of lights whose state may have been replaced since they were read
+        self.stale: set[str] = set()
+        for row in range(count):
+            self._read(row)
+
+    def _read(self, row: int):
+        state = self.lights[row].state
+        if state is self._states[row]:
+            return
+        self._states[row] = state
+        self.on[row] = state.on
+        self.intensity[row] = state.intensity
+        rgb = _parse_color(state.color)
+        self.custom_color[row] = rgb is None
+        self.rgb[row] = rgb or (255, 255, 255)
+
+    def sync(self):
+        """Re-read the stale rows whose LightState object was replaced"""
+        for light_id in self.stale:
+            row = self.positions.get(light_id)
+            if row is not None:
+                self._read(row)
+        self.stale.clear()
+
+    def rows_named(self, name: str) -> np.ndarray:
+        """Row indexes of the lights with this name"""
+        return self.names.get(name, _NO_ROWS)
+
+    def select(self, floors: list[str] | None = None, lights: list[str] | None = None,
+               names: list[str] | None = None) -> np.ndarray:
+        """Boolean row mask of the lights matching every given filter (None matches all)"""
+        mask = np.ones(len(self.lights), dtype=bool)
+        if floors is not None:
+            floors = set(floors)
+            wanted = [f for f, floor_id in enumerate(self.floor_ids) if floor_id in floors]
+            mask &= np.isin(self.floor, wanted)
+        if lights is not None:
+            rows = np.zeros(len(self.lights), dtype=bool)
+            rows[[self.positions[light_id] for light_id in lights if light_id in self.positions]] = True
+            mask &= rows
+        if names is not None:
+            rows = np.zeros(len(self.lights), dtype=bool)
+            for name in names:
+                rows[self.rows_named(name)] = True
+            mask &= rows
+        return mask
+
+    def snapshot(self, rows=None):
+        """Copies of the columns, of every row or of the given row indexes"""
+        if rows is None:
+            return self.on.copy(), self.intensity.copy(), self.rgb.copy(), self.custom_color.copy()
+        return self.on[rows], self.intensity[rows], self.rgb[rows], self.custom_color[rows]
+
+    def changed_rows(self, before, rows=None) -> np.ndarray:
+        """Rows whose columns differ from a snapshot taken with the same rows"""
+        selected = slice(None) if rows is None else rows
+        on, intensity, rgb, custom_color = before
+        changed = (self.on[selected] != on) | (self.intensity[selected] != intensity)
+        changed |= (self.custom_color[selected] != custom_color) | (self.rgb[selected] != rgb).any(axis=1)
+        changed = np.flatnonzero(changed)
+        return changed if rows is None else rows[changed]
+
+    def update(self, rows: np.ndarray, on: bool | None = None, intensity: float | None = None,
+               scale: float | None = None, rgb: tuple[int, int, int] | None = None) -> np.ndarray:
+        """Masked in-place update of the columns; returns the rows this update changed.
+
+        rows is a boolean mask or an array of row indexes; only those rows are compared.
+        """
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        before = self.snapshot(rows)
+        if on is not None:
+            self.on[rows] = on
+        if intensity is not None:
+            self.intensity[rows] = intensity
+        if scale is not None:
+            self.intensity[rows] = np.clip(self.intensity[rows] * scale, 0.0, MAX_INTENSITY)
+        if rgb is not None:
+            self.rgb[rows] = rgb
+            self.custom_color[rows] = False
+        return self.changed_rows(before, rows)
+
+    def _compile(self, targets: dict[str, LightState]):
+        """Rows and column values of a set of target states, cached per (unchanged) dict"""
+        cached = self._compiled.get(id(targets))
+        if cached is not None and cached[0] is targets:
+            return cached[1]
+        rows, missing, custom = [], [], []
+        on, intensity, rgb = [], [], []
+        for light_id, state in targets.items():
+            row = self.positions.get(light_id)
+            if row is None:
+                missing.append(light_id)
+                continue
+            color = _parse_color(state.color)
+            if color is None:
+                custom.append((row, state))
+                continue
+            rows.append(row)
+            on.append(state.on)
+            intensity.append(state.intensity)
+            rgb.append(color)
+        compiled = (
+            np.array(rows, dtype=np.intp),
+            np.array(on, dtype=bool),
+            np.array(intensity, dtype=np.float64),
+            np.array(rgb, dtype=np.uint8).reshape(-1, 3),
+            missing,
+            custom,
+        )
+        if len(self._compiled) >= 64:
+            self._compiled.clear()
+        self._compiled[id(targets)] = (targets, compiled)
+        return compiled
+
+    def apply_states(self, targets: dict[str, LightState]):
+        """Move lights to target states by id; returns (changed lights, ids that do not exist)"""
+        rows, on, intensity, rgb, missing, custom = self._compile(targets)
+        before = self.snapshot(rows)
+        self.on[rows] = on
+        self.intensity[rows] = intensity
+        self.rgb[rows] = rgb
+        self.custom_color[rows] = False
+        changed = self.write_back(self.changed_rows(before, rows))
+
+        # Colors the columns cannot hold go straight to the model
+        for row, state in custom:
+            light = self.lights[row]
+            if light.state != state:
+                light.state = state.copy()
+                changed.append(light)
+        return changed, missing
+
+    def write_back(self, rows) -> list[Light]:
+        """Materialize the column values of rows into their models"""
+        changed = []
+        for row in rows:
+            row = int(row)
+            light = self.lights[row]
+            previous = light.state
+            color = previous.color if self.custom_color[row] else "#{:02x}{:02x}{:02x}".format(*self.rgb[row].tolist())
+            state = LightState.model_construct(on=bool(self.on[row]), color=color, intensity=float(self.intensity[row]))
+            if state != previous:
+                light.state = state
+                changed.append(light)
+            self._states[row] = light.state
+        return changed
+
+
+def table_for(home: Home) -> LightTable:
+    """Light table of a home, built on first use after its lights changed and synced with replaced states"""
+    table = _tables.get(home.id)
+    if table is None or table.home is not home:
+        table = _tables[home.id] = LightTable(home)
+    elif table.stale:
+        table.sync()
+    return table
+
+
+def states_replaced(home_id: str, lights: list[Light]):
+    """Note lights whose LightState object was replaced outside the table"""
+    table = _tables.get(home_id)
+    if table is not None:
+        table.stale.update(light.id for light in lights)
+
+
+def drop(home_id: str):
+    _tables.pop(home_id, None)
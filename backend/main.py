@@ -1,12 +1,29 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-from api import router
+from api import router, status_router, ws_router
+import codec
+import db
+import validation
 import uvicorn
 
-app = FastAPI()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Storage is prepared here rather than at import time; the initial home
+    # keeps loading in the background while the server starts accepting requests
+    await db.startup()
+    yield
+    # Flush pending saves and fold journals before the process exits
+    await db.shutdown()
+    validation.shutdown()
+
+app = FastAPI(lifespan=lifespan, default_response_class=codec.JSONResponse)
+
+app.include_router(status_router, prefix="/api")
 app.include_router(router, prefix="/api")
+app.include_router(ws_router, prefix="/api")
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
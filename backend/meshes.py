@@ -0,0 +1,347 @@
+import asyncio
+import codec
+import hashlib
+import os
+import struct
+from collections import OrderedDict
+import numpy as np
+from models import Floor
+
+# Render-ready floor meshes, built on the server so low-power clients do not
+# have to turn walls, windows and floor polygons into triangles themselves.
+#
+# Each floor becomes a binary glTF (GLB) file with one node (translated to the
+# floor's height, FLOOR_HEIGHT per level) and one mesh of three primitives:
+# the floor slab (the shape polygon triangulated and extruded FLOOR_THICKNESS
+# down), the walls (boxes with window openings cut out, including the reveals)
+# and the window panes. Positions and normals are float32, indices uint32, all
+# in the same coordinates as the home model (y up, meters).
+#
+# A floor's mesh is addressed by a hash of the geometry it is built from
+# (name, level, shape, walls and windows), so it is immutable: unchanged floors keep
+# their cached GLB and clients their downloaded one, and only floors whose
+# geometry changed are rebuilt. Edits replace floor objects rather than mutate
+# them, so the hash is computed once per floor object.
+FLOOR_HEIGHT = 2.5
+FLOOR_THICKNESS = 0.25
+FLOOR_OFFSET = 0.01  # the slab top sits slightly above 0 to cover the lower walls
+MESH_CACHE_MAX_BYTES = int(os.getenv('MESH_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+MEDIA_TYPE = "model/gltf-binary"
+
+_MATERIALS = [
+    {"name": "floor", "color": "#444444"},
+    {"name": "wall", "color": "#e2e8f0"},
+    {"name": "glass", "color": "#87ceeb", "opacity": 0.6},
+]
+_QUAD = np.array([0, 1, 2, 0, 2, 3], dtype=np.uint32)
+
+_hashes: dict[str, tuple[Floor, str]] = {}
+_meshes: OrderedDict[str, bytes] = OrderedDict()
+_cache_bytes = 0
+_stats = {"hits": 0, "builds": 0, "evictions": 0}
+
+
+def mesh_hash(floor: Floor) -> str:
+    """Content hash of the geometry a floor mesh is built from"""
+    cached = _hashes.get(floor.id)
+    if cached is not None and cached[0] is floor:
+        return cached[1]
+    geometry = {
+        "name": floor.name,
+        "level": floor.level,
+        "shape": [point.dict() for point in floor.shape],
+        "walls": [wall.dict(exclude={"id": True, "windows": {"__all__": {"id"}}}) for wall in floor.walls],
+    }
+    digest = hashlib.sha256(codec.dumps(geometry)).hexdigest()[:32]
+    _hashes[floor.id] = (floor, digest)
+    return digest
+
+
+class _MeshBuilder:
+    """Collects quads and triangles as position, normal and index arrays"""
+
+    def __init__(self):
+        self.positions: list[np.ndarray] = []
+        self.normals: list[np.ndarray] = []
+        self.indices: list[np.ndarray] = []
+        self.count = 0
+
+    def quads(self, corners: np.ndarray, normals: np.ndarray):
+        """Add (N, 4, 3) corner arrays with one (N, 3) normal each, wound to face their normal"""
+        if not len(corners):
+            return
+        facing = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+        flip = np.einsum('ij,ij->i', facing, normals) < 0
+        corners = corners.copy()
+        corners[flip] = corners[flip][:, ::-1]
+        count = len(corners)
+        self.positions.append(corners.reshape(-1, 3))
+        self.normals.append(np.repeat(normals, 4, axis=0))
+        offsets = self.count + 4 * np.arange(count, dtype=np.uint32)
+        self.indices.append((offsets[:, None] + _QUAD).reshape(-1))
+        self.count += 4 * count
+
+    def triangles(self, points: np.ndarray, triangles: np.ndarray, normal):
+        """Add vertices shared by index triangles, all with the same normal and wound to face it"""
+        if not len(triangles):
+            return
+        a, b, c = (points[triangles[:, k]] for k in range(3))
+        flip = np.cross(b - a, c - a) @ np.asarray(normal, dtype=np.float64) < 0
+        triangles = triangles.copy()
+        triangles[flip] = triangles[flip][:, ::-1]
+        self.positions.append(points)
+        self.normals.append(np.tile(np.asarray(normal, dtype=np.float64), (len(points), 1)))
+        self.indices.append(triangles.reshape(-1).astype(np.uint32) + self.count)
+        self.count += len(points)
+
+    def arrays(self):
+        if not self.count:
+            return None
+        return (
+            np.concatenate(self.positions).astype(np.float32),
+            np.concatenate(self.normals).astype(np.float32),
+            np.concatenate(self.indices).astype(np.uint32),
+        )
+
+
+def triangulate(points: np.ndarray) -> np.ndarray:
+    """Ear clipping of a simple polygon given counter-clockwise in (x, z); (M, 3) vertex indices"""
+    remaining = list(range(len(points)))
+    triangles = []
+
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    guard = 0
+    while len(remaining) > 3 and guard < len(points) ** 2:
+        guard += 1
+        for k in range(len(remaining)):
+            i, j, n = remaining[k - 1], remaining[k], remaining[(k + 1) % len(remaining)]
+            a, b, c = points[i], points[j], points[n]
+            if cross(a, b, c) <= 0:
+                continue  # reflex or degenerate corner
+            if any(
+                cross(a, b, points[m]) >= 0 and cross(b, c, points[m]) >= 0 and cross(c, a, points[m]) >= 0
+                for m in remaining if m not in (i, j, n)
+            ):
+                continue
+            triangles.append((i, j, n))
+            del remaining[k]
+            break
+        else:
+            break  # self-intersecting; leave the rest out
+    if len(remaining) == 3:
+        triangles.append(tuple(remaining))
+    return np.array(triangles, dtype=np.uint32).reshape(-1, 3)
+
+
+def _build_slab(floor: Floor, builder: _MeshBuilder):
+    if len(floor.shape) < 3:
+        return
+    outline = np.array([(point.x, point.z) for point in floor.shape], dtype=np.float64)
+    # Make the outline counter-clockwise in (x, z) for the ear clipping
+    area = np.sum(outline[:, 0] * np.roll(outline[:, 1], -1) - np.roll(outline[:, 0], -1) * outline[:, 1])
+    if area == 0:
+        return
+    if area < 0:
+        outline = outline[::-1]
+    triangles = triangulate(outline)
+
+    top, bottom = FLOOR_OFFSET, FLOOR_OFFSET - FLOOR_THICKNESS
+    for y, normal in ((top, (0, 1, 0)), (bottom, (0, -1, 0))):
+        points = np.column_stack([outline[:, 0], np.full(len(outline), y), outline[:, 1]])
+        builder.triangles(points, triangles, normal)
+
+    # Side faces, one quad per edge with an outward normal
+    start, end = outline, np.roll(outline, -1, axis=0)
+    edge = end - start
+    keep = np.hypot(edge[:, 0], edge[:, 1]) > 0
+    start, end, edge = start[keep], end[keep], edge[keep]
+    outward = np.column_stack([edge[:, 1], np.zeros(len(edge)), -edge[:, 0]])
+    outward /= np.linalg.norm(outward, axis=1)[:, None]
+    corners = np.stack([
+        np.column_stack([start[:, 0], np.full(len(start), bottom), start[:, 1]]),
+        np.column_stack([end[:, 0], np.full(len(end), bottom), end[:, 1]]),
+        np.column_stack([end[:, 0], np.full(len(end), top), end[:, 1]]),
+        np.column_stack([start[:, 0], np.full(len(start), top), start[:, 1]]),
+    ], axis=1)
+    builder.quads(corners, outward)
+
+
+def _build_wall(wall, walls: _MeshBuilder, glass: _MeshBuilder):
+    dx, dz = wall.p2.x - wall.p1.x, wall.p2.z - wall.p1.z
+    length = float(np.hypot(dx, dz))
+    height, half = wall.height, wall.thickness / 2
+    if length == 0 or height <= 0 or half <= 0:
+        return
+    origin = np.array([wall.p1.x, 0.0, wall.p1.z])
+    along = np.array([dx / length, 0.0, dz / length])
+    across = np.array([-along[2], 0.0, along[0]])
+    up = np.array([0.0, 1.0, 0.0])
+
+    def world(u, v, w):
+        """Wall-local (u along, v up, w across) coordinates to world positions"""
+        return origin + np.asarray(u)[..., None] * along + np.asarray(v)[..., None] * up + np.asarray(w)[..., None] * across
+
+    openings = []
+    for window in wall.windows:
+        u = sorted((
+            float((window.p1.x - wall.p1.x) * along[0] + (window.p1.z - wall.p1.z) * along[2]),
+            float((window.p2.x - wall.p1.x) * along[0] + (window.p2.z - wall.p1.z) * along[2]),
+        ))
+        u0, u1 = max(u[0], 0.0), min(u[1], length)
+        v0, v1 = max(window.bottom_height, 0.0), min(window.bottom_height + window.height, height)
+        if u1 > u0 and v1 > v0:
+            openings.append((u0, u1, v0, v1))
+    openings = np.array(openings, dtype=np.float64).reshape(-1, 4)
+
+    # Faces: split the wall rectangle at every opening edge and keep the cells
+    # outside all openings
+    us = np.unique(np.concatenate([[0.0, length], openings[:, 0], openings[:, 1]]))
+    vs = np.unique(np.concatenate([[0.0, height], openings[:, 2], openings[:, 3]]))
+    uc, vc = np.meshgrid((us[:-1] + us[1:]) / 2, (vs[:-1] + vs[1:]) / 2, indexing='ij')
+    inside = (
+        (uc[None] > openings[:, 0, None, None]) & (uc[None] < openings[:, 1, None, None])
+        & (vc[None] > openings[:, 2, None, None]) & (vc[None] < openings[:, 3, None, None])
+    ).any(axis=0)
+    cu, cv = np.nonzero(~inside)
+    u_lo, u_hi, v_lo, v_hi = us[cu], us[cu + 1], vs[cv], vs[cv + 1]
+    for side in (half, -half):
+        w = np.full(len(cu), side)
+        corners = np.stack([world(u_lo, v_lo, w), world(u_hi, v_lo, w), world(u_hi, v_hi, w), world(u_lo, v_hi, w)], axis=1)
+        walls.quads(corners, np.tile(across * np.sign(side), (len(cu), 1)))
+
+    # Top, bottom and end caps of the box
+    caps = [
+        ((0, 0, -half), (length, 0, -half), (length, 0, half), (0, 0, half), -up),
+        ((0, height, -half), (length, height, -half), (length, height, half), (0, height, half), up),
+        ((0, 0, -half), (0, height, -half), (0, height, half), (0, 0, half), -along),
+        ((length, 0, -half), (length, height, -half), (length, height, half), (length, 0, half), along),
+    ]
+    # Reveals: the inner faces of each opening, facing into the hole
+    for u0, u1, v0, v1 in openings:
+        caps.extend([
+            ((u0, v0, -half), (u1, v0, -half), (u1, v0, half), (u0, v0, half), up),
+            ((u0, v1, -half), (u1, v1, -half), (u1, v1, half), (u0, v1, half), -up),
+            ((u0, v0, -half), (u0, v1, -half), (u0, v1, half), (u0, v0, half), along),
+            ((u1, v0, -half), (u1, v1, -half), (u1, v1, half), (u1, v0, half), -along),
+        ])
+    local = np.array([cap[:4] for cap in caps], dtype=np.float64)
+    walls.quads(world(local[..., 0], local[..., 1], local[..., 2]), np.array([cap[4] for cap in caps]))
+
+    # One pane per opening in the middle of the wall
+    if len(openings):
+        u0, u1, v0, v1 = openings.T
+        w = np.zeros(len(openings))
+        panes = np.stack([world(u0, v0, w), world(u1, v0, w), world(u1, v1, w), world(u0, v1, w)], axis=1)
+        glass.quads(panes, np.tile(across, (len(openings), 1)))
+
+
+def _linear(color: str) -> list[float]:
+    """glTF base colors are linear; model colors are sRGB hex"""
+    channels = np.array([int(color[i:i + 2], 16) for i in (1, 3, 5)]) / 255.0
+    linear = np.where(channels <= 0.04045, channels / 12.92, ((channels + 0.055) / 1.055) ** 2.4)
+    return [round(float(c), 5) for c in linear]
+
+
+def _encode_glb(floor: Floor, primitives: list[tuple[int, tuple]]) -> bytes:
+    gltf = {
+        "asset": {"version": "2.0", "generator": "mimesys"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"name": floor.name, "mesh": 0, "translation": [0.0, floor.level * FLOOR_HEIGHT, 0.0]}],
+        "meshes": [{"name": "floor", "primitives": []}],
+        "materials": [],
+        "accessors": [],
+        "bufferViews": [],
+        "buffers": [],
+    }
+    for material in _MATERIALS:
+        entry = {
+            "name": material["name"],
+            "pbrMetallicRoughness": {
+                "baseColorFactor": _linear(material["color"]) + [material.get("opacity", 1.0)],
+                "metallicFactor": 0.0,
+                "roughnessFactor": 1.0,
+            },
+        }
+        if "opacity" in material:
+            entry.update(alphaMode="BLEND", doubleSided=True)
+        gltf["materials"].append(entry)
+
+    blob = bytearray()
+
+    def view(data: np.ndarray, target: int) -> int:
+        # Every view starts 4-byte aligned
+        blob.extend(b"\0" * (-len(blob) % 4))
+        gltf["bufferViews"].append({"buffer": 0, "byteOffset": len(blob), "byteLength": data.nbytes, "target": target})
+        blob.extend(data.tobytes())
+        return len(gltf["bufferViews"]) - 1
+
+    def accessor(data: np.ndarray, target: int, component: int, kind: str, bounds: bool = False) -> int:
+        entry = {"bufferView": view(data, target), "componentType": component, "count": len(data), "type": kind}
+        if bounds:
+            entry.update(min=data.min(axis=0).tolist(), max=data.max(axis=0).tolist())
+        gltf["accessors"].append(entry)
+        return len(gltf["accessors"]) - 1
+
+    for material, (positions, normals, indices) in primitives:
+        gltf["meshes"][0]["primitives"].append({
+            "attributes": {
+                "POSITION": accessor(positions, 34962, 5126, "VEC3", bounds=True),
+                "NORMAL": accessor(normals, 34962, 5126, "VEC3"),
+            },
+            "indices": accessor(indices, 34963, 5125, "SCALAR"),
+            "material": material,
+        })
+    blob.extend(b"\0" * (-len(blob) % 4))
+    gltf["buffers"].append({"byteLength": len(blob)})
+
+    document = codec.dumps(gltf)
+    document += b" " * (-len(document) % 4)
+    length = 12 + 8 + len(document) + 8 + len(blob)
+    return b"".join([
+        struct.pack("<4sII", b"glTF", 2, length),
+        struct.pack("<I4s", len(document), b"JSON"), document,
+        struct.pack("<I4s", len(blob), b"BIN\0"), bytes(blob),
+    ])
+
+
+def build_floor_glb(floor: Floor) -> bytes:
+    """GLB of a floor: slab, walls with openings and window panes"""
+    slab, walls, glass = _MeshBuilder(), _MeshBuilder(), _MeshBuilder()
+    _build_slab(floor, slab)
+    for wall in floor.walls:
+        _build_wall(wall, walls, glass)
+    primitives = [
+        (material, arrays)
+        for material, arrays in enumerate((slab.arrays(), walls.arrays(), glass.arrays()))
+        if arrays is not None
+    ]
+    return _encode_glb(floor, primitives)
+
+
+async def floor_glb(floor: Floor) -> tuple[str, bytes]:
+    """(mesh hash, GLB) of a floor, built in a worker thread on a cache miss"""
+    global _cache_bytes
+    digest = mesh_hash(floor)
+    data = _meshes.get(digest)
+    if data is not None:
+        _meshes.move_to_end(digest)
+        _stats["hits"] += 1
+        return digest, data
+
+    data = await asyncio.to_thread(build_floor_glb, floor)
+    _stats["builds"] += 1
+    if digest not in _meshes:
+        _meshes[digest] = data
+        _cache_bytes += len(data)
+    while _cache_bytes > MESH_CACHE_MAX_BYTES and len(_meshes) > 1:
+        _, evicted = _meshes.popitem(last=False)
+        _cache_bytes -= len(evicted)
+        _stats["evictions"] += 1
+    return digest, data
+
+
+def get_stats():
+    return {**_stats, "entries": len(_meshes), "bytes": _cache_bytes}
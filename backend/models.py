@@ -1,7 +1,21 @@
-from typing import List, Optional
-from pydantic import BaseModel
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field, field_validator
 from uuid import uuid4
 
+def _new_id() -> str:
+    return str(uuid4())
+
+class IdentifiedModel(BaseModel):
+    # Ids default to a fresh uuid, also when given as null. This is done with a
+    # default factory and a field validator rather than by overriding __init__,
+    # which would force pydantic to validate every nested model in Python.
+    id: Optional[str] = Field(default_factory=_new_id)
+
+    @field_validator("id")
+    @classmethod
+    def _ensure_id(cls, value):
+        return value or _new_id()
+
 class Vector3(BaseModel):
     x: float
     y: float
@@ -12,57 +26,36 @@ class LightState(BaseModel):
     color: str = "#ffffff"
     intensity: float = 1.0
 
-class Light(BaseModel):
-    id: str = None
+class Light(IdentifiedModel):
     name: str
     position: Vector3
     state: LightState = LightState()
 
-    def __init__(self, **data):
-        super().__init__(**data)
-        if self.id is None:
-            self.id = str(uuid4())
-
-class Window(BaseModel):
-    id: str = None
+class Window(IdentifiedModel):
     p1: Vector3
     p2: Vector3
     height: float = 1.5
     bottom_height: float = 0.8  # Height from floor
 
-    def __init__(self, **data):
-        super().__init__(**data)
-        if self.id is None:
-            self.id = str(uuid4())
-
-class Wall(BaseModel):
-    id: str = None
+class Wall(IdentifiedModel):
     p1: Vector3
     p2: Vector3
     height: float = 2.5
     thickness: float = 0.2
     windows: List[Window] = []
 
-    def __init__(self, **data):
-        super().__init__(**data)
-        if self.id is None:
-            self.id = str(uuid4())
-
-class Cube(BaseModel):
-    id: str = None
+class Cube(IdentifiedModel):
     name: str = "Cube"
     position: Vector3
     rotation: float = 0.0
     size: Vector3 = Vector3(x=1, y=1, z=1)
     color: str = "#ababab"
 
-    def __init__(self, **data):
-        super().__init__(**data)
-        if self.id is None:
-            self.id = str(uuid4())
+class RoomLabel(IdentifiedModel):
+    name: str
+    position: Vector3 # Any point inside the room; rooms themselves are derived from the walls
 
-class Floor(BaseModel):
-    id: str = None
+class Floor(IdentifiedModel):
     level: int
     name: str
     walls: List[Wall] = []
@@ -70,19 +63,14 @@ class Floor(BaseModel):
     cubes: List[Cube] = []
     floor_plan_image: Optional[str] = None # Base64 or URL
     shape: List[Vector3] = [] # Ordered points defining the floor polygon
+    room_labels: List[RoomLabel] = []
 
-    def __init__(self, **data):
-        super().__init__(**data)
-        if self.id is None:
-            self.id = str(uuid4())
+class Scene(IdentifiedModel):
+    name: str
+    lights: Dict[str, LightState] = {} # Target state by light id
 
-class Home(BaseModel):
-    id: str = None
+class Home(IdentifiedModel):
     name: str
     floors: List[Floor] = []
     background_color: str = "#222222"  # Default dark grey
-
-    def __init__(self, **data):
-        super().__init__(**data)
-        if self.id is None:
-            self.id = str(uuid4())
+    scenes: List[Scene] = []
@@ -0,0 +1,182 @@
+from typing import Literal
+from pydantic import BaseModel, ValidationError
+from models import Home, Floor, Wall, Window, Light, Cube, Vector3
+
+# Partial home edits: a list of id-addressed operations on the walls, windows,
+# cubes, lights and shape of a floor. Only the sub-models an operation touches
+# are validated, and floors are copied on first write (sharing every untouched
+# wall, light, cube and the floor plan image) so a failing operation leaves
+# the live home unchanged.
+COLLECTIONS = {"wall": "walls", "cube": "cubes", "light": "lights"}
+MODELS = {"wall": Wall, "window": Window, "cube": Cube, "light": Light}
+
+
+class PatchOperation(BaseModel):
+    op: Literal["add", "update", "remove", "replace"]
+    target: Literal["wall", "window", "cube", "light", "shape"]
+    floor_id: str
+    wall_id: str | None = None  # Owning wall, for windows
+    id: str | None = None
+    value: dict | list | None = None
+
+
+class PatchError(ValueError):
+    def __init__(self, index: int, message: str):
+        super().__init__(f"operations[{index}]: {message}")
+        self.index = index
+
+
+class _Changes:
+    """Upserted and removed ids per (event type, floor), in first-touched order"""
+
+    def __init__(self):
+        self.events: dict[tuple[str, str], dict] = {}
+
+    def _entry(self, event_type: str, floor_id: str) -> dict:
+        return self.events.setdefault((event_type, floor_id), {"upserted": {}, "removed": []})
+
+    def upsert(self, event_type: str, floor_id: str, item):
+        entry = self._entry(event_type, floor_id)
+        entry["upserted"][item.id] = item
+        if item.id in entry["removed"]:
+            entry["removed"].remove(item.id)
+
+    def remove(self, event_type: str, floor_id: str, item_id: str):
+        entry = self._entry(event_type, floor_id)
+        entry["upserted"].pop(item_id, None)
+        entry["removed"].append(item_id)
+
+    def shape(self, floor_id: str):
+        self._entry("floor_shape_changed", floor_id)
+
+
+def _build(model, index: int, data: dict):
+    try:
+        return model(**data)
+    except ValidationError as e:
+        raise PatchError(index, f"invalid {model.__name__.lower()}: {e.errors()}")
+
+
+def _find(items: list, item_id: str | None, index: int, what: str) -> int:
+    for position, item in enumerate(items):
+        if item.id == item_id:
+            return position
+    raise PatchError(index, f"{what} {item_id!r} not found")
+
+
+def _apply_item(floor: Floor, operation: PatchOperation, index: int, changes: _Changes):
+    field = COLLECTIONS[operation.target]
+    model = MODELS[operation.target]
+    event_type = f"{field}_changed"
+    items = list(getattr(floor, field))
+
+    if operation.op == "add":
+        if not isinstance(operation.value, dict):
+            raise PatchError(index, "add needs an object value")
+        item = _build(model, index, operation.value)
+        if any(existing.id == item.id for existing in items):
+            raise PatchError(index, f"{operation.target} {item.id!r} already exists")
+        items.append(item)
+        changes.upsert(event_type, floor.id, item)
+    elif operation.op in ("update", "replace"):
+        if not isinstance(operation.value, dict):
+            raise PatchError(index, f"{operation.op} needs an object value")
+        position = _find(items, operation.id, index, operation.target)
+        base = items[position].dict() if operation.op == "update" else {}
+        item = _build(model, index, {**base, **operation.value, "id": operation.id})
+        items[position] = item
+        changes.upsert(event_type, floor.id, item)
+    else:
+        position = _find(items, operation.id, index, operation.target)
+        items.pop(position)
+        changes.remove(event_type, floor.id, operation.id)
+
+    setattr(floor, field, items)
+
+
+def _apply_window(floor: Floor, operation: PatchOperation, index: int, changes: _Changes):
+    walls = list(floor.walls)
+    wall_position = _find(walls, operation.wall_id, index, "wall")
+    wall = walls[wall_position]
+    windows = list(wall.windows)
+
+    if operation.op == "add":
+        if not isinstance(operation.value, dict):
+            raise PatchError(index, "add needs an object value")
+        window = _build(Window, index, operation.value)
+        if any(existing.id == window.id for existing in windows):
+            raise PatchError(index, f"window {window.id!r} already exists")
+        windows.append(window)
+    elif operation.op in ("update", "replace"):
+        if not isinstance(operation.value, dict):
+            raise PatchError(index, f"{operation.op} needs an object value")
+        position = _find(windows, operation.id, index, "window")
+        base = windows[position].dict() if operation.op == "update" else {}
+        windows[position] = _build(Window, index, {**base, **operation.value, "id": operation.id})
+    else:
+        windows.pop(_find(windows, operation.id, index, "window"))
+
+    # A window change is published as an update of its wall
+    walls[wall_position] = wall.copy(update={"windows": windows})
+    floor.walls = walls
+    changes.upsert("walls_changed", floor.id, walls[wall_position])
+
+
+def _apply_shape(floor: Floor, operation: PatchOperation, index: int, changes: _Changes):
+    if operation.op == "remove":
+        shape = []
+    elif isinstance(operation.value, list):
+        try:
+            shape = [Vector3(**point) for point in operation.value]
+        except (TypeError, ValidationError) as e:
+            raise PatchError(index, f"invalid shape: {e}")
+    else:
+        raise PatchError(index, "shape needs a list of points")
+    floor.shape = shape
+    changes.shape(floor.id)
+
+
+def apply_operations(home: Home, operations: list[PatchOperation]):
+    """Apply operations to copies of the affected floors.
+
+    Returns (floors, events): the patched home floor list and the
+    (event_type, payload) pairs describing what changed. Raises PatchError
+    without touching the home if any operation is invalid.
+    """
+    positions = {floor.id: position for position, floor in enumerate(home.floors)}
+    patched: dict[str, Floor] = {}
+    changes = _Changes()
+
+    for index, operation in enumerate(operations):
+        if operation.floor_id not in positions:
+            raise PatchError(index, f"floor {operation.floor_id!r} not found")
+        if operation.op != "add" and operation.target != "shape" and not operation.id:
+            raise PatchError(index, f"{operation.op} needs an id")
+        if operation.target == "window" and not operation.wall_id:
+            raise PatchError(index, "window operations need a wall_id")
+
+        floor = patched.get(operation.floor_id)
+        if floor is None:
+            floor = patched[operation.floor_id] = home.floors[positions[operation.floor_id]].copy()
+
+        if operation.target == "shape":
+            _apply_shape(floor, operation, index, changes)
+        elif operation.target == "window":
+            _apply_window(floor, operation, index, changes)
+        else:
+            _apply_item(floor, operation, index, changes)
+
+    floors = [patched.get(floor.id, floor) for floor in home.floors]
+    events = []
+    for (event_type, floor_id), entry in changes.events.items():
+        if event_type == "floor_shape_changed":
+            payload = {"floor_id": floor_id, "shape": [point.dict() for point in patched[floor_id].shape]}
+        else:
+            field = event_type[:-len("_changed")]
+            payload = {
+                "floor_id": floor_id,
+                field: [item.dict() for item in entry["upserted"].values()],
+                "removed": entry["removed"],
+            }
+        events.append((event_type, payload))
+    return floors, events
@@ -0,0 +1,129 @@
+import asyncio
+import gzip
+import hashlib
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli variants are simply not offered
+    brotli = None
+
+# Serialized response bodies for home reads, cached per version. An entry is
+# stamped with the (object, version) pairs it was built from - the home object
+# itself, so a reloaded or replaced home never matches, and its event version,
+# so every published change invalidates it. Each entry carries a strong ETag
+# per representation and gzip/brotli variants compressed once, off the event
+# loop; concurrent misses for the same key share one build.
+COMPRESS_MIN_BYTES = 1024
+
+_entries: dict[str, dict] = {}
+_inflight: dict[str, tuple[list[tuple], asyncio.Future]] = {}
+_stats = {
+    "hits": 0,
+    "misses": 0,
+    "builds": 0,
+    "shared_builds": 0,
+    "not_modified": 0,
+}
+
+
+def _stamp_matches(cached: list[tuple], stamp: list[tuple]) -> bool:
+    return len(cached) == len(stamp) and all(
+        obj is cached_obj and version == cached_version
+        for (obj, version), (cached_obj, cached_version) in zip(stamp, cached)
+    )
+
+
+def _compress(body: bytes) -> dict:
+    variants = {}
+    if len(body) >= COMPRESS_MIN_BYTES:
+        variants["gzip"] = gzip.compress(body, compresslevel=6)
+        if brotli is not None:
+            variants["br"] = brotli.compress(body, quality=5)
+    return variants
+
+
+async def _build(key: str, stamp: list[tuple], body: bytes) -> dict:
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    variants = await asyncio.to_thread(_compress, body)
+    etags = {"identity": f'"{digest}"'}
+    etags.update({encoding: f'"{digest}-{encoding}"' for encoding in variants})
+    entry = {"stamp": stamp, "body": body, "variants": variants, "etags": etags, "digest": digest}
+    _entries[key] = entry
+    _stats["builds"] += 1
+    return entry
+
+
+async def get_entry(key: str, stamp: list[tuple], serialize) -> dict:
+    """Cached entry for key, rebuilt from serialize() when the stamp changed"""
+    entry = _entries.get(key)
+    if entry is not None and _stamp_matches(entry["stamp"], stamp):
+        _stats["hits"] += 1
+        return entry
+    _stats["misses"] += 1
+
+    pending = _inflight.get(key)
+    if pending is not None and _stamp_matches(pending[0], stamp):
+        _stats["shared_builds"] += 1
+        return await asyncio.shield(pending[1])
+
+    # Serialize on the event loop so the body matches the stamp exactly;
+    # only compression runs in a worker thread
+    body = serialize()
+    future = asyncio.ensure_future(_build(key, stamp, body))
+    _inflight[key] = (stamp, future)
+    try:
+        return await asyncio.shield(future)
+    finally:
+        if _inflight.get(key, (None, None))[1] is future:
+            del _inflight[key]
+
+
+def _choose_encoding(request: Request, entry: dict) -> str:
+    accepted = {
+        token.split(";")[0].strip().lower()
+        for token in request.headers.get("accept-encoding", "").split(",")
+    }
+    for encoding in ("br", "gzip"):
+        if encoding in accepted and encoding in entry["variants"]:
+            return encoding
+    return "identity"
+
+
+async def respond(request: Request, key: str, stamp: list[tuple], serialize, cache_control: str = "no-cache") -> Response:
+    """JSON response for a cached body, honouring If-None-Match and Accept-Encoding"""
+    entry = await get_entry(key, stamp, serialize)
+    return respond_entry(request, entry, cache_control)
+
+
+def respond_entry(request: Request, entry: dict, cache_control: str = "no-cache") -> Response:
+    encoding = _choose_encoding(request, entry)
+    headers = {
+        "ETag": entry["etags"][encoding],
+        "Cache-Control": cache_control,
+        "Vary": "Accept-Encoding",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = {tag.strip() for tag in if_none_match.split(",")}
+        if "*" in candidates or candidates & set(entry["etags"].values()):
+            _stats["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+
+    if encoding == "identity":
+        return Response(content=entry["body"], media_type="application/json", headers=headers)
+    headers["Content-Encoding"] = encoding
+    return Response(content=entry["variants"][encoding], media_type="application/json", headers=headers)
+
+
+def discard(keep: set[str]):
+    """Drop entries whose key is not in keep (e.g. homes that left the cache)"""
+    for key in list(_entries):
+        if key not in keep:
+            del _entries[key]
+
+
+def get_stats():
+    return {**_stats, "entries": len(_entries), "brotli": brotli is not None}
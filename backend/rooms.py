@@ -0,0 +1,351 @@
+import hashlib
+import os
+import numpy as np
+from meshes import triangulate
+from models import Floor
+
+# Rooms derived from the wall plan, and a spatial index of lights and cubes.
+#
+# Walls are free-floating segments, so rooms are found geometrically: wall
+# center lines (in x/z) are snapped together where their ends are within
+# ROOM_SNAP_DISTANCE, split wherever they cross or another wall ends on them,
+# and the resulting planar graph - with dead ends pruned - is walked face by
+# face. Every bounded face of at least MIN_ROOM_AREA is a room. A room's id is
+# a hash of its outline, so it survives edits elsewhere on the floor; its name
+# comes from a RoomLabel of the floor placed inside it.
+#
+# Lights and cubes are bucketed in a uniform grid of SPATIAL_CELL_SIZE cells
+# for polygon and radius queries, and each is assigned to the smallest room
+# containing it.
+#
+# Everything is cached per floor and keyed on the objects it was built from:
+# edits replace the wall, light, cube and label lists instead of mutating
+# them. Changing walls without changing the plan (windows, heights) reuses
+# the rooms as they are, and after a plan change only the connected groups of
+# walls whose segments changed are walked again.
+ROOM_SNAP_DISTANCE = float(os.getenv('ROOM_SNAP_DISTANCE', '0.1'))
+SPATIAL_CELL_SIZE = float(os.getenv('SPATIAL_CELL_SIZE', '1.0'))
+MIN_ROOM_AREA = 0.25
+
+_layouts: dict[str, "FloorLayout"] = {}
+_stats = {"plan_builds": 0, "plan_reuses": 0, "components_traced": 0, "components_reused": 0, "index_builds": 0}
+
+
+class _UnionFind:
+    def __init__(self, count: int):
+        self.parent = list(range(count))
+
+    def find(self, item: int) -> int:
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, a: int, b: int):
+        self.parent[self.find(a)] = self.find(b)
+
+
+def _snap(points: np.ndarray, tolerance: float) -> tuple[np.ndarray, np.ndarray]:
+    """Merge points closer than tolerance; returns (cluster of each point, cluster centers)"""
+    clusters = _UnionFind(len(points))
+    cells: dict[tuple[int, int], list[int]] = {}
+    keys = np.floor(points / tolerance).astype(np.int64)
+    for index, (cx, cz) in enumerate(keys.tolist()):
+        for ox in (-1, 0, 1):
+            for oz in (-1, 0, 1):
+                for other in cells.get((cx + ox, cz + oz), ()):
+                    if np.hypot(*(points[index] - points[other])) <= tolerance:
+                        clusters.union(index, other)
+        cells.setdefault((cx, cz), []).append(index)
+    roots = np.array([clusters.find(index) for index in range(len(points))], dtype=np.int64)
+    _, labels = np.unique(roots, return_inverse=True)
+    centers = np.zeros((labels.max() + 1 if len(labels) else 0, 2))
+    np.add.at(centers, labels, points)
+    centers /= np.bincount(labels)[:, None]
+    return labels, centers
+
+
+def _crossings(segments: np.ndarray) -> np.ndarray:
+    """Points where two segments cross, (K, 2)"""
+    p, d = segments[:, :2], segments[:, 2:] - segments[:, :2]
+    i, j = np.triu_indices(len(segments), k=1)
+    denominator = d[i, 0] * d[j, 1] - d[i, 1] * d[j, 0]
+    parallel = np.abs(denominator) < 1e-12
+    denominator = np.where(parallel, 1.0, denominator)
+    offset = p[j] - p[i]
+    t = (offset[:, 0] * d[j, 1] - offset[:, 1] * d[j, 0]) / denominator
+    s = (offset[:, 0] * d[i, 1] - offset[:, 1] * d[i, 0]) / denominator
+    hit = ~parallel & (t >= 0) & (t <= 1) & (s >= 0) & (s <= 1)
+    return p[i[hit]] + t[hit, None] * d[i[hit]]
+
+
+def _plan_edges(segments: np.ndarray, tolerance: float) -> tuple[np.ndarray, np.ndarray]:
+    """(vertices (V, 2), undirected edges (E, 2)) of the snapped and split wall plan"""
+    candidates = np.concatenate([segments[:, :2], segments[:, 2:], _crossings(segments)])
+    _, vertices = _snap(candidates, tolerance)
+
+    # Every vertex within tolerance of a segment splits it
+    p, d = segments[:, :2], segments[:, 2:] - segments[:, :2]
+    length = np.hypot(d[:, 0], d[:, 1])
+    offset = vertices[None, :, :] - p[:, None, :]
+    along = (offset[..., 0] * d[:, None, 0] + offset[..., 1] * d[:, None, 1]) / length[:, None]
+    across = np.abs(offset[..., 0] * d[:, None, 1] - offset[..., 1] * d[:, None, 0]) / length[:, None]
+    on_segment = (across <= tolerance) & (along >= -tolerance) & (along <= length[:, None] + tolerance)
+
+    edges = set()
+    for segment in range(len(segments)):
+        members = np.flatnonzero(on_segment[segment])
+        ordered = members[np.argsort(along[segment, members])]
+        for a, b in zip(ordered[:-1].tolist(), ordered[1:].tolist()):
+            if a != b:
+                edges.add((min(a, b), max(a, b)))
+    return vertices, np.array(sorted(edges), dtype=np.int64).reshape(-1, 2)
+
+
+def _signed_area(polygon: np.ndarray) -> float:
+    x, z = polygon[:, 0], polygon[:, 1]
+    return float(np.sum(x * np.roll(z, -1) - np.roll(x, -1) * z) / 2)
+
+
+def _trace_faces(vertices: np.ndarray, edges: list[tuple[int, int]]) -> list[np.ndarray]:
+    """Outlines of the bounded faces of a connected planar graph, counter-clockwise in (x, z)"""
+    neighbors: dict[int, list[int]] = {}
+    for a, b in edges:
+        neighbors.setdefault(a, []).append(b)
+        neighbors.setdefault(b, []).append(a)
+
+    # Dead ends bound no room
+    leaves = [vertex for vertex, adjacent in neighbors.items() if len(adjacent) == 1]
+    while leaves:
+        vertex = leaves.pop()
+        for other in neighbors.pop(vertex, []):
+            neighbors[other].remove(vertex)
+            if len(neighbors[other]) == 1:
+                leaves.append(other)
+            elif not neighbors[other]:
+                del neighbors[other]
+
+    # Neighbors in counter-clockwise order; walking each half-edge and turning
+    # to the neighbor just before the one we came from keeps the face on the left
+    for vertex, adjacent in neighbors.items():
+        delta = vertices[adjacent] - vertices[vertex]
+        neighbors[vertex] = [adjacent[k] for k in np.argsort(np.arctan2(delta[:, 1], delta[:, 0]))]
+
+    faces = []
+    visited = set()
+    for start, adjacent in neighbors.items():
+        for first in adjacent:
+            if (start, first) in visited:
+                continue
+            outline = []
+            a, b = start, first
+            while (a, b) not in visited:
+                visited.add((a, b))
+                outline.append(a)
+                around = neighbors[b]
+                a, b = b, around[around.index(a) - 1]
+            polygon = vertices[outline]
+            if len(outline) >= 3 and _signed_area(polygon) >= MIN_ROOM_AREA:
+                faces.append(polygon)
+    return faces
+
+
+def points_in_polygon(points: np.ndarray, polygon: np.ndarray) -> np.ndarray:
+    """Boolean mask of the (x, z) points inside a polygon (even-odd rule)"""
+    if not len(points):
+        return np.zeros(0, dtype=bool)
+    x, z = points[:, 0, None], points[:, 1, None]
+    x1, z1 = polygon[:, 0], polygon[:, 1]
+    x2, z2 = np.roll(x1, -1), np.roll(z1, -1)
+    straddles = (z1 > z) != (z2 > z)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        crossing_x = x1 + (z - z1) * (x2 - x1) / (z2 - z1)
+    return (straddles & (x < crossing_x)).sum(axis=1) % 2 == 1
+
+
+def _interior_point(polygon: np.ndarray) -> np.ndarray:
+    """A point inside the polygon: its centroid when that is inside, else the middle of its largest triangle"""
+    centroid = polygon.mean(axis=0)
+    if points_in_polygon(centroid[None], polygon)[0]:
+        return centroid
+    triangles = polygon[triangulate(polygon)]
+    areas = np.abs(np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]))
+    return triangles[np.argmax(areas)].mean(axis=0)
+
+
+def _room_id(polygon: np.ndarray) -> str:
+    rounded = np.round(polygon, 2) + 0.0
+    start = np.lexsort((rounded[:, 1], rounded[:, 0]))[0]
+    canonical = np.roll(rounded, -start, axis=0)
+    return "room-" + hashlib.sha1(canonical.tobytes()).hexdigest()[:12]
+
+
+class SpatialGrid:
+    """Uniform grid over (x, z) points for polygon and radius queries"""
+
+    def __init__(self, points: np.ndarray, cell_size: float):
+        self.points = points
+        self.cell_size = cell_size
+        self.cells: dict[tuple[int, int], np.ndarray] = {}
+        if len(points):
+            keys = np.floor(points / cell_size).astype(np.int64)
+            order = np.lexsort((keys[:, 1], keys[:, 0]))
+            unique, starts = np.unique(keys[order], axis=0, return_index=True)
+            for key, rows in zip(unique.tolist(), np.split(order, starts[1:])):
+                self.cells[tuple(key)] = rows
+
+    def candidates(self, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+        """Points in the cells overlapping a bounding box"""
+        (x0, z0), (x1, z1) = np.floor(low / self.cell_size).astype(np.int64), np.floor(high / self.cell_size).astype(np.int64)
+        if (x1 - x0 + 1) * (z1 - z0 + 1) > len(self.cells):
+            found = [rows for (cx, cz), rows in self.cells.items() if x0 <= cx <= x1 and z0 <= cz <= z1]
+        else:
+            found = [self.cells[(cx, cz)] for cx in range(x0, x1 + 1) for cz in range(z0, z1 + 1) if (cx, cz) in self.cells]
+        return np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+
+    def in_polygon(self, polygon: np.ndarray) -> np.ndarray:
+        rows = self.candidates(polygon.min(axis=0), polygon.max(axis=0))
+        return np.sort(rows[points_in_polygon(self.points[rows], polygon)])
+
+    def in_radius(self, center: np.ndarray, radius: float) -> np.ndarray:
+        rows = self.candidates(center - radius, center + radius)
+        distance = np.hypot(*(self.points[rows] - center).T) if len(rows) else np.zeros(0)
+        return np.sort(rows[distance <= radius])
+
+
+class FloorLayout:
+    """Rooms and spatial index of one floor, updated from the floor's current objects"""
+
+    def __init__(self, floor_id: str):
+        self.floor_id = floor_id
+        self.walls = None
+        self.plan_key = None
+        self.components: dict[tuple, list[np.ndarray]] = {}
+        self.polygons: list[np.ndarray] = []
+        self.items_key = None
+        self.rooms: list[dict] = []
+        self.light_ids: list[str] = []
+        self.cube_ids: list[str] = []
+        self.light_grid = self.cube_grid = None
+
+    def _update_plan(self, floor: Floor) -> bool:
+        if floor.walls is self.walls:
+            return False
+        self.walls = floor.walls
+        segments = np.array(
+            [(w.p1.x, w.p1.z, w.p2.x, w.p2.z) for w in floor.walls if (w.p1.x, w.p1.z) != (w.p2.x, w.p2.z)],
+            dtype=np.float64,
+        ).reshape(-1, 4)
+        plan_key = (ROOM_SNAP_DISTANCE, np.round(segments, 4).tobytes())
+        if plan_key == self.plan_key:
+            _stats["plan_reuses"] += 1
+            return False
+        self.plan_key = plan_key
+        _stats["plan_builds"] += 1
+
+        polygons = []
+        components = {}
+        if len(segments):
+            vertices, edges = _plan_edges(segments, ROOM_SNAP_DISTANCE)
+            groups = _UnionFind(len(vertices))
+            for a, b in edges.tolist():
+                groups.union(a, b)
+            by_group: dict[int, list[tuple[int, int]]] = {}
+            for a, b in edges.tolist():
+                by_group.setdefault(groups.find(a), []).append((a, b))
+            for group_edges in by_group.values():
+                key = tuple(sorted(
+                    tuple(sorted((tuple(np.round(vertices[a], 3).tolist()), tuple(np.round(vertices[b], 3).tolist()))))
+                    for a, b in group_edges
+                ))
+                faces = self.components.get(key)
+                if faces is None:
+                    faces = _trace_faces(vertices, group_edges)
+                    _stats["components_traced"] += 1
+                else:
+                    _stats["components_reused"] += 1
+                components[key] = faces
+                polygons.extend(faces)
+        self.components = components
+        # Smallest first, so points land in the innermost room containing them
+        self.polygons = sorted(polygons, key=_signed_area)
+        return True
+
+    def update(self, floor: Floor):
+        plan_changed = self._update_plan(floor)
+        items_key = (floor.lights, floor.cubes, floor.room_labels)
+        if not plan_changed and self.items_key is not None and all(a is b for a, b in zip(items_key, self.items_key)):
+            return
+        self.items_key = items_key
+        _stats["index_builds"] += 1
+
+        self.light_ids = [light.id for light in floor.lights]
+        self.cube_ids = [cube.id for cube in floor.cubes]
+        light_points = np.array([(light.position.x, light.position.z) for light in floor.lights], dtype=np.float64).reshape(-1, 2)
+        cube_points = np.array([(cube.position.x, cube.position.z) for cube in floor.cubes], dtype=np.float64).reshape(-1, 2)
+        label_points = np.array([(label.position.x, label.position.z) for label in floor.room_labels], dtype=np.float64).reshape(-1, 2)
+        self.light_grid = SpatialGrid(light_points, SPATIAL_CELL_SIZE)
+        self.cube_grid = SpatialGrid(cube_points, SPATIAL_CELL_SIZE)
+
+        light_free = np.ones(len(light_points), dtype=bool)
+        cube_free = np.ones(len(cube_points), dtype=bool)
+        label_free = np.ones(len(label_points), dtype=bool)
+        self.rooms = []
+        for polygon in self.polygons:
+            lights = self.light_grid.in_polygon(polygon)
+            lights = lights[light_free[lights]]
+            light_free[lights] = False
+            cubes = self.cube_grid.in_polygon(polygon)
+            cubes = cubes[cube_free[cubes]]
+            cube_free[cubes] = False
+            labels = np.flatnonzero(points_in_polygon(label_points, polygon) & label_free)
+            label_free[labels] = False
+            self.rooms.append({
+                "id": _room_id(polygon),
+                "floor_id": self.floor_id,
+                "name": floor.room_labels[labels[0]].name if len(labels) else None,
+                "area": round(_signed_area(polygon), 3),
+                "polygon": polygon.round(4).tolist(),
+                "center": _interior_point(polygon).round(4).tolist(),
+                "lights": [self.light_ids[row] for row in lights.tolist()],
+                "cubes": [self.cube_ids[row] for row in cubes.tolist()],
+                "labels": [floor.room_labels[row].id for row in labels.tolist()],
+            })
+
+    def query(self, polygon=None, center=None, radius: float | None = None) -> dict:
+        """Ids of the lights and cubes inside a polygon ([[x, z], ...]) or within a radius of a center [x, z]"""
+        if polygon is not None:
+            polygon = np.asarray(polygon, dtype=np.float64)
+            lights, cubes = self.light_grid.in_polygon(polygon), self.cube_grid.in_polygon(polygon)
+        else:
+            center = np.asarray(center, dtype=np.float64)
+            lights, cubes = self.light_grid.in_radius(center, radius), self.cube_grid.in_radius(center, radius)
+        return {
+            "lights": [self.light_ids[row] for row in lights.tolist()],
+            "cubes": [self.cube_ids[row] for row in cubes.tolist()],
+        }
+
+
+def layout_for(floor: Floor) -> FloorLayout:
+    layout = _layouts.get(floor.id)
+    if layout is None:
+        layout = _layouts[floor.id] = FloorLayout(floor.id)
+    layout.update(floor)
+    return layout
+
+
+def find_rooms(floors: list[Floor], room_ref: str) -> list[tuple[Floor, dict]]:
+    """Rooms with this id, or else with this name, on any of the floors"""
+    rooms = [(floor, room) for floor in floors for room in layout_for(floor).rooms]
+    by_id = [(floor, room) for floor, room in rooms if room["id"] == room_ref]
+    return by_id or [(floor, room) for floor, room in rooms if room["name"] == room_ref]
+
+
+def retain(floor_ids: set[str]):
+    """Forget the layouts of floors that are no longer resident"""
+    for floor_id in set(_layouts) - floor_ids:
+        del _layouts[floor_id]
+
+
+def get_stats():
+    return {**_stats, "floors": len(_layouts)}
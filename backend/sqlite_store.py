@@ -0,0 +1,375 @@
+from contextlib import contextmanager
+from models import Home, Floor, Wall, Window, Light, LightState, Cube, Vector3
+import codec
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Normalized SQLite storage for saves. Every save is a row in `saves`, and its
+# floors, walls, windows, lights and cubes are rows keyed by (save_name, id).
+# Fields a table does not model explicitly round-trip through its `extra` column.
+# The content hash and size are those of the save exported as JSON; row-level
+# updates clear them and the next catalog read computes them again.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS saves (
+    name TEXT PRIMARY KEY,
+    home_id TEXT NOT NULL,
+    home_name TEXT NOT NULL,
+    background_color TEXT NOT NULL,
+    extra TEXT NOT NULL DEFAULT '{}',
+    updated_at REAL NOT NULL,
+    content_hash TEXT,
+    size INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_saves_home_id ON saves(home_id);
+
+CREATE TABLE IF NOT EXISTS floors (
+    save_name TEXT NOT NULL REFERENCES saves(name) ON DELETE CASCADE,
+    id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    floor_plan_image TEXT,
+    shape TEXT NOT NULL DEFAULT '[]',
+    extra TEXT NOT NULL DEFAULT '{}',
+    PRIMARY KEY (save_name, id)
+);
+
+CREATE TABLE IF NOT EXISTS walls (
+    save_name TEXT NOT NULL REFERENCES saves(name) ON DELETE CASCADE,
+    floor_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    p1x REAL, p1y REAL, p1z REAL,
+    p2x REAL, p2y REAL, p2z REAL,
+    height REAL NOT NULL,
+    thickness REAL NOT NULL,
+    PRIMARY KEY (save_name, id)
+);
+CREATE INDEX IF NOT EXISTS idx_walls_floor ON walls(save_name, floor_id);
+
+CREATE TABLE IF NOT EXISTS windows (
+    save_name TEXT NOT NULL REFERENCES saves(name) ON DELETE CASCADE,
+    wall_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    p1x REAL, p1y REAL, p1z REAL,
+    p2x REAL, p2y REAL, p2z REAL,
+    height REAL NOT NULL,
+    bottom_height REAL NOT NULL,
+    PRIMARY KEY (save_name, id)
+);
+CREATE INDEX IF NOT EXISTS idx_windows_wall ON windows(save_name, wall_id);
+
+CREATE TABLE IF NOT EXISTS lights (
+    save_name TEXT NOT NULL REFERENCES saves(name) ON DELETE CASCADE,
+    floor_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    px REAL, py REAL, pz REAL,
+    is_on INTEGER NOT NULL,
+    color TEXT NOT NULL,
+    intensity REAL NOT NULL,
+    PRIMARY KEY (save_name, id)
+);
+CREATE INDEX IF NOT EXISTS idx_lights_id ON lights(id);
+CREATE INDEX IF NOT EXISTS idx_lights_name ON lights(save_name, name);
+CREATE INDEX IF NOT EXISTS idx_lights_floor ON lights(save_name, floor_id);
+
+CREATE TABLE IF NOT EXISTS cubes (
+    save_name TEXT NOT NULL REFERENCES saves(name) ON DELETE CASCADE,
+    floor_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    px REAL, py REAL, pz REAL,
+    rotation REAL NOT NULL,
+    sx REAL, sy REAL, sz REAL,
+    color TEXT NOT NULL,
+    PRIMARY KEY (save_name, id)
+);
+CREATE INDEX IF NOT EXISTS idx_cubes_floor ON cubes(save_name, floor_id);
+"""
+
+# Columns added to the saves table after its first release
+MIGRATIONS = {"content_hash": "TEXT", "size": "INTEGER"}
+
+HOME_COLUMNS = {"id", "name", "floors", "background_color"}
+FLOOR_COLUMNS = {"id", "level", "name", "walls", "lights", "cubes", "floor_plan_image", "shape"}
+
+_conn: sqlite3.Connection | None = None
+_lock = threading.RLock()
+
+
+def connect(path: str):
+    """Open (or create) the SQLite database in WAL mode"""
+    global _conn
+    with _lock:
+        if _conn is not None:
+            return _conn
+        _conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute("PRAGMA foreign_keys=ON")
+        _conn.executescript(SCHEMA)
+        columns = {row[1] for row in _conn.execute("PRAGMA table_info(saves)")}
+        for column, column_type in MIGRATIONS.items():
+            if column not in columns:
+                _conn.execute(f"ALTER TABLE saves ADD COLUMN {column} {column_type}")
+        logger.info(f"Opened SQLite storage: {path}")
+        return _conn
+
+
+def close():
+    global _conn
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
+
+
+@contextmanager
+def _transaction():
+    with _lock:
+        _conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield _conn
+        except Exception:
+            _conn.execute("ROLLBACK")
+            raise
+        _conn.execute("COMMIT")
+
+
+def _extra(data: dict, known: set) -> str:
+    return json.dumps({k: v for k, v in data.items() if k not in known})
+
+
+class DuplicateIdError(ValueError):
+    """A save uses an id twice, which its rows (keyed by save and id) cannot hold"""
+
+
+def _check_unique_ids(data: dict):
+    floors = data["floors"]
+    walls = [wall for floor in floors for wall in floor["walls"]]
+    kinds = {
+        "floor": floors,
+        "wall": walls,
+        "window": [window for wall in walls for window in wall["windows"]],
+        "light": [light for floor in floors for light in floor["lights"]],
+        "cube": [cube for floor in floors for cube in floor["cubes"]],
+    }
+    for kind, items in kinds.items():
+        seen = set()
+        for item in items:
+            if item["id"] in seen:
+                raise DuplicateIdError(f"Duplicate {kind} id {item['id']}; ids must be unique within a save")
+            seen.add(item["id"])
+
+
+def _digest(data: dict) -> tuple[str, int]:
+    """Content hash and size of a save exported as JSON"""
+    payload = codec.dumps(data, indent=True)
+    return hashlib.sha256(payload).hexdigest(), len(payload)
+
+
+def save_home(home: Home, name: str):
+    """Replace a save with the rows of this home in one transaction"""
+    data = home.dict()
+    _check_unique_ids(data)
+    digest, size = _digest(data)
+    with _transaction() as conn:
+        conn.execute("DELETE FROM saves WHERE name = ?", (name,))
+        conn.execute(
+            "INSERT INTO saves (name, home_id, home_name, background_color, extra, updated_at, content_hash, size)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (name, home.id, home.name, home.background_color, _extra(data, HOME_COLUMNS), time.time(), digest, size),
+        )
+        for floor_seq, floor in enumerate(data["floors"]):
+            conn.execute(
+                "INSERT INTO floors (save_name, id, seq, level, name, floor_plan_image, shape, extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (name, floor["id"], floor_seq, floor["level"], floor["name"], floor["floor_plan_image"],
+                 json.dumps(floor["shape"]), _extra(floor, FLOOR_COLUMNS)),
+            )
+            for seq, wall in enumerate(floor["walls"]):
+                conn.execute(
+                    "INSERT INTO walls VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (name, floor["id"], wall["id"], seq,
+                     wall["p1"]["x"], wall["p1"]["y"], wall["p1"]["z"],
+                     wall["p2"]["x"], wall["p2"]["y"], wall["p2"]["z"],
+                     wall["height"], wall["thickness"]),
+                )
+                for window_seq, window in enumerate(wall["windows"]):
+                    conn.execute(
+                        "INSERT INTO windows VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (name, wall["id"], window["id"], window_seq,
+                         window["p1"]["x"], window["p1"]["y"], window["p1"]["z"],
+                         window["p2"]["x"], window["p2"]["y"], window["p2"]["z"],
+                         window["height"], window["bottom_height"]),
+                    )
+            conn.executemany(
+                "INSERT INTO lights VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(name, floor["id"], light["id"], seq, light["name"],
+                  light["position"]["x"], light["position"]["y"], light["position"]["z"],
+                  int(light["state"]["on"]), light["state"]["color"], light["state"]["intensity"])
+                 for seq, light in enumerate(floor["lights"])],
+            )
+            conn.executemany(
+                "INSERT INTO cubes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(name, floor["id"], cube["id"], seq, cube["name"],
+                  cube["position"]["x"], cube["position"]["y"], cube["position"]["z"], cube["rotation"],
+                  cube["size"]["x"], cube["size"]["y"], cube["size"]["z"], cube["color"])
+                 for seq, cube in enumerate(floor["cubes"])],
+            )
+
+
+def _vec(x, y, z) -> Vector3:
+    return Vector3(x=x, y=y, z=z)
+
+
+def load_home(name: str):
+    """Rebuild a Home from its rows, or None if the save does not exist"""
+    with _lock:
+        row = _conn.execute(
+            "SELECT home_id, home_name, background_color, extra FROM saves WHERE name = ?", (name,)
+        ).fetchone()
+        if row is None:
+            return None
+        home_id, home_name, background_color, extra = row
+
+        windows_by_wall: dict[str, list] = {}
+        for r in _conn.execute(
+            "SELECT wall_id, id, p1x, p1y, p1z, p2x, p2y, p2z, height, bottom_height FROM windows WHERE save_name = ? ORDER BY seq",
+            (name,),
+        ):
+            windows_by_wall.setdefault(r[0], []).append(
+                Window(id=r[1], p1=_vec(*r[2:5]), p2=_vec(*r[5:8]), height=r[8], bottom_height=r[9])
+            )
+
+        walls_by_floor: dict[str, list] = {}
+        for r in _conn.execute(
+            "SELECT floor_id, id, p1x, p1y, p1z, p2x, p2y, p2z, height, thickness FROM walls WHERE save_name = ? ORDER BY seq",
+            (name,),
+        ):
+            walls_by_floor.setdefault(r[0], []).append(
+                Wall(id=r[1], p1=_vec(*r[2:5]), p2=_vec(*r[5:8]), height=r[8], thickness=r[9],
+                     windows=windows_by_wall.get(r[1], []))
+            )
+
+        lights_by_floor: dict[str, list] = {}
+        for r in _conn.execute(
+            "SELECT floor_id, id, name, px, py, pz, is_on, color, intensity FROM lights WHERE save_name = ? ORDER BY seq",
+            (name,),
+        ):
+            lights_by_floor.setdefault(r[0], []).append(
+                Light(id=r[1], name=r[2], position=_vec(*r[3:6]),
+                      state=LightState(on=bool(r[6]), color=r[7], intensity=r[8]))
+            )
+
+        cubes_by_floor: dict[str, list] = {}
+        for r in _conn.execute(
+            "SELECT floor_id, id, name, px, py, pz, rotation, sx, sy, sz, color FROM cubes WHERE save_name = ? ORDER BY seq",
+            (name,),
+        ):
+            cubes_by_floor.setdefault(r[0], []).append(
+                Cube(id=r[1], name=r[2], position=_vec(*r[3:6]), rotation=r[6], size=_vec(*r[7:10]), color=r[10])
+            )
+
+        floors = []
+        for floor_id, level, floor_name, image, shape, floor_extra in _conn.execute(
+            "SELECT id, level, name, floor_plan_image, shape, extra FROM floors WHERE save_name = ? ORDER BY seq",
+            (name,),
+        ):
+            floors.append(Floor(
+                id=floor_id, level=level, name=floor_name, floor_plan_image=image,
+                shape=json.loads(shape),
+                walls=walls_by_floor.get(floor_id, []),
+                lights=lights_by_floor.get(floor_id, []),
+                cubes=cubes_by_floor.get(floor_id, []),
+                **json.loads(floor_extra),
+            ))
+
+    return Home(id=home_id, name=home_name, background_color=background_color, floors=floors, **json.loads(extra))
+
+
+def find_save_by_home_id(home_id: str):
+    """Most recently written save holding this home id"""
+    with _lock:
+        row = _conn.execute(
+            "SELECT name FROM saves WHERE home_id = ? ORDER BY updated_at DESC LIMIT 1", (home_id,)
+        ).fetchone()
+    return row[0] if row else None
+
+
+def list_saves():
+    with _lock:
+        return [row[0] for row in _conn.execute("SELECT name FROM saves ORDER BY name")]
+
+
+def save_exists(name: str) -> bool:
+    with _lock:
+        return _conn.execute("SELECT 1 FROM saves WHERE name = ?", (name,)).fetchone() is not None
+
+
+def update_light_states(name: str, lights: list[Light]) -> int:
+    """Write just the state columns of the given lights; returns the rows touched"""
+    with _transaction() as conn:
+        touched = 0
+        for light in lights:
+            cur = conn.execute(
+                "UPDATE lights SET is_on = ?, color = ?, intensity = ? WHERE save_name = ? AND id = ?",
+                (int(light.state.on), light.state.color, light.state.intensity, name, light.id),
+            )
+            touched += cur.rowcount
+        conn.execute(
+            "UPDATE saves SET updated_at = ?, content_hash = NULL, size = NULL WHERE name = ?", (time.time(), name)
+        )
+    return touched
+
+
+def update_background(name: str, color: str) -> int:
+    with _transaction() as conn:
+        cur = conn.execute(
+            "UPDATE saves SET background_color = ?, updated_at = ?, content_hash = NULL, size = NULL WHERE name = ?",
+            (color, time.time(), name),
+        )
+    return cur.rowcount
+
+
+def _refresh_digest(name: str):
+    """Hash a save whose rows were updated since it was last hashed"""
+    with _lock:
+        home = load_home(name)
+        if home is None:
+            return None, None
+        digest, size = _digest(home.dict())
+        _conn.execute("UPDATE saves SET content_hash = ?, size = ? WHERE name = ?", (digest, size, name))
+    return digest, size
+
+
+def catalog_entries() -> list[dict]:
+    """Catalog metadata for every save, computed with indexed aggregate queries"""
+    with _lock:
+        rows = _conn.execute("""
+            SELECT s.name, s.home_id, s.home_name, s.updated_at, s.content_hash, s.size,
+                   (SELECT COUNT(*) FROM floors WHERE save_name = s.name),
+                   (SELECT COUNT(*) FROM walls WHERE save_name = s.name),
+                   (SELECT COUNT(*) FROM lights WHERE save_name = s.name),
+                   (SELECT COUNT(*) FROM cubes WHERE save_name = s.name)
+            FROM saves s
+        """).fetchall()
+    entries = []
+    for name, home_id, home_name, updated_at, digest, size, floors, walls, lights, cubes in rows:
+        if digest is None:
+            digest, size = _refresh_digest(name)
+        entries.append({
+            "filename": name, "format": "sqlite", "size": size, "mtime": updated_at, "hash": digest,
+            "home_id": home_id, "home_name": home_name,
+            "floors": floors, "walls": walls, "lights": lights, "cubes": cubes,
+        })
+    return entries
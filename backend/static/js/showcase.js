@@ -32,6 +32,7 @@ class ShowcaseApp {
         this.reconnectDelayMs = 1000;
         this.maxReconnectDelayMs = 30000;
         this.lastAppliedVersion = 0;
+        this.geometryHash = null;
         this.fallbackPollIntervalMs = 60000;
         this.fallbackPollTimer = null;
 
@@ -96,10 +97,14 @@ class ShowcaseApp {
     async init() {
         console.log("Init Showcase...");
         try {
-            const homes = await fetch('/api/homes').then(r => r.json());
-            if (homes.length > 0) {
-                const home = await fetch(`/api/homes/${homes[0].id}`).then(r => r.json());
+            // Small live-state document first; its geometry hash names a cacheable geometry document
+            const stateResponse = await fetch('/api/homes/active/state');
+            if (stateResponse.ok) {
+                const state = await stateResponse.json();
+                const home = await this.fetchHome(state);
                 this.home = home;
+                this.geometryHash = state.geometry_hash;
+                this.lastAppliedVersion = Math.max(this.lastAppliedVersion, state.version || 0);
                 this.homeRenderer.render(home);
 
                 // Track applied background color
@@ -149,6 +154,33 @@ class ShowcaseApp {
         this.animate();
     }
 
+    async fetchHome(state) {
+        // Geometry by content hash (immutable, served from the HTTP cache when unchanged) with the live state merged in
+        const home = await fetch(`/api/homes/${state.home_id}/geometry/${state.geometry_hash}`).then(r => {
+            if (!r.ok) throw new Error(`Geometry request failed: ${r.status}`);
+            return r.json();
+        });
+        home.background_color = state.background_color;
+        home.floors.forEach(floor => {
+            (floor.lights || []).forEach(light => {
+                light.state = state.lights[light.id] || { on: false, color: '#ffffff', intensity: 1.0 };
+            });
+        });
+        return home;
+    }
+
+    applyGeometry(home) {
+        this.home = home;
+        this.homeRenderer.render(home);
+        this.calculateHouseCenter(home);
+        this.adjustCameraForViewport();
+        if (this.currentMaxFloor > this.maxLevel) this.currentMaxFloor = 0;
+        this.homeRenderer.setVisibleFloorLimit(this.currentMaxFloor);
+        if (this.homeRenderer.setGizmoVisibility) {
+            this.homeRenderer.setGizmoVisibility(false);
+        }
+    }
+
     calculateHouseCenter(home) {
         let minX = Infinity, maxX = -Infinity, minZ = Infinity, maxZ = -Infinity;
         let maxLevel = 0;
@@ -318,17 +350,28 @@ class ShowcaseApp {
         if (!this.home || !this.home.id) return;
 
         try {
-            const updatedHome = await fetch(`/api/homes/${this.home.id}`).then(r => r.json());
-            if (!updatedHome || !updatedHome.id) return;
+            // The live-state document is tiny; geometry is only refetched (and redrawn) when its hash changed
+            const state = await fetch(`/api/homes/${this.home.id}/state`).then(r => r.json());
+            if (!state || !state.lights) return;
 
-            this.homeRenderer.updateLights(updatedHome);
+            if (state.geometry_hash !== this.geometryHash) {
+                this.applyGeometry(await this.fetchHome(state));
+            } else {
+                Object.entries(state.lights).forEach(([lightId, lightState]) => {
+                    this.homeRenderer.updateLightById(lightId, lightState);
+                    this.updateLocalLightState(lightId, lightState);
+                });
+            }
+            this.geometryHash = state.geometry_hash;
 
-            if (updatedHome.background_color && updatedHome.background_color !== this.currentBackgroundColor) {
-                this.sceneManager.setBackgroundColor(updatedHome.background_color);
-                this.currentBackgroundColor = updatedHome.background_color;
+            if (state.background_color && state.background_color !== this.currentBackgroundColor) {
+                this.sceneManager.setBackgroundColor(state.background_color);
+                this.currentBackgroundColor = state.background_color;
             }
 
-            this.home = updatedHome;
+            if (typeof state.version === 'number') {
+                this.lastAppliedVersion = Math.max(this.lastAppliedVersion, state.version);
+            }
         } catch (err) {
             console.warn('Full resync failed', err);
         }
@@ -835,14 +835,16 @@ export class UI {
                 .file-item:hover { background: rgba(255, 255, 255, 0.1); transform: translateX(2px); }
                 .file-item.selected { background: rgba(59, 130, 246, 0.2); border-color: rgba(59, 130, 246, 0.5); }
                 .file-name { flex-grow: 1; font-size: 0.95rem; }
+                .file-meta { font-size: 0.75rem; color: #9ca3af; margin-left: 12px; white-space: nowrap; }
             `;
             document.head.appendChild(style);
         }
 
-        // Fetch saves
+        // Fetch save catalog (newest first)
         let saves = [];
         try {
-            saves = await fetch('/api/saves').then(r => r.json());
+            const catalog = await fetch('/api/saves/catalog?sort=mtime&order=desc&limit=200').then(r => r.json());
+            saves = catalog.items;
         } catch (e) {
             console.error(e);
             this.showNotification("Failed to list saves");
@@ -917,10 +919,16 @@ export class UI {
             list.innerHTML = '<div style="text-align:center; padding: 20px; color: #6b7280;">No saved files found</div>';
         }
 
-        saves.forEach(filename => {
+        saves.forEach(entry => {
+            const filename = entry.filename;
             const item = document.createElement('div');
             item.className = 'file-item';
-            item.innerHTML = `<span class="file-icon">📄</span><span class="file-name">${filename}</span>`;
+            const meta = entry.home_name
+                ? `${entry.home_name} · ${entry.floors} floors · ${entry.lights} lights`
+                : '';
+            item.innerHTML = `<span class="file-icon">📄</span><span class="file-name"></span><span class="file-meta"></span>`;
+            item.querySelector('.file-name').textContent = filename;
+            item.querySelector('.file-meta').textContent = meta;
             item.onclick = () => {
                 this.editor.loadFromFile(filename);
                 document.body.removeChild(overlay);
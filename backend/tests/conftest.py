@@ -0,0 +1,42 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Modules that read their configuration from the environment at import time,
+# in dependency order
+CONFIGURED_MODULES = ("events", "catalog", "light_table", "db")
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    """App factory on an empty DATA_DIR; keyword arguments are environment settings.
+
+    The configured modules are reloaded in place, so every app gets fresh
+    in-memory state and sees the settings it was created with. Use the
+    returned TestClient as a context manager to run the app lifespan; a
+    second one on the same DATA_DIR is a restart.
+    """
+    monkeypatch.chdir(BACKEND_DIR)
+
+    def create(**env):
+        monkeypatch.setenv("DATA_DIR", str(tmp_path))
+        for name, value in env.items():
+            monkeypatch.setenv(name, str(value))
+        for name in CONFIGURED_MODULES:
+            importlib.reload(importlib.import_module(name))
+        from fastapi.testclient import TestClient
+        import main
+
+        return TestClient(main.app)
+
+    return create
+
+
+@pytest.fixture
+def saves_dir(tmp_path):
+    return tmp_path / "saves"
@@ -0,0 +1,85 @@
+import io
+import zipfile
+
+import pytest
+
+import binary_snapshot
+import codec
+
+
+@pytest.fixture
+def client(backend):
+    with backend() as client:
+        yield client
+
+
+def _zip(entries: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zip_file:
+        for name, contents in entries.items():
+            zip_file.writestr(name, contents)
+    return buffer.getvalue()
+
+
+def _import(client, entries: dict):
+    return client.post("/api/saves/import", files={"file": ("backup.zip", _zip(entries), "application/zip")})
+
+
+def _other_home(home: dict, home_id: str) -> dict:
+    # A deep copy, so the tests can change its floors
+    return {**codec.loads(codec.dumps(home)), "id": home_id, "name": f"Home {home_id}"}
+
+
+def test_export_contains_every_save(client, saves_dir):
+    home = client.get("/api/homes").json()[0]
+    client.post("/api/saves/second.json", json=_other_home(home, "second"))
+
+    response = client.get("/api/saves/export/all")
+    assert response.headers["Content-Type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(response.content)) as zip_file:
+        assert sorted(zip_file.namelist()) == ["default.json", "second.json"]
+        assert zip_file.read("second.json") == (saves_dir / "second.json").read_bytes()
+
+    transfer = client.get(f"/api/saves/transfers/{response.headers['X-Transfer-Id']}").json()
+    assert transfer["state"] == "done" and transfer["files_done"] == 2
+
+
+def test_import_installs_valid_entries_and_reports_the_rest(client):
+    home = client.get("/api/homes").json()[0]
+    light = home["floors"][0]["lights"][0]
+    duplicated = _other_home(home, "duplicated")
+    duplicated["floors"][0]["lights"] = [light, light]
+
+    response = _import(client, {
+        "backup/restored.json": codec.dumps(_other_home(home, "restored")),
+        "binary.mhome": binary_snapshot.encode_home(_other_home(home, "binary")),
+        "duplicated.json": codec.dumps(duplicated),
+        "broken.json": b"{not json",
+        "broken.mhome": b"MIMESYS1\x00\x00",
+        "notes.txt": b"ignored",
+    })
+    assert response.status_code == 200
+    result = response.json()
+    assert result["imported_files"] == ["restored.json", "binary.mhome"]
+    rejected = {entry["filename"]: entry for entry in result["rejected"]}
+    assert set(rejected) == {"duplicated.json", "broken.json", "broken.mhome"}
+    assert rejected["duplicated.json"]["validation"]["errors"][0]["path"] == "floors[0].lights[1]"
+    assert rejected["broken.json"]["detail"].startswith("Invalid save file: Invalid JSON")
+    assert rejected["broken.mhome"]["detail"].startswith("Invalid save file: Invalid binary snapshot")
+
+    saves = client.get("/api/saves").json()
+    assert {"restored.json", "binary.mhome"} <= set(saves)
+    assert not {"duplicated.json", "broken.json", "broken.mhome"} & set(saves)
+    assert client.post("/api/saves/binary.mhome/load").json()["id"] == "binary"
+
+    transfer = client.get(f"/api/saves/transfers/{result['transfer_id']}").json()
+    assert transfer["files_done"] == 5 and transfer["files_rejected"] == 3
+
+
+def test_import_with_nothing_valid_is_refused(client):
+    response = _import(client, {"broken.json": b"[]"})
+    assert response.status_code == 400
+    result = response.json()
+    assert result["detail"] == "No valid save files found in ZIP"
+    assert result["rejected"][0]["filename"] == "broken.json"
+    assert "broken.json" not in client.get("/api/saves").json()
@@ -0,0 +1,95 @@
+import os
+
+import binary_snapshot
+import codec
+
+BINARY = {"SAVE_FORMAT": "binary"}
+
+
+def _write_json_save(saves_dir, name: str, home: dict):
+    saves_dir.mkdir(parents=True, exist_ok=True)
+    with open(saves_dir / name, "wb") as f:
+        f.write(codec.dumps(home))
+
+
+def _demo_home(backend) -> dict:
+    with backend() as client:
+        return client.get("/api/homes").json()[0]
+
+
+def test_round_trip_with_floor_index(backend):
+    home = _demo_home(backend)
+    home["floors"].append({**home["floors"][0], "id": "upstairs", "level": 1, "name": "Upstairs"})
+    data = binary_snapshot.encode_home(home)
+    assert binary_snapshot.decode_home(data) == home
+
+
+def test_binary_write_replaces_the_json_save(backend, saves_dir):
+    # Written as JSON by a first start in the default format
+    home = _demo_home(backend)
+
+    with backend(**BINARY) as client:
+        import db
+        light_id = home["floors"][0]["lights"][0]["id"]
+        state = {"on": True, "color": "#ffffff", "intensity": 1.0}
+        client.put(f"/api/homes/{home['id']}/lights/{light_id}", json=state)
+        client.portal.call(db.flush_dirty_homes)
+
+        assert (saves_dir / "default.mhome").exists()
+        assert not (saves_dir / "default.json").exists()
+        assert client.get("/api/saves").json() == ["default.mhome"]
+        assert [entry["filename"] for entry in client.get("/api/saves/catalog").json()["items"]] == ["default.mhome"]
+
+        # Asking for the old name finds the current save, not stale data
+        loaded = client.post("/api/saves/default.json/load").json()
+        assert loaded["floors"][0]["lights"][0]["state"]["on"] is True
+
+
+def test_per_floor_loading(backend, saves_dir):
+    with backend(**BINARY) as client:
+        home = client.get("/api/homes").json()[0]
+        floor = home["floors"][0]
+        meta = client.get("/api/saves/default.mhome/meta").json()
+        assert meta["format"] == "binary"
+        assert meta["floors"] == [{"id": floor["id"], "name": floor["name"], "level": floor["level"],
+                                   "walls": 4, "lights": 1, "cubes": 0}]
+        assert client.get(f"/api/saves/default.mhome/floors/{floor['id']}").json() == floor
+        assert client.get("/api/saves/default.mhome/floors/missing").status_code == 404
+
+
+def test_upload_does_not_shadow_or_replace_the_other_format(backend, saves_dir):
+    with backend(**BINARY) as client:
+        home = client.get("/api/homes").json()[0]
+        uploaded = dict(home, name="Uploaded")
+        files = {"file": ("default.json", codec.dumps(uploaded), "application/json")}
+        response = client.post("/api/saves/upload", files=files).json()
+
+        assert response["filename"] == "default_1.json"
+        assert (saves_dir / "default.mhome").exists()
+        assert client.post("/api/saves/default_1/load").json()["name"] == "Uploaded"
+
+
+def test_leftover_formats_list_once_and_newest_loads(backend, saves_dir):
+    home = _demo_home(backend)
+    with open(saves_dir / "both.mhome", "wb") as f:
+        f.write(binary_snapshot.encode_home(dict(home, name="Older")))
+    os.utime(saves_dir / "both.mhome", (1, 1))
+    _write_json_save(saves_dir, "both.json", dict(home, name="Newer"))
+
+    with backend(**BINARY) as client:
+        assert client.get("/api/saves").json().count("both.json") == 1
+        assert "both.mhome" not in client.get("/api/saves").json()
+        assert client.post("/api/saves/both.mhome/load").json()["name"] == "Newer"
+
+
+def test_json_floors_without_msgpack(backend, saves_dir, monkeypatch):
+    home = _demo_home(backend)
+    monkeypatch.setattr(binary_snapshot, "msgpack", None)
+    data = binary_snapshot.encode_home(home)
+    assert binary_snapshot.decode_home(data) == home
+
+    path = saves_dir / "plain.mhome"
+    with open(path, "wb") as f:
+        f.write(data)
+    assert binary_snapshot.read_header(str(path))["codec"] == "json"
+    assert binary_snapshot.read_floor(str(path), home["floors"][0]["id"]) == home["floors"][0]
@@ -0,0 +1,129 @@
+import asyncio
+import importlib
+import os
+
+import pytest
+
+import event_log
+
+
+@pytest.fixture
+def events():
+    import events
+    importlib.reload(events)
+    yield events
+    events.close_logs()
+    importlib.reload(events)
+
+
+def _event(version: int) -> bytes:
+    return b'{"type":"lights_changed","version":%d}' % version
+
+
+def test_ring_wraps_around_and_survives_reopening(tmp_path):
+    path = str(tmp_path / "home.events")
+    ring = event_log.RingLog(path, 200)
+    for version in range(1, 31):
+        ring.append(version, _event(version))
+    records = ring.records()
+    ring.close()
+
+    versions = [version for version, _ in records]
+    # Only the newest records fit, oldest first and without holes
+    assert 1 < len(versions) < 30
+    assert versions == list(range(31 - len(versions), 31))
+    assert all(data == _event(version) for version, data in records)
+    assert os.path.getsize(path) == 64 + 200
+
+    reopened = event_log.RingLog(path, 4096)
+    # The capacity of an existing file wins
+    assert reopened.capacity == 200
+    assert reopened.version == 30
+    assert reopened.records() == records
+    reopened.close()
+
+
+def test_unreadable_ring_file_is_replaced(tmp_path, events):
+    directory = tmp_path / "events"
+    directory.mkdir()
+    path = event_log.path_for(str(directory), "home")
+    with open(path, "wb") as f:
+        f.write(b"not an event log" * 8)
+
+    events.open_logs(str(directory))
+    assert events.current_version("home") == 0
+    assert events.get_stats()["log_errors"] == 1
+    events.publish("home", "background_changed", {"background_color": "#000000"})
+    events.close_logs()
+
+    with open(path, "rb") as f:
+        assert f.read(8) == event_log.MAGIC
+
+
+def test_corrupt_record_keeps_only_what_follows(tmp_path, events):
+    directory = str(tmp_path / "events")
+    events.open_logs(directory)
+    for color in ("#000001", "#000002", "#000003"):
+        events.publish("home", "background_changed", {"background_color": color})
+    events.close_logs()
+
+    path = event_log.path_for(directory, "home")
+    with open(path, "r+b") as f:
+        content = f.read()
+        start = content.index(b"#000002")
+        f.seek(start - 20)
+        f.write(b"\xff" * 20)
+
+    importlib.reload(events)
+    events.open_logs(directory)
+    assert events.current_version("home") == 3
+    assert [event["version"] for event in events.retained_events("home")] == [3]
+    # Catch-up from before the corrupt record cannot be served without a hole
+    assert events.changes_since("home", 0)[1] is True
+
+
+def test_released_log_is_closed_and_reopens(tmp_path, events):
+    directory = str(tmp_path / "events")
+    events.open_logs(directory)
+    for color in ("#000001", "#000002"):
+        events.publish("home", "background_changed", {"background_color": color})
+
+    events.release_log("home")
+    assert "home" not in events._rings
+    assert events.current_version("home") == 2
+    assert "home" in events._rings
+    assert [event["version"] for event in events.retained_events("home")] == [1, 2]
+
+
+def test_released_log_with_subscribers_stays_open(tmp_path, events):
+    events.open_logs(str(tmp_path / "events"))
+
+    async def scenario():
+        subscriber = events.subscribe("home")
+        events.publish("home", "background_changed", {"background_color": "#000001"})
+        events.release_log("home")
+        events.unsubscribe(subscriber)
+
+    asyncio.run(scenario())
+    assert "home" in events._rings
+    assert events.current_version("home") == 1
+
+
+def test_evicted_home_closes_its_log(backend):
+    import events
+
+    with backend(HOME_CACHE_MAX_HOMES=2) as client:
+        lamp = {"id": "lamp", "name": "Lamp", "position": {"x": 0, "y": 1, "z": 0}}
+        second = client.post("/api/homes", json={
+            "name": "Second", "floors": [{"level": 0, "name": "Ground", "lights": [lamp]}],
+        }).json()
+        client.put(f"/api/homes/{second['id']}/lights/lamp",
+                   json={"on": True, "color": "#ffffff", "intensity": 1.0})
+        assert second["id"] in events._rings
+
+        # A third resident home pushes out the second (the active one stays)
+        client.post("/api/homes", json={"name": "Third", "floors": []})
+        assert client.get("/api/cache/stats").json()["evictions"] == 1
+        assert second["id"] not in events._rings
+        # The version carries on where it stopped
+        assert events.current_version(second["id"]) == 1
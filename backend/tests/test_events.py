@@ -0,0 +1,221 @@
+import asyncio
+import importlib
+import time
+
+import pytest
+
+import codec
+
+BUFFER = 5
+
+
+@pytest.fixture
+def events(monkeypatch):
+    """A fresh events module with a small subscriber buffer and no ring files"""
+    monkeypatch.setenv("SSE_SUBSCRIBER_BUFFER", str(BUFFER))
+    import events
+    importlib.reload(events)
+    yield events
+    importlib.reload(events)
+
+
+def _run(coroutine_function):
+    return asyncio.run(coroutine_function())
+
+
+def _websocket_subscriber(events, policy):
+    return events.subscribe_websocket("home", lambda light_id: None, policy)
+
+
+def test_replies_respect_the_buffer_bound(events):
+    async def scenario():
+        subscriber = _websocket_subscriber(events, "drop_oldest")
+        for i in range(20):
+            subscriber.enqueue(b"%d" % i)
+        return subscriber
+
+    subscriber = _run(scenario)
+    assert [frame for _, frame in subscriber.pending] == [b"15", b"16", b"17", b"18", b"19"]
+    assert subscriber.dropped == 15
+
+
+def test_replies_disconnect_a_slow_consumer(events):
+    async def scenario():
+        subscriber = _websocket_subscriber(events, "disconnect")
+        for i in range(BUFFER + 3):
+            subscriber.enqueue(b"%d" % i)
+        return subscriber
+
+    subscriber = _run(scenario)
+    assert subscriber.closing
+    (_, frame), = subscriber.pending
+    assert codec.loads(frame)["type"] == "resync_required"
+
+
+def test_resume_sends_each_event_once(events):
+    async def scenario():
+        subscriber = _websocket_subscriber(events, "drop_oldest")
+        for color in ("#000000", "#111111"):
+            events.publish("home", "background_changed", {"background_color": color})
+        subscriber.resume(0)
+        return subscriber
+
+    subscriber = _run(scenario)
+    versions = [codec.loads(frame)["version"] for _, frame in subscriber.pending]
+    assert versions == [1, 2]
+
+
+def test_resume_past_the_buffer_resyncs(events):
+    async def scenario():
+        for i in range(BUFFER + 1):
+            events.publish("home", "background_changed", {"background_color": f"#00000{i}"})
+        subscriber = _websocket_subscriber(events, "drop_oldest")
+        subscriber.resume(0)
+        return subscriber
+
+    subscriber = _run(scenario)
+    (_, frame), = subscriber.pending
+    assert codec.loads(frame) == {"type": "resync_required", "version": BUFFER + 1, "home_id": "home",
+                                  "current_version": BUFFER + 1, "reason": "event_buffer_gap"}
+
+
+def _light(light_id: str, intensity: float) -> dict:
+    return {"id": light_id, "state": {"on": True, "color": "#ffffff", "intensity": intensity}}
+
+
+def test_events_are_encoded_once_for_all_subscribers(events):
+    async def scenario():
+        subscribers = [events.subscribe("home") for _ in range(3)]
+        events.publish("home", "background_changed", {"background_color": "#000000"})
+        return subscribers
+
+    subscribers = _run(scenario)
+    frames = [subscriber.pending[0][1] for subscriber in subscribers]
+    assert all(frame is frames[0] for frame in frames)
+    assert frames[0].startswith(b"id: 1\nevent: background_changed\ndata: ")
+    assert events.get_stats()["published"] == 1
+
+
+def test_slow_consumer_policies(events):
+    async def scenario():
+        subscribers = {policy: events.subscribe("home", policy) for policy in events.SLOW_CONSUMER_POLICIES}
+        for i in range(BUFFER + 2):
+            events.publish("home", "lights_changed", {"lights": [_light("lamp", i / 10)], "removed": []})
+        return subscribers
+
+    events.LIGHT_EVENT_COALESCE_MS = 0
+    subscribers = _run(scenario)
+
+    oldest = subscribers["drop_oldest"]
+    assert len(oldest.pending) == BUFFER and oldest.dropped == 2
+    assert oldest.pending[0][0]["version"] == 3
+
+    disconnected = subscribers["disconnect"]
+    assert disconnected.closing
+    assert b"event: resync_required" in disconnected.pending[0][1]
+    assert b'"reason":"slow_consumer"' in disconnected.pending[0][1]
+
+    stats = {entry["policy"]: entry for entry in events.get_stats()["homes"]["home"]}
+    assert stats["drop_oldest"]["dropped"] == 2
+    assert stats["disconnect"]["dropped"] == BUFFER
+    assert events.get_stats()["disconnected_slow"] == 1
+
+
+def test_coalesce_policy_replaces_superseded_light_updates(events):
+    events.LIGHT_EVENT_COALESCE_MS = 0
+
+    async def scenario():
+        subscriber = events.subscribe("home", "coalesce")
+        events.publish("home", "background_changed", {"background_color": "#000000"})
+        for i in range(BUFFER + 2):
+            events.publish("home", "lights_changed", {"lights": [_light("lamp", i / 10)]})
+        return subscriber
+
+    subscriber = _run(scenario)
+    versions = [event["version"] for event, _ in subscriber.pending]
+    # A full queue makes room by dropping the older updates of the same light only
+    assert versions == [1, 6, 7, 8]
+    assert subscriber.dropped == 0 and subscriber.coalesced == 4
+
+
+def test_one_ticker_sends_heartbeats(events):
+    events.SSE_HEARTBEAT_SECONDS = 0.01
+
+    async def scenario():
+        subscribers = [events.subscribe("home"), events.subscribe("other")]
+        events.publish("home", "background_changed", {"background_color": "#000000"})
+        await asyncio.sleep(0.05)
+        pings = [
+            [frame for _, frame in subscriber.pending if frame.startswith(b"id: ") and b"event: ping" in frame]
+            for subscriber in subscribers
+        ]
+        for subscriber in subscribers:
+            events.unsubscribe(subscriber)
+        await asyncio.sleep(0.03)
+        return pings, events._ticker_task.done()
+
+    (home_pings, other_pings), ticker_done = _run(scenario)
+    assert home_pings and other_pings
+    assert home_pings[0].startswith(b"id: 1\n")
+    assert other_pings[0].startswith(b"id: 0\n")
+    # The ticker stops with the last subscriber
+    assert ticker_done
+
+
+def test_light_updates_coalesce_within_the_window(events):
+    events.LIGHT_EVENT_COALESCE_MS = 20
+
+    async def scenario():
+        subscriber = events.subscribe("home")
+        for i in range(3):
+            events.publish("home", "lights_changed", {"lights": [_light("lamp", i / 10)]})
+        events.publish("home", "lights_changed", {"lights": [_light("desk", 1.0)]})
+        queued_early = len(subscriber.pending)
+        await asyncio.sleep(0.05)
+        return subscriber, queued_early
+
+    subscriber, queued_early = _run(scenario)
+    assert queued_early == 0
+    (event, _), = subscriber.pending
+    assert event["version"] == 4 and event["first_version"] == 1
+    assert event["lights"] == [_light("lamp", 0.2), _light("desk", 1.0)]
+    assert events.get_stats()["coalesced_light_updates"] == 2
+
+
+def test_changes_and_heartbeats_stay_consistent_while_coalescing(events):
+    events.LIGHT_EVENT_COALESCE_MS = 1000
+
+    async def scenario():
+        events.publish("home", "background_changed", {"background_color": "#000000"})
+        events.publish("home", "lights_changed", {"lights": [_light("lamp", 0.1)]})
+        events.publish("home", "lights_changed", {"lights": [_light("lamp", 0.2)]})
+        # Heartbeats carry the newest version actually sent
+        emitted = events._emitted_versions["home"]
+        # Reading the feed publishes what is pending first
+        changes = events.changes_since("home", 2)
+        return emitted, changes
+
+    emitted, (changes, resync_required, version) = _run(scenario)
+    assert emitted == 1
+    assert version == 3 and not resync_required
+    # A client at an intermediate version gets the event that covers it
+    assert [(event["first_version"], event["version"]) for event in changes] == [(2, 3)]
+    assert changes[0]["lights"] == [_light("lamp", 0.2)]
+    # Other events are not held back behind pending light updates
+    assert events.changes_since("home", 0)[0][0]["type"] == "background_changed"
+
+
+def test_max_rate_delivers_only_the_latest_light_state(events):
+    events.LIGHT_EVENT_COALESCE_MS = 0
+
+    async def scenario():
+        subscriber = events.subscribe("home", max_rate=20)
+        subscriber.last_delivery = time.monotonic()
+        for i in range(3):
+            events.publish("home", "lights_changed", {"lights": [_light("lamp", i / 10)]})
+        events.publish("home", "background_changed", {"background_color": "#000000"})
+        return subscriber, await subscriber.next_frames()
+
+    subscriber, frames = _run(scenario)
+    assert [codec.loads(frame.split(b"data: ")[1])["version"] for frame in frames] == [3, 4]
+    assert subscriber.coalesced == 2
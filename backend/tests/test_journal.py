@@ -0,0 +1,101 @@
+import threading
+
+import codec
+
+JOURNAL = {"PERSISTENCE_MODE": "journal", "JOURNAL_COMPACT_BYTES": 10 ** 9}
+
+
+def _set_light(client, home, on: bool):
+    light_id = home["floors"][0]["lights"][0]["id"]
+    state = {"on": on, "color": "#ffffff", "intensity": 1.0}
+    return client.put(f"/api/homes/{home['id']}/lights/{light_id}", json=state)
+
+
+def _add_wall(client, home):
+    wall = {"p1": {"x": 0, "y": 0, "z": 0}, "p2": {"x": 0, "y": 0, "z": 5}}
+    operations = [{"op": "add", "target": "wall", "floor_id": home["floors"][0]["id"], "value": wall}]
+    response = client.patch(f"/api/homes/{home['id']}", json=operations)
+    assert response.status_code == 200
+    return response
+
+
+def _journal_records(saves_dir):
+    with open(saves_dir / "default.json.journal", "rb") as f:
+        return [codec.loads(line) for line in f]
+
+
+def _saved_home(saves_dir):
+    with open(saves_dir / "default.json", "rb") as f:
+        return codec.loads(f.read())
+
+
+def test_journal_records_deltas_and_replays_them(backend, saves_dir):
+    with backend(**JOURNAL) as client:
+        import db
+        home = client.get("/api/homes").json()[0]
+        _set_light(client, home, True)
+        _add_wall(client, home)
+
+        records = _journal_records(saves_dir)
+        assert [record["op"] for record in records] == ["lights", "floor_changes"]
+        # Only the added wall is journaled, not the four walls already on the floor
+        (change,) = records[-1]["changes"]
+        assert change["type"] == "walls_changed"
+        assert len(change["walls"]) == 1 and change["removed"] == []
+
+        replayed = db._read_and_replay("default.json")
+        assert replayed.dict() == db.get_home(home["id"]).dict()
+
+
+def test_shutdown_compacts_journal_and_restart_loads_it(backend, saves_dir):
+    with backend(**JOURNAL) as client:
+        home = client.get("/api/homes").json()[0]
+        _set_light(client, home, True)
+        _add_wall(client, home)
+
+    assert not (saves_dir / "default.json.journal").exists()
+    saved = _saved_home(saves_dir)
+    assert saved["floors"][0]["lights"][0]["state"]["on"] is True
+    assert len(saved["floors"][0]["walls"]) == 5
+
+    with backend(**JOURNAL) as client:
+        reloaded = client.get("/api/homes").json()[0]
+        assert reloaded["id"] == home["id"]
+        assert len(reloaded["floors"][0]["walls"]) == 5
+
+
+def test_compaction_past_threshold(backend, saves_dir):
+    with backend(PERSISTENCE_MODE="journal", JOURNAL_COMPACT_BYTES=1) as client:
+        import db
+        home = client.get("/api/homes").json()[0]
+        _set_light(client, home, True)
+        client.portal.call(db.wait_for_compactions)
+        assert db.get_persistence_stats()["journal"]["compactions"] >= 1
+        assert _saved_home(saves_dir)["floors"][0]["lights"][0]["state"]["on"] is True
+
+
+def test_forced_compaction_waits_for_a_running_one(backend, saves_dir, monkeypatch):
+    with backend(**JOURNAL) as client:
+        import db
+        home = client.get("/api/homes").json()[0]
+        _set_light(client, home, True)
+
+        started, release = threading.Event(), threading.Event()
+        finish = db._finish_compaction
+
+        def slow_finish(filename, data):
+            started.set()
+            release.wait(10)
+            finish(filename, data)
+
+        monkeypatch.setattr(db, "_finish_compaction", slow_finish)
+        # A compaction whose awaiting task is cancelled, like the compactor at shutdown
+        compaction = client.portal.start_task_soon(db.compact_journals, True)
+        assert started.wait(10)
+        compaction.cancel()
+        _set_light(client, home, False)
+        threading.Timer(0.3, release.set).start()
+
+    # The older compaction must not overwrite the snapshot of the forced one
+    assert _saved_home(saves_dir)["floors"][0]["lights"][0]["state"]["on"] is False
+    assert not list(saves_dir.glob("*.journal*"))
@@ -0,0 +1,146 @@
+import pytest
+
+import light_table
+from models import Floor, Home, Light, LightState, Vector3
+
+
+def _lights(prefix: str, count: int, name: str | None = None) -> list[Light]:
+    return [
+        Light(id=f"{prefix}{i}", name=name or f"{prefix}{i}", position=Vector3(x=i, y=1, z=0))
+        for i in range(count)
+    ]
+
+
+@pytest.fixture
+def home():
+    light_table._tables.clear()
+    return Home(id="home", name="Home", floors=[
+        Floor(id="ground", level=0, name="Ground", lights=_lights("g", 3, name="Ceiling")),
+        Floor(id="upper", level=1, name="Upper", lights=_lights("u", 2)),
+    ])
+
+
+def _states(home: Home) -> dict[str, tuple]:
+    return {light.id: (light.state.on, light.state.color, light.state.intensity)
+            for floor in home.floors for light in floor.lights}
+
+
+def test_masked_update_writes_back_changed_rows_only(home):
+    home.floors[0].lights[0].state = LightState(on=True)
+    table = light_table.table_for(home)
+
+    rows = table.update(table.select(floors=["ground"]), on=True, rgb=(255, 0, 0))
+    assert rows.tolist() == [0, 1, 2]
+    # The models are untouched until written back
+    assert home.floors[0].lights[1].state.on is False
+
+    changed = table.write_back(rows)
+    assert [light.id for light in changed] == ["g0", "g1", "g2"]
+    assert _states(home)["g1"] == (True, "#ff0000", 1.0)
+    assert _states(home)["u0"] == (False, "#ffffff", 1.0)
+
+    assert table.update(table.select(names=["Ceiling"]), on=True).tolist() == []
+    assert table.update(table.rows_named("Ceiling"), scale=10).tolist() == [0, 1, 2]
+    assert table.intensity[:3].tolist() == [light_table.MAX_INTENSITY] * 3
+
+
+def test_custom_colors_survive_until_a_color_is_set(home):
+    home.floors[1].lights[0].state = LightState(color="warm")
+    table = light_table.table_for(home)
+
+    table.write_back(table.update(table.select(floors=["upper"]), on=True))
+    assert _states(home)["u0"] == (True, "warm", 1.0)
+    table.write_back(table.update(table.select(lights=["u0"]), rgb=(0, 0, 255)))
+    assert _states(home)["u0"][1] == "#0000ff"
+
+
+def test_apply_states_reports_changed_and_missing(home):
+    table = light_table.table_for(home)
+    targets = {"g0": LightState(on=True), "u1": LightState(), "gone": LightState(on=True)}
+    changed, missing = table.apply_states(targets)
+    assert [light.id for light in changed] == ["g0"]
+    assert missing == ["gone"]
+    # Applying again changes nothing
+    assert table.apply_states(targets) == ([], ["gone"])
+
+
+def test_table_is_reused_until_the_lights_change(home):
+    table = light_table.table_for(home)
+    assert light_table.table_for(home) is table
+
+    light = home.floors[0].lights[0]
+    light.state = LightState(on=True, intensity=2.0)
+    light_table.states_replaced(home.id, [light])
+    assert light_table.table_for(home) is table
+    assert table.on[0] and table.intensity[0] == 2.0
+    assert not table.stale
+
+    # Structural changes go through db's reindexing, which drops the table
+    light_table.drop(home.id)
+    home.floors[1].lights = home.floors[1].lights + _lights("x", 1, name="Ceiling")
+    rebuilt = light_table.table_for(home)
+    assert rebuilt is not table
+    assert rebuilt.rows_named("Ceiling").tolist() == [0, 1, 2, 5]
+
+
+@pytest.fixture
+def client(backend):
+    with backend() as client:
+        yield client
+
+
+def _add_lights(client, home: dict, lights: list[dict]):
+    floor_id = home["floors"][0]["id"]
+    operations = [{"op": "add", "target": "light", "floor_id": floor_id, "value": light} for light in lights]
+    assert client.patch(f"/api/homes/{home['id']}", json=operations).status_code == 200
+
+
+def test_named_control_is_one_update_per_home(client):
+    home = client.get("/api/homes").json()[0]
+    _add_lights(client, home, [
+        {"id": f"strip{i}", "name": "Strip", "position": {"x": i, "y": 1, "z": 0}} for i in range(3)
+    ])
+    version = client.get(f"/api/homes/{home['id']}/changes", params={"since": 0}).json()["current_version"]
+
+    response = client.post("/api/control/lights", json=[
+        {"name": "Strip", "on": True, "brightness": 50, "color": [0, 255, 0]},
+        {"name": "Nowhere", "on": True},
+    ]).json()
+    assert response["updated_lights"] == 3
+    assert response["results"] == [
+        {"name": "Strip", "result": "matched", "lights": ["strip0", "strip1", "strip2"]},
+        {"name": "Nowhere", "result": "unmatched", "lights": []},
+    ]
+    lights = {light["id"]: light for light in client.get("/api/homes").json()[0]["floors"][0]["lights"]}
+    assert lights["strip1"]["state"] == {"on": True, "color": "#00ff00", "intensity": 2.5}
+
+    events = client.get(f"/api/homes/{home['id']}/changes", params={"since": version}).json()["events"]
+    assert [event["type"] for event in events] == ["lights_changed"]
+    assert sorted(light["id"] for light in events[0]["lights"]) == ["strip0", "strip1", "strip2"]
+
+
+def test_named_commands_that_cancel_out_change_nothing(client):
+    home = client.get("/api/homes").json()[0]
+    _add_lights(client, home, [{"id": "lamp", "name": "Lamp", "position": {"x": 0, "y": 1, "z": 0}}])
+    version = client.get(f"/api/homes/{home['id']}/changes", params={"since": 0}).json()["current_version"]
+
+    response = client.post("/api/control/lights", json=[
+        {"name": "Lamp", "on": True},
+        {"name": "Lamp", "on": False},
+    ]).json()
+    assert response["updated_lights"] == 0
+    assert [result["lights"] for result in response["results"]] == [["lamp"], ["lamp"]]
+    assert client.get(f"/api/homes/{home['id']}/changes", params={"since": version}).json()["events"] == []
+
+
+def test_light_put_is_seen_by_the_next_bulk_command(client):
+    home = client.get("/api/homes").json()[0]
+    light = home["floors"][0]["lights"][0]
+    url = f"/api/homes/{home['id']}/lights"
+    client.post(f"{url}/bulk", json={"on": False})
+
+    client.put(f"{url}/{light['id']}", json={"on": True, "color": "#ffffff", "intensity": 2.0})
+    response = client.post(f"{url}/bulk", json={"lights": [light["id"]], "scale": 2}).json()
+    assert response["changed"] == [light["id"]]
+    state = client.get(f"/api/homes/{home['id']}").json()["floors"][0]["lights"][0]["state"]
+    assert state == {"on": True, "color": "#ffffff", "intensity": 4.0}
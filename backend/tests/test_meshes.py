@@ -0,0 +1,130 @@
+import asyncio
+import struct
+
+import numpy as np
+import pytest
+
+import codec
+import meshes
+from models import Floor, Vector3, Wall, Window
+
+
+def _point(x: float, z: float) -> Vector3:
+    return Vector3(x=x, y=0, z=z)
+
+
+def _parse_glb(data: bytes):
+    magic, version, length = struct.unpack_from("<4sII", data, 0)
+    assert (magic, version, length) == (b"glTF", 2, len(data))
+    json_length, json_type = struct.unpack_from("<I4s", data, 12)
+    assert json_type == b"JSON" and json_length % 4 == 0
+    document = codec.loads(data[20:20 + json_length])
+    bin_length, bin_type = struct.unpack_from("<I4s", data, 20 + json_length)
+    assert bin_type == b"BIN\0"
+    blob = data[28 + json_length:28 + json_length + bin_length]
+    assert len(blob) == bin_length == document["buffers"][0]["byteLength"]
+    return document, blob
+
+
+def _accessor(document: dict, blob: bytes, index: int) -> np.ndarray:
+    accessor = document["accessors"][index]
+    view = document["bufferViews"][accessor["bufferView"]]
+    dtype = np.float32 if accessor["componentType"] == 5126 else np.uint32
+    data = np.frombuffer(blob, dtype=dtype, count=view["byteLength"] // 4, offset=view["byteOffset"])
+    return data.reshape(accessor["count"], -1)
+
+
+def _area(points: np.ndarray, triangles: np.ndarray) -> float:
+    a, b, c = points[triangles[:, 0]], points[triangles[:, 1]], points[triangles[:, 2]]
+    return float(np.abs(np.cross(b - a, c - a)).sum() / 2)
+
+
+def test_triangulate_concave_polygon():
+    # An L shape of area 3, counter-clockwise in (x, z)
+    points = np.array([(0, 0), (2, 0), (2, 1), (1, 1), (1, 2), (0, 2)], dtype=float)
+    triangles = meshes.triangulate(points)
+    assert triangles.shape == (4, 3)
+    assert _area(points, triangles) == pytest.approx(3.0)
+
+
+def test_floor_glb_structure():
+    wall = Wall(p1=_point(0, 0), p2=_point(4, 0), windows=[
+        Window(p1=_point(1, 0), p2=_point(2, 0)),
+    ])
+    floor = Floor(level=1, name="Upper", walls=[wall],
+                  shape=[_point(0, 0), _point(4, 0), _point(4, 4), _point(0, 4)])
+    document, blob = _parse_glb(meshes.build_floor_glb(floor))
+
+    assert document["nodes"][0]["translation"] == [0.0, meshes.FLOOR_HEIGHT, 0.0]
+    primitives = document["meshes"][0]["primitives"]
+    assert [primitive["material"] for primitive in primitives] == [0, 1, 2]
+    for primitive in primitives:
+        positions = _accessor(document, blob, primitive["attributes"]["POSITION"])
+        normals = _accessor(document, blob, primitive["attributes"]["NORMAL"])
+        indices = _accessor(document, blob, primitive["indices"])
+        assert positions.shape == normals.shape
+        assert len(indices) % 3 == 0 and indices.max() < len(positions)
+        np.testing.assert_allclose(np.linalg.norm(normals, axis=1), 1.0, atol=1e-5)
+        accessor = document["accessors"][primitive["attributes"]["POSITION"]]
+        np.testing.assert_allclose(accessor["min"], positions.min(axis=0))
+        np.testing.assert_allclose(accessor["max"], positions.max(axis=0))
+
+    slab = _accessor(document, blob, primitives[0]["attributes"]["POSITION"])
+    assert slab[:, 0].min() == 0 and slab[:, 0].max() == 4
+    # The window is cut out of the wall: it has more faces than a plain box
+    walls = _accessor(document, blob, primitives[1]["indices"])
+    plain = _parse_glb(meshes.build_floor_glb(Floor(level=0, name="Plain", walls=[
+        Wall(p1=_point(0, 0), p2=_point(4, 0)),
+    ])))
+    assert len(plain[0]["meshes"][0]["primitives"]) == 1
+    assert len(walls) > len(_accessor(plain[0], plain[1], plain[0]["meshes"][0]["primitives"][0]["indices"]))
+
+
+def test_mesh_hash_follows_geometry_only():
+    floor = Floor(level=0, name="Ground", walls=[Wall(p1=_point(0, 0), p2=_point(4, 0))])
+    digest = meshes.mesh_hash(floor)
+    # Ids, lights and cubes are not geometry
+    same = floor.copy(update={"lights": [], "cubes": [], "walls": [floor.walls[0].copy(update={"id": "other"})]})
+    assert meshes.mesh_hash(same) == digest
+    taller = floor.copy(update={"walls": [floor.walls[0].copy(update={"height": 3.0})]})
+    assert meshes.mesh_hash(taller) != digest
+
+
+def test_meshes_are_cached_by_hash():
+    floor = Floor(level=0, name="Cached", walls=[Wall(p1=_point(0, 0), p2=_point(3, 0))])
+    before = meshes.get_stats()
+
+    first = asyncio.run(meshes.floor_glb(floor))
+    second = asyncio.run(meshes.floor_glb(floor.copy()))
+    assert first == second
+    stats = meshes.get_stats()
+    assert stats["builds"] == before["builds"] + 1
+    assert stats["hits"] == before["hits"] + 1
+
+
+def test_mesh_endpoints_invalidate_on_geometry_edits(backend):
+    with backend() as client:
+        home = client.get("/api/homes").json()[0]
+        floor = home["floors"][0]
+        url = f"/api/homes/{home['id']}"
+        listed = client.get(f"{url}/meshes").json()["floors"][0]
+        assert listed["floor_id"] == floor["id"]
+
+        response = client.get(listed["url"])
+        assert response.headers["Content-Type"] == meshes.MEDIA_TYPE
+        assert response.headers["ETag"] == f'"{listed["mesh_hash"]}"'
+        _parse_glb(response.content)
+        assert client.get(listed["url"], headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+
+        # A cube is not geometry: the mesh stays
+        cube = {"id": "box", "position": {"x": 1, "y": 0, "z": 1}}
+        client.patch(url, json=[{"op": "add", "target": "cube", "floor_id": floor["id"], "value": cube}])
+        assert client.get(f"{url}/meshes").json()["floors"][0]["mesh_hash"] == listed["mesh_hash"]
+
+        wall_id = floor["walls"][0]["id"]
+        client.patch(url, json=[{"op": "update", "target": "wall", "floor_id": floor["id"], "id": wall_id,
+                                 "value": {"height": 3.0}}])
+        current = client.get(f"{url}/meshes").json()["floors"][0]
+        assert current["mesh_hash"] != listed["mesh_hash"]
+        assert client.get(listed["url"]).status_code == 404
+        assert client.get(current["url"]).status_code == 200
@@ -0,0 +1,92 @@
+import pytest
+
+
+@pytest.fixture
+def client(backend):
+    with backend() as client:
+        yield client
+
+
+def _home(client):
+    return client.get("/api/homes").json()[0]
+
+
+def _patch(client, home, operations):
+    return client.patch(f"/api/homes/{home['id']}", json=operations)
+
+
+def _changes(client, home, since):
+    return client.get(f"/api/homes/{home['id']}/changes", params={"since": since}).json()["events"]
+
+
+def test_add_update_remove_publish_deltas(client):
+    home = _home(client)
+    floor = home["floors"][0]
+    first_wall, second_wall = floor["walls"][0], floor["walls"][1]
+    cube = {"id": "sofa", "name": "Sofa", "position": {"x": 2, "y": 0, "z": 2}}
+    window = {"id": "w1", "p1": {"x": 1, "y": 0, "z": 0}, "p2": {"x": 2, "y": 0, "z": 0}}
+    operations = [
+        {"op": "add", "target": "cube", "floor_id": floor["id"], "value": cube},
+        {"op": "update", "target": "wall", "floor_id": floor["id"], "id": first_wall["id"], "value": {"height": 3.0}},
+        {"op": "add", "target": "window", "floor_id": floor["id"], "wall_id": first_wall["id"], "value": window},
+        {"op": "remove", "target": "wall", "floor_id": floor["id"], "id": second_wall["id"]},
+        {"op": "replace", "target": "shape", "floor_id": floor["id"],
+         "value": [{"x": 0, "y": 0, "z": 0}, {"x": 4, "y": 0, "z": 0}, {"x": 4, "y": 0, "z": 4}]},
+    ]
+    result = _patch(client, home, operations).json()
+    assert result["applied"] == 5
+    assert result["events"] == ["cubes_changed", "walls_changed", "floor_shape_changed"]
+
+    patched = _home(client)["floors"][0]
+    walls = {wall["id"]: wall for wall in patched["walls"]}
+    assert second_wall["id"] not in walls
+    assert walls[first_wall["id"]]["height"] == 3.0
+    # An update keeps the fields it does not mention
+    assert walls[first_wall["id"]]["p2"] == first_wall["p2"]
+    assert [w["id"] for w in walls[first_wall["id"]]["windows"]] == ["w1"]
+    assert patched["cubes"][0]["id"] == "sofa"
+    assert len(patched["shape"]) == 3
+
+    events = _changes(client, home, 0)
+    walls_changed = next(event for event in events if event["type"] == "walls_changed")
+    # Only the touched walls travel in the event
+    assert [wall["id"] for wall in walls_changed["walls"]] == [first_wall["id"]]
+    assert walls_changed["removed"] == [second_wall["id"]]
+    assert events[-1]["version"] == result["version"]
+
+
+def test_failing_operation_changes_nothing(client):
+    home = _home(client)
+    floor = home["floors"][0]
+    operations = [
+        {"op": "remove", "target": "wall", "floor_id": floor["id"], "id": floor["walls"][0]["id"]},
+        {"op": "update", "target": "light", "floor_id": floor["id"], "id": "missing", "value": {"name": "x"}},
+    ]
+    response = _patch(client, home, operations)
+    assert response.status_code == 422
+    assert response.json()["detail"].startswith("operations[1]")
+    assert _home(client) == home
+    assert _changes(client, home, 0) == []
+
+
+def test_invalid_values_are_rejected(client):
+    home = _home(client)
+    floor = home["floors"][0]
+    response = _patch(client, home, [
+        {"op": "add", "target": "cube", "floor_id": floor["id"], "value": {"position": {"x": "left"}}},
+    ])
+    assert response.status_code == 422
+    assert "invalid cube" in response.json()["detail"]
+    assert _patch(client, home, [
+        {"op": "add", "target": "wall", "floor_id": "nowhere", "value": {}},
+    ]).status_code == 422
+
+
+def test_patched_light_is_indexed(client):
+    home = _home(client)
+    floor = home["floors"][0]
+    light = {"id": "lamp", "name": "Reading Lamp", "position": {"x": 1, "y": 1, "z": 1}}
+    _patch(client, home, [{"op": "add", "target": "light", "floor_id": floor["id"], "value": light}])
+
+    response = client.post("/api/control/lights", json=[{"name": "Reading Lamp", "on": True}]).json()
+    assert response["results"][0]["lights"] == ["lamp"]
@@ -0,0 +1,56 @@
+import pytest
+
+
+@pytest.fixture
+def client(backend):
+    with backend() as client:
+        yield client
+
+
+def _home_url(client):
+    return f"/api/homes/{client.get('/api/homes').json()[0]['id']}"
+
+
+def test_etag_revalidation(client):
+    url = _home_url(client)
+    first = client.get(url, headers={"Accept-Encoding": "identity"})
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "no-cache"
+
+    again = client.get(url, headers={"If-None-Match": etag, "Accept-Encoding": "identity"})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+    assert again.content == b""
+
+
+def test_change_invalidates_the_etag(client):
+    url = _home_url(client)
+    home = client.get(url).json()
+    etag = client.get(url, headers={"Accept-Encoding": "identity"}).headers["ETag"]
+
+    light_id = home["floors"][0]["lights"][0]["id"]
+    client.put(f"{url}/lights/{light_id}", json={"on": True, "color": "#ffffff", "intensity": 1.0})
+
+    response = client.get(url, headers={"If-None-Match": etag, "Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()["floors"][0]["lights"][0]["state"]["on"] is True
+
+
+def test_compressed_variant(client):
+    url = _home_url(client)
+    # Large enough to be compressed
+    home = client.get(url).json()
+    home["floors"][0]["cubes"] = [{"position": {"x": i, "y": 0, "z": 0}} for i in range(50)]
+    client.put(url, json=home)
+
+    identity = client.get(url, headers={"Accept-Encoding": "identity"})
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert response.headers["ETag"] == identity.headers["ETag"][:-1] + '-gzip"'
+    # httpx decodes the body transparently; it must be the same document
+    assert response.json() == identity.json()
+
+    # Either representation's tag revalidates
+    assert client.get(url, headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
@@ -0,0 +1,111 @@
+import pytest
+
+import rooms
+from models import Cube, Floor, Light, RoomLabel, Vector3, Wall, Window
+
+
+def _point(x: float, z: float) -> Vector3:
+    return Vector3(x=x, y=0, z=z)
+
+
+def _wall(x1: float, z1: float, x2: float, z2: float, **fields) -> Wall:
+    return Wall(p1=_point(x1, z1), p2=_point(x2, z2), **fields)
+
+
+def _box(x1: float, z1: float, x2: float, z2: float) -> list[Wall]:
+    return [_wall(x1, z1, x2, z1), _wall(x2, z1, x2, z2), _wall(x2, z2, x1, z2), _wall(x1, z2, x1, z1)]
+
+
+def _light(light_id: str, x: float, z: float) -> Light:
+    return Light(id=light_id, name=light_id, position=Vector3(x=x, y=2, z=z))
+
+
+@pytest.fixture(autouse=True)
+def fresh_layouts():
+    rooms.retain(set())
+
+
+def _floor(walls: list[Wall], **fields) -> Floor:
+    return Floor(**{"id": "ground", "level": 0, "name": "Ground", **fields}, walls=walls)
+
+
+def test_two_rooms_from_a_dividing_wall():
+    # Wall ends miss each other by a few centimeters and the divider only
+    # touches the outer walls, so both snapping and splitting are needed
+    walls = [
+        _wall(0, 0, 4.05, 0), _wall(4, 0, 4, 4), _wall(4, 4, 0, 4), _wall(0.03, 4, 0, 0),
+        _wall(2, 0, 2, 4),
+    ]
+    floor = _floor(walls,
+                   lights=[_light("west", 1, 2), _light("east", 3, 2), _light("outside", 6, 6)],
+                   cubes=[Cube(id="sofa", position=_point(3, 1))],
+                   room_labels=[RoomLabel(name="Kitchen", position=_point(3, 3))])
+    found = sorted(rooms.layout_for(floor).rooms, key=lambda room: room["center"][0])
+
+    assert [room["area"] for room in found] == pytest.approx([8.0, 8.0], abs=0.1)
+    assert [room["lights"] for room in found] == [["west"], ["east"]]
+    assert [room["cubes"] for room in found] == [[], ["sofa"]]
+    assert [room["name"] for room in found] == [None, "Kitchen"]
+    assert all(room["floor_id"] == "ground" for room in found)
+
+
+def test_dead_ends_and_tiny_faces_are_not_rooms():
+    walls = _box(0, 0, 4, 4) + [_wall(1, 1, 2, 1)]
+    assert len(rooms.layout_for(_floor(walls)).rooms) == 1
+    assert rooms.layout_for(_floor([_wall(0, 0, 3, 0), _wall(3, 0, 3, 3)], id="open")).rooms == []
+    assert rooms.layout_for(_floor(_box(0, 0, 0.4, 0.4), id="tiny")).rooms == []
+
+
+def test_nested_room_takes_its_own_lights():
+    floor = _floor(_box(0, 0, 6, 6) + _box(2, 2, 4, 4),
+                   lights=[_light("closet", 3, 3), _light("hall", 1, 1)])
+    found = sorted(rooms.layout_for(floor).rooms, key=lambda room: room["area"])
+    assert [room["lights"] for room in found] == [["closet"], ["hall"]]
+
+
+def test_room_ids_survive_unrelated_edits():
+    floor = _floor(_box(0, 0, 4, 4) + _box(10, 0, 12, 2))
+    before = {room["id"] for room in rooms.layout_for(floor).rooms}
+    stats = rooms.get_stats()
+
+    # Windows and heights are not part of the plan
+    walls = list(floor.walls)
+    walls[0] = walls[0].copy(update={"height": 3.0, "windows": [Window(p1=_point(1, 0), p2=_point(2, 0))]})
+    floor = floor.copy(update={"walls": walls})
+    assert {room["id"] for room in rooms.layout_for(floor).rooms} == before
+    assert rooms.get_stats()["plan_reuses"] == stats["plan_reuses"] + 1
+
+    # Changing one building leaves the other's room id and traced faces alone
+    floor = floor.copy(update={"walls": floor.walls[:4] + _box(10, 0, 13, 2)})
+    after = {room["id"] for room in rooms.layout_for(floor).rooms}
+    assert len(after & before) == 1
+    assert rooms.get_stats()["components_reused"] == stats["components_reused"] + 1
+
+
+def test_spatial_queries():
+    lights = [_light(f"l{i}", i + 0.5, 0.5) for i in range(10)]
+    layout = rooms.layout_for(_floor([], lights=lights))
+    assert layout.query(polygon=[[0, 0], [3, 0], [3, 1], [0, 1]])["lights"] == ["l0", "l1", "l2"]
+    assert sorted(layout.query(center=[5.5, 0.5], radius=1.0)["lights"]) == ["l4", "l5", "l6"]
+
+
+def test_room_endpoints(backend):
+    with backend() as client:
+        home = client.get("/api/homes").json()[0]
+        floor_id = home["floors"][0]["id"]
+        url = f"/api/homes/{home['id']}"
+        walls = [wall.dict() for wall in _box(20, 20, 24, 24)]
+        lamp = {"id": "lamp", "name": "Lamp", "position": {"x": 22, "y": 2, "z": 22}}
+        client.patch(url, json=[
+            *[{"op": "add", "target": "wall", "floor_id": floor_id, "value": wall} for wall in walls],
+            {"op": "add", "target": "light", "floor_id": floor_id, "value": lamp},
+        ])
+        room = next(room for room in client.get(f"{url}/rooms").json()["rooms"] if room["lights"] == ["lamp"])
+
+        renamed = client.put(f"{url}/rooms/{room['id']}", json={"name": "Study"}).json()
+        assert renamed["room"]["id"] == room["id"] and renamed["room"]["name"] == "Study"
+
+        assert [light["id"] for light in client.get(f"{url}/rooms/Study/lights").json()["lights"]] == ["lamp"]
+        response = client.post(f"{url}/rooms/Study/lights", json={"on": True}).json()
+        assert response["room"] == room["id"] and response["changed"] == ["lamp"]
+        assert client.get(f"{url}/rooms/Nowhere/lights").status_code == 404
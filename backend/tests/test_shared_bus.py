@@ -0,0 +1,96 @@
+import multiprocessing
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _worker(data_dir: str, commands, results):
+    """One server worker on the shared DATA_DIR, driven through a TestClient"""
+    os.environ.update(
+        DATA_DIR=data_dir,
+        EVENT_BUS="shared",
+        # Only requests catch up on the ring, so the test controls the interleaving
+        EVENT_BUS_POLL_MS="100000",
+    )
+    sys.path.insert(0, BACKEND_DIR)
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as client:
+        while True:
+            command, args = commands.get()
+            if command == "quit":
+                break
+            if command == "home":
+                results.put(client.get("/api/homes").json()[0])
+            elif command == "light":
+                home_id, light_id, on = args
+                state = {"on": on, "color": "#ffffff", "intensity": 1.0}
+                results.put(client.put(f"/api/homes/{home_id}/lights/{light_id}", json=state).json())
+            elif command == "state":
+                home_id, light_id = args
+                lights = client.get(f"/api/homes/{home_id}/state").json()["lights"]
+                results.put(lights[light_id])
+    results.put("stopped")
+
+
+class Worker:
+    def __init__(self, context, data_dir: str):
+        self.commands = context.Queue()
+        self.results = context.Queue()
+        self.process = context.Process(target=_worker, args=(data_dir, self.commands, self.results))
+        self.process.start()
+
+    def call(self, command: str, *args):
+        self.commands.put((command, args))
+        return self.results.get(timeout=60)
+
+    def stop(self):
+        self.call("quit")
+        self.process.join(timeout=60)
+
+
+@pytest.fixture
+def workers():
+    context = multiprocessing.get_context("spawn")
+    data_dir = tempfile.mkdtemp()
+    started = []
+
+    def start():
+        worker = Worker(context, data_dir)
+        started.append(worker)
+        return worker
+
+    yield start, data_dir
+    for worker in started:
+        if worker.process.is_alive():
+            worker.process.kill()
+
+
+def test_later_change_wins_on_both_workers(workers):
+    start, data_dir = workers
+    a = start()
+    home = a.call("home")
+    b = start()
+    home_id, light_id = home["id"], home["floors"][0]["lights"][0]["id"]
+    b.call("home")
+
+    a.call("light", home_id, light_id, True)
+    # B has not seen A's change yet; its own later change must not be undone by it
+    response = b.call("light", home_id, light_id, False)
+    assert response["state"]["on"] is False
+
+    assert b.call("state", home_id, light_id)["on"] is False
+    assert a.call("state", home_id, light_id)["on"] is False
+
+    a.stop()
+    b.stop()
+    sys.path.insert(0, BACKEND_DIR)
+    import codec
+    with open(os.path.join(data_dir, "saves", "default.json"), "rb") as f:
+        saved = codec.loads(f.read())
+    assert saved["floors"][0]["lights"][0]["state"]["on"] is False
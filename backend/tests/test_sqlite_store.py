@@ -0,0 +1,61 @@
+import hashlib
+
+SQLITE = {"STORAGE_BACKEND": "sqlite"}
+
+
+def _catalog_entry(client, filename):
+    items = client.get("/api/saves/catalog").json()["items"]
+    return next(entry for entry in items if entry["filename"] == filename)
+
+
+def _export_hash(client, filename):
+    return hashlib.sha256(client.get(f"/api/saves/{filename}/json").content).hexdigest()
+
+
+def test_round_trip_and_restart(backend, saves_dir):
+    with backend(**SQLITE) as client:
+        home = client.get("/api/homes").json()[0]
+        home["name"] = "Round Trip"
+        floor = home["floors"][0]
+        floor["walls"][0]["windows"] = [{"p1": {"x": 1, "y": 0, "z": 0}, "p2": {"x": 2, "y": 0, "z": 0}}]
+        floor["cubes"] = [{"name": "Sofa", "position": {"x": 3, "y": 0, "z": 3}, "color": "#112233"}]
+        floor["lights"][0]["state"] = {"on": True, "color": "#ff8800", "intensity": 2.5}
+        assert client.post("/api/saves/round.json", json=home).status_code == 200
+        saved = client.post("/api/saves/round.json/load").json()
+
+    assert (saves_dir / "mimesys.sqlite3").exists()
+    assert not (saves_dir / "round.json").exists()
+
+    with backend(**SQLITE) as client:
+        reloaded = client.post("/api/saves/round.json/load").json()
+        assert reloaded == saved
+        assert reloaded["floors"][0]["walls"][0]["windows"][0]["p2"]["x"] == 2
+        assert reloaded["floors"][0]["cubes"][0]["color"] == "#112233"
+        assert reloaded["floors"][0]["lights"][0]["state"] == {"on": True, "color": "#ff8800", "intensity": 2.5}
+
+
+def test_catalog_has_content_hash(backend):
+    with backend(**SQLITE) as client:
+        home = client.get("/api/homes").json()[0]
+        entry = _catalog_entry(client, "default.json")
+        assert entry["hash"] == _export_hash(client, "default.json")
+        assert entry["size"] > 0
+
+        # A row-level light update of the (autosaved) active home changes the hash
+        light_id = home["floors"][0]["lights"][0]["id"]
+        state = {"on": True, "color": "#00ff00", "intensity": 1.0}
+        client.put(f"/api/homes/{home['id']}/lights/{light_id}", json=state)
+        updated = _catalog_entry(client, "default.json")
+        assert updated["hash"] != entry["hash"]
+        assert updated["hash"] == _export_hash(client, "default.json")
+
+
+def test_duplicate_ids_are_rejected_cleanly(backend):
+    with backend(**SQLITE) as client:
+        home = client.get("/api/homes").json()[0]
+        floor = home["floors"][0]
+        floor["lights"].append(dict(floor["lights"][0], name="Twin"))
+        response = client.post("/api/saves/twins.json", json=home)
+        assert response.status_code == 422
+        assert "Duplicate light id" in response.json()["detail"]
+        assert "twins.json" not in client.get("/api/saves").json()
@@ -0,0 +1,24 @@
+def test_import_touches_nothing_and_startup_reports_timings(backend, saves_dir):
+    client = backend()
+    assert not saves_dir.exists()
+
+    with client:
+        client.get("/api/homes")
+        status = client.get("/api/status").json()
+        assert status["ready"] is True
+        assert status["error"] is None
+        assert status["loaded_save"] == "default.json"
+        assert {"storage_init", "find_save", "total"} <= set(status["timings_ms"])
+
+
+def test_save_inspection_endpoints(backend):
+    with backend() as client:
+        home = client.get("/api/homes").json()[0]
+        floor = home["floors"][0]
+
+        meta = client.get("/api/saves/default/meta").json()
+        assert meta["filename"] == "default.json" and meta["format"] == "json"
+        assert meta["home"]["id"] == home["id"]
+        assert client.get(f"/api/saves/default.json/floors/{floor['id']}").json() == floor
+        assert client.get("/api/saves/default.json/json").json() == home
+        assert client.get("/api/saves/missing.json/meta").status_code == 404
@@ -0,0 +1,101 @@
+import pytest
+
+import codec
+import validation
+
+
+def _point(x: float, z: float) -> dict:
+    return {"x": x, "y": 0, "z": z}
+
+
+def _home(**floor) -> dict:
+    return {"id": "home", "name": "Home", "floors": [{"id": "ground", "level": 0, "name": "Ground", **floor}]}
+
+
+def _validate(tmp_path, data) -> dict:
+    path = tmp_path / "save.json"
+    path.write_bytes(data if isinstance(data, bytes) else codec.dumps(data))
+    return validation.validate_save_file(str(path))
+
+
+def _issues(issues: list) -> list[tuple[str, str]]:
+    return [(issue["path"], issue["message"]) for issue in issues]
+
+
+def test_valid_save_has_summary_and_hash(tmp_path):
+    lamp = {"id": "lamp", "name": "Lamp", "position": _point(1, 1)}
+    result = _validate(tmp_path, _home(lights=[lamp]))
+    assert result["report"] == {"valid": True, "errors": [], "warnings": [], "truncated": 0}
+    assert result["summary"]["home_id"] == "home" and result["summary"]["lights"] == 1
+    assert len(result["hash"]) == 64
+
+
+def test_integrity_errors_and_warnings(tmp_path):
+    walls = [
+        {"id": "a", "p1": _point(0, 0), "p2": _point(0, 0)},
+        {"id": "b", "p1": _point(0, 0), "p2": _point(4, 0), "height": 2.5, "windows": [
+            {"id": "w", "p1": _point(1, 2), "p2": _point(2, 2), "height": 2.0},
+        ]},
+    ]
+    lights = [
+        {"id": "a", "name": "Lamp", "position": _point(1, 1), "state": {"color": "red"}},
+        {"name": "Unnamed id", "position": _point(2, 1)},
+    ]
+    cubes = [{"id": "box", "position": _point(1, 1), "size": {"x": 1, "y": 0, "z": 1}}]
+    data = _home(walls=walls, lights=lights, cubes=cubes)
+    data["scenes"] = [{"id": "evening", "name": "Evening", "lights": {"gone": {"on": True}}}]
+
+    report = _validate(tmp_path, data)["report"]
+    assert not report["valid"]
+    assert _issues(report["errors"]) == [
+        ("floors[0].lights[0]", "Duplicate id a (also used by floors[0].walls[0])"),
+        ("floors[0].walls[0]", "Wall has zero length"),
+        ("floors[0].cubes[0]", "Cube size must be positive"),
+    ]
+    assert _issues(report["warnings"]) == [
+        ("floors[0].lights[1]", "Missing id; a new one is generated on every load"),
+        ("floors[0].walls[1].windows[0]", "Window extends above or below its wall"),
+        ("floors[0].walls[1].windows[0]", "Window does not lie on its wall"),
+        ("floors[0].lights[0]", "Color 'red' is not #rrggbb"),
+        ("scenes[0]", "Scene references unknown light gone"),
+    ]
+
+
+def test_model_errors_carry_their_path(tmp_path):
+    report = _validate(tmp_path, _home(lights=[{"id": "lamp", "position": _point(1, 1)}]))["report"]
+    assert [issue["path"] for issue in report["errors"]] == ["floors[0].lights[0].name"]
+
+
+@pytest.mark.parametrize("contents, message", [
+    (b"{broken", "Invalid JSON"),
+    (b"[1, 2]", "Not a save file"),
+])
+def test_unreadable_saves(tmp_path, contents, message):
+    result = _validate(tmp_path, contents)
+    assert result["summary"] is None
+    assert result["report"]["errors"][0]["message"].startswith(message)
+
+
+def test_report_is_truncated(tmp_path, monkeypatch):
+    monkeypatch.setattr(validation, "MAX_REPORT_ISSUES", 3)
+    cubes = [{"id": f"c{i}", "position": _point(i, 0), "color": "grey"} for i in range(5)]
+    report = _validate(tmp_path, _home(cubes=cubes))["report"]
+    assert report["valid"]
+    assert len(report["warnings"]) == 3 and report["truncated"] == 2
+
+
+def test_upload_is_refused_with_the_report(backend):
+    with backend() as client:
+        data = _home(walls=[{"id": "w", "p1": _point(0, 0), "p2": _point(0, 0)}])
+        response = client.post("/api/saves/upload", files={"file": ("bad.json", codec.dumps(data), "application/json")})
+        assert response.status_code == 400
+        body = response.json()
+        assert body["detail"] == "Invalid save file at floors[0].walls[0]: Wall has zero length"
+        assert body["validation"]["valid"] is False
+        assert "bad.json" not in client.get("/api/saves").json()
+
+        data = _home(cubes=[{"id": "c", "position": _point(0, 0), "color": "grey"}])
+        response = client.post("/api/saves/upload", files={"file": ("ok.json", codec.dumps(data), "application/json")})
+        assert response.status_code == 200
+        assert _issues(response.json()["validation"]["warnings"]) == [("floors[0].cubes[0]", "Color 'grey' is not #rrggbb")]
+        assert response.json()["catalog"]["home_id"] == "home"
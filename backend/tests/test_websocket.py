@@ -0,0 +1,53 @@
+import pytest
+
+import codec
+
+
+@pytest.fixture
+def client(backend):
+    with backend() as client:
+        yield client
+
+
+def _receive(websocket):
+    return codec.loads(websocket.receive_text())
+
+
+def test_subscribe_with_since_catches_up_once(client):
+    home = client.get("/api/homes").json()[0]
+    light_id = home["floors"][0]["lights"][0]["id"]
+    for on in (True, False, True):
+        client.put(f"/api/homes/{home['id']}/lights/{light_id}",
+                   json={"on": on, "color": "#ffffff", "intensity": 1.0})
+
+    with client.websocket_connect(f"/api/homes/{home['id']}/ws") as websocket:
+        hello = _receive(websocket)
+        assert hello["type"] == "hello"
+        websocket.send_text(codec.dumps({"type": "subscribe", "since": 0}).decode())
+        assert _receive(websocket)["type"] == "subscribed"
+        caught_up = _receive(websocket)
+        assert caught_up["type"] == "lights_changed"
+        assert caught_up["version"] == hello["version"]
+
+        websocket.send_text(codec.dumps({"type": "ping"}).decode())
+        # Nothing is sent twice: the next frame is the reply to the ping
+        assert _receive(websocket)["type"] == "pong"
+
+
+def test_light_command_and_binary_frames(client):
+    home = client.get("/api/homes").json()[0]
+    light_id = home["floors"][0]["lights"][0]["id"]
+
+    with client.websocket_connect(f"/api/homes/{home['id']}/ws") as websocket:
+        _receive(websocket)
+        websocket.send_bytes(b"\x00\x01")
+        assert _receive(websocket) == {"type": "error", "detail": "Messages must be JSON text frames"}
+
+        websocket.send_text(codec.dumps({"type": "subscribe", "events": ["lights_changed"]}).decode())
+        _receive(websocket)
+        command = {"type": "light", "request_id": "r1", "id": light_id, "state": {"on": True}}
+        websocket.send_text(codec.dumps(command).decode())
+        frames = [_receive(websocket), _receive(websocket)]
+        ack = next(frame for frame in frames if frame["type"] == "ack")
+        assert ack["request_id"] == "r1" and ack["changed"] is True
+        assert ack["light"]["state"]["on"] is True
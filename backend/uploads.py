@@ -0,0 +1,115 @@
+import asyncio
+import os
+import tempfile
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+# Streaming receive of a single-file multipart upload.
+#
+# FastAPI's UploadFile parameters only reach the handler after the whole body
+# has been read and spooled, so a size limit checked there is checked too
+# late. Here the request body is fed to python-multipart as it arrives and the
+# file part is written straight to a hidden temp file in the target directory
+# (so it can be renamed into place), failing as soon as it grows past the
+# limit.
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', str(10 * 1024 * 1024)))
+
+
+class UploadError(Exception):
+    pass
+
+
+class UploadTooLarge(UploadError):
+    pass
+
+
+class ReceivedFile:
+    def __init__(self, filename: str, path: str, size: int):
+        self.filename = filename
+        self.path = path
+        self.size = size
+
+    def discard(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+async def receive_file(request, field: str, directory: str, max_bytes: int) -> ReceivedFile:
+    """Write the upload in form field `field` to a temp file in directory; the caller owns the file"""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + 64 * 1024:
+        # Reject before reading anything when the body cannot fit
+        raise UploadTooLarge()
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadError("Expected a multipart/form-data upload")
+
+    fd, path = tempfile.mkstemp(dir=directory, prefix='.upload-', suffix='.tmp')
+    state = {"headers": [], "name": b"", "value": b"", "field": None, "filename": None, "found": None}
+    pending: list[bytes] = []
+    size = 0
+
+    def on_header_field(data, start, end):
+        state["name"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"].append((state["name"].lower(), state["value"]))
+        state["name"] = state["value"] = b""
+
+    def on_headers_finished():
+        disposition = dict(state["headers"]).get(b"content-disposition", b"")
+        _, options = parse_options_header(disposition)
+        state["headers"] = []
+        state["field"] = options.get(b"name", b"").decode('utf-8', 'replace')
+        filename = options.get(b"filename")
+        state["filename"] = filename.decode('utf-8', 'replace') if filename is not None else None
+
+    def on_part_data(data, start, end):
+        nonlocal size
+        if state["field"] != field or state["filename"] is None or state["found"] is not None:
+            return
+        size += end - start
+        if size > max_bytes:
+            raise UploadTooLarge()
+        pending.append(data[start:end])
+
+    def on_part_end():
+        if state["field"] == field and state["filename"] is not None and state["found"] is None:
+            state["found"] = state["filename"]
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            async for chunk in request.stream():
+                parser.write(chunk)
+                if pending:
+                    data = b"".join(pending)
+                    pending.clear()
+                    await asyncio.to_thread(f.write, data)
+            parser.finalize()
+            await asyncio.to_thread(_sync, f)
+    except UploadError:
+        os.remove(path)
+        raise
+    except Exception as e:
+        os.remove(path)
+        raise UploadError(f"Malformed upload: {e}") from e
+
+    if state["found"] is None:
+        os.remove(path)
+        raise UploadError(f"No file in form field '{field}'")
+    return ReceivedFile(state["found"], path, size)
+
+
+def _sync(f):
+    f.flush()
+    os.fsync(f.fileno())
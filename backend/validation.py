@@ -0,0 +1,204 @@
+import asyncio
+import binary_snapshot
+import catalog
+import codec
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pydantic import ValidationError
+from models import Home
+
+logger = logging.getLogger(__name__)
+
+# Full validation of save files, run in worker processes so parsing and
+# checking a large save never holds up the event loop (or the GIL).
+#
+# A save is checked against the Home model and then for integrity problems
+# the model cannot express: duplicate ids, degenerate walls and cubes,
+# windows outside their wall, dangling scene references. Errors make the save
+# unusable; warnings are reported but accepted. The worker also returns the
+# content hash and catalog summary, so an accepted upload is listed without
+# being parsed again.
+VALIDATION_WORKERS = int(os.getenv('VALIDATION_WORKERS', '2'))  # 0 = validate in a thread
+MAX_REPORT_ISSUES = 100
+
+_COLOR = re.compile(r"#[0-9a-fA-F]{6}")
+_pool: ProcessPoolExecutor | None = None
+
+
+class _Report:
+    def __init__(self):
+        self.errors: list[dict] = []
+        self.warnings: list[dict] = []
+        self.truncated = 0
+
+    def _add(self, issues: list, path: str, message: str):
+        if len(self.errors) + len(self.warnings) >= MAX_REPORT_ISSUES:
+            self.truncated += 1
+        else:
+            issues.append({"path": path, "message": message})
+
+    def error(self, path: str, message: str):
+        self._add(self.errors, path, message)
+
+    def warning(self, path: str, message: str):
+        self._add(self.warnings, path, message)
+
+    def to_dict(self) -> dict:
+        return {"valid": not self.errors, "errors": self.errors, "warnings": self.warnings, "truncated": self.truncated}
+
+
+def _path(loc) -> str:
+    path = ""
+    for part in loc:
+        path += f"[{part}]" if isinstance(part, int) else (f".{part}" if path else str(part))
+    return path
+
+
+def _distance_to_line(point, p1, p2) -> float:
+    """Distance of a point from the (infinite) line through p1 and p2, in the floor plane"""
+    dx, dz = p2.x - p1.x, p2.z - p1.z
+    length = (dx * dx + dz * dz) ** 0.5
+    return abs(dx * (point.z - p1.z) - dz * (point.x - p1.x)) / length
+
+
+def _check_ids(home: Home, data: dict, report: _Report):
+    seen: dict[str, str] = {}
+
+    def check(item, raw: dict, path: str):
+        if not raw.get("id"):
+            report.warning(path, "Missing id; a new one is generated on every load")
+        elif item.id in seen:
+            report.error(path, f"Duplicate id {item.id} (also used by {seen[item.id]})")
+        else:
+            seen[item.id] = path
+
+    check(home, data, "home")
+    for f, (floor, raw_floor) in enumerate(zip(home.floors, data.get("floors", []))):
+        floor_path = f"floors[{f}]"
+        check(floor, raw_floor, floor_path)
+        for kind in ("walls", "lights", "cubes"):
+            for i, (item, raw) in enumerate(zip(getattr(floor, kind), raw_floor.get(kind, []))):
+                check(item, raw, f"{floor_path}.{kind}[{i}]")
+        for w, (wall, raw_wall) in enumerate(zip(floor.walls, raw_floor.get("walls", []))):
+            for i, (window, raw) in enumerate(zip(wall.windows, raw_wall.get("windows", []))):
+                check(window, raw, f"{floor_path}.walls[{w}].windows[{i}]")
+    for s, (scene, raw) in enumerate(zip(home.scenes, data.get("scenes", []))):
+        check(scene, raw, f"scenes[{s}]")
+
+
+def _check_floor(floor, floor_path: str, report: _Report):
+    if 0 < len(floor.shape) < 3:
+        report.warning(f"{floor_path}.shape", "A floor shape needs at least 3 points")
+
+    for w, wall in enumerate(floor.walls):
+        wall_path = f"{floor_path}.walls[{w}]"
+        if wall.height <= 0 or wall.thickness <= 0:
+            report.error(wall_path, "Wall height and thickness must be positive")
+        if wall.p1.x == wall.p2.x and wall.p1.z == wall.p2.z:
+            report.error(wall_path, "Wall has zero length")
+            continue
+        for i, window in enumerate(wall.windows):
+            window_path = f"{wall_path}.windows[{i}]"
+            if window.height <= 0:
+                report.error(window_path, "Window height must be positive")
+            if window.bottom_height < 0 or window.bottom_height + window.height > wall.height:
+                report.warning(window_path, "Window extends above or below its wall")
+            if max(_distance_to_line(window.p1, wall.p1, wall.p2),
+                   _distance_to_line(window.p2, wall.p1, wall.p2)) > max(wall.thickness, 0.01):
+                report.warning(window_path, "Window does not lie on its wall")
+
+    for i, light in enumerate(floor.lights):
+        light_path = f"{floor_path}.lights[{i}]"
+        if light.state.intensity < 0:
+            report.error(light_path, "Light intensity must not be negative")
+        if not _COLOR.fullmatch(light.state.color):
+            report.warning(light_path, f"Color {light.state.color!r} is not #rrggbb")
+
+    for i, cube in enumerate(floor.cubes):
+        cube_path = f"{floor_path}.cubes[{i}]"
+        if min(cube.size.x, cube.size.y, cube.size.z) <= 0:
+            report.error(cube_path, "Cube size must be positive")
+        if not _COLOR.fullmatch(cube.color):
+            report.warning(cube_path, f"Color {cube.color!r} is not #rrggbb")
+
+
+def _check_integrity(home: Home, data: dict, report: _Report):
+    _check_ids(home, data, report)
+    levels: dict[int, int] = {}
+    for f, floor in enumerate(home.floors):
+        if floor.level in levels:
+            report.warning(f"floors[{f}]", f"Level {floor.level} is also used by floors[{levels[floor.level]}]")
+        levels.setdefault(floor.level, f)
+        _check_floor(floor, f"floors[{f}]", report)
+
+    light_ids = {light.id for floor in home.floors for light in floor.lights}
+    for s, scene in enumerate(home.scenes):
+        for light_id in scene.lights:
+            if light_id not in light_ids:
+                report.warning(f"scenes[{s}]", f"Scene references unknown light {light_id}")
+
+
+def validate_save_file(path: str, binary: bool = False) -> dict:
+    """Validation report of a save on disk (JSON, or a binary snapshot), with its content hash and catalog summary"""
+    with open(path, 'rb') as f:
+        contents = f.read()
+    result = {"hash": hashlib.sha256(contents).hexdigest(), "summary": None}
+    report = _Report()
+    try:
+        data = binary_snapshot.decode_home(contents) if binary else codec.loads(contents)
+    except (ValueError, KeyError, TypeError, struct.error) as e:
+        # The last three: a truncated or malformed snapshot header or floor index
+        report.error("", f"Invalid {'binary snapshot' if binary else 'JSON'}: {e}")
+        return {**result, "report": report.to_dict()}
+    if not isinstance(data, dict) or "id" not in data or not isinstance(data.get("floors"), list):
+        report.error("", "Not a save file: expected an object with an id and a floors array")
+        return {**result, "report": report.to_dict()}
+
+    try:
+        home = Home.model_validate(data)
+    except ValidationError as e:
+        for error in e.errors(include_url=False):
+            report.error(_path(error["loc"]), error["msg"])
+    else:
+        _check_integrity(home, data, report)
+    if report.errors:
+        return {**result, "report": report.to_dict()}
+    return {**result, "summary": catalog.summarize(data), "report": report.to_dict()}
+
+
+def _get_pool() -> ProcessPoolExecutor | None:
+    global _pool
+    if _pool is None and VALIDATION_WORKERS > 0:
+        try:
+            # Spawned rather than forked: the server process has threads running
+            _pool = ProcessPoolExecutor(VALIDATION_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        except (OSError, NotImplementedError) as e:
+            logger.warning(f"No process pool for validation, using threads: {e}")
+    return _pool
+
+
+async def validate(path: str, binary: bool = False) -> dict:
+    """validate_save_file() in a worker process"""
+    pool = _get_pool()
+    if pool is None:
+        return await asyncio.to_thread(validate_save_file, path, binary)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, validate_save_file, path, binary)
+    except BrokenProcessPool as e:
+        # A worker died (killed, out of memory); start a fresh pool next time
+        logger.warning(f"Validation worker failed, retrying in a thread: {e}")
+        shutdown()
+        return await asyncio.to_thread(validate_save_file, path, binary)
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None